@@ -0,0 +1,114 @@
+import asyncio
+import time
+
+from logger_setup import setup_logger
+from tracing import span
+
+logger = setup_logger(__name__)
+
+
+class AcquisitionError(Exception):
+    """A required source failed or timed out. Carries the per-source report."""
+
+    def __init__(self, message, report):
+        super().__init__(message)
+        self.report = report
+
+
+class Source:
+    """One input of the acquisition stage.
+
+    factory is a zero-argument callable returning an awaitable. Optional sources fall back to default
+    when they fail or run out of time; required sources abort the whole stage.
+    """
+
+    def __init__(self, name, factory, timeout, required=False, default=None):
+        self.name = name
+        self.factory = factory
+        self.timeout = timeout
+        self.required = required
+        self.default = default
+
+
+class AcquisitionResult:
+    def __init__(self, values, report, elapsed):
+        self.values = values
+        self.report = report
+        self.elapsed = elapsed
+
+    def __getitem__(self, name):
+        return self.values[name]
+
+    def age(self, name):
+        """Seconds since the source finished, by the wall clock so time spent suspended counts too."""
+        return time.time() - self.report[name]["completed_at"]
+
+    def update(self, other):
+        """Take over the values and report entries of a later acquisition, e.g. refreshed sources."""
+        self.values.update(other.values)
+        self.report.update(other.report)
+        self.elapsed += other.elapsed
+
+    def summary(self):
+        return ", ".join(f"{name}={entry['status']}/{entry['latency_ms']:.0f}ms"
+                         for name, entry in self.report.items())
+
+
+async def acquire(sources, deadline):
+    """Start every source at once and wait for all of them, bounded by each timeout and a global deadline."""
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    global_deadline = start + deadline
+    values = {}
+    report = {}
+
+    async def run(source):
+        began = loop.time()
+        budget = max(min(source.timeout, global_deadline - began), 0)
+        entry = {"required": source.required}
+        with span(f"source.{source.name}", required=source.required) as current:
+            try:
+                value = await asyncio.wait_for(source.factory(), timeout=budget)
+                entry["status"] = "ok"
+            except asyncio.TimeoutError:
+                value = source.default
+                entry["status"] = "timeout"
+            except Exception as e:
+                value = source.default
+                entry["status"] = "error"
+                entry["error"] = str(e)
+            if entry["status"] != "ok":
+                current.fail(entry["status"], entry.get("error"))
+        entry["latency_ms"] = (loop.time() - began) * 1000
+        entry["completed_at"] = time.time()
+        return source, value, entry
+
+    pending = {asyncio.create_task(run(source)) for source in sources}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                source, value, entry = task.result()
+                values[source.name] = value
+                report[source.name] = entry
+                if entry["status"] == "ok":
+                    logger.info(f"Acquired {source.name} in {entry['latency_ms']:.0f} ms")
+                else:
+                    level = logger.error if source.required else logger.warning
+                    level(f"Source {source.name} {entry['status']} after {entry['latency_ms']:.0f} ms"
+                          f"{': ' + entry['error'] if 'error' in entry else ''}")
+                if source.required and entry["status"] != "ok":
+                    raise AcquisitionError(
+                        f"Required source {source.name} {entry['status']}"
+                        f"{': ' + entry['error'] if 'error' in entry else ''}", report)
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+            for source in sources:
+                report.setdefault(source.name, {"required": source.required, "status": "cancelled",
+                                                "latency_ms": (loop.time() - start) * 1000,
+                                                "completed_at": time.time()})
+
+    return AcquisitionResult(values, report, loop.time() - start)
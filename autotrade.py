@@ -1,25 +1,40 @@
 import os
 import asyncio
 import json
-from datetime import datetime
+import signal
+import time
+from datetime import datetime, timezone
 from typing import Dict, List, Any, Optional
 
-import schedule
 from dotenv import load_dotenv
 from openai import OpenAI
+from acquisition import AcquisitionError, AcquisitionResult, Source, acquire
+from browser_pool import get_browser_pool
 from capture_chart_images import capture_tradingview_charts, get_chart_images
-from send_discord import DiscordNotifier
-from fetch_bybit_status import fetch_bybit_current_status
+from chart_artifact import ChartArtifact
+from send_discord import close_notifiers, flush_notifiers
+from fetch_bybit_status import fetch_bybit_current_status_async
+from candle_store import sync_candle_history
 from fetch_cyrpto_news import fetch_and_nomalized_crypto_news_data
 from fetch_fear_and_greed import fetch_fear_and_greed_index
 from send_notifications import send_error_notifications, send_notifications
 from fetch_tradingview_ideas import get_normalized_tradingview_ideas
 from fetch_tradingview_news import fetch_and_normalized_tradingview_news
+from decision_scheduler import DecisionScheduler, sleep_until, slot_label
+from http_client import close_session, summarize_timings
 from logger_setup import setup_logger
-
-from fetch_database import fetch_recent_decisions, save_decision_to_db, initialize_db
-from excute_trading import execute_bybit_trade
-from util import get_instructions
+from near_duplicates import TextSource, deduplicate_sources
+from news_index import get_article_index, split_new_and_seen
+from prompt_builder import PromptBuilder
+from response_cache import get_response_cache
+from tracing import METRICS_PORT, RUN_SPAN, count, span, start_metrics_server
+
+from indicators import build_indicator_features, format_indicator_features
+from render_charts import render_chart_images
+from fetch_database import close_decision_repositories, fetch_recent_decisions, save_decision_to_db, initialize_db
+from excute_trading import execute_bybit_trade, get_execution_client
+from live_state import get_live_state
+from util import get_instructions, preload_instructions
 
 logger = setup_logger(__name__)
 load_dotenv()
@@ -37,75 +52,193 @@ BYBIT_API_KEY_1 = os.getenv('BYBIT_API_KEY_1')
 BYBIT_API_SECRET_1 = os.getenv('BYBIT_API_SECRET_1')
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 TELEGRAM_CHAT_ID = os.getenv('TELEGRAM_CHAT_ID')
+# "tradingview" captures the saved TradingView layouts, "local" renders the same charts from Bybit candles
+CHART_SOURCE = os.getenv('CHART_SOURCE', 'tradingview')
+# Send only articles the model has not seen yet, plus a short digest of the rest
+NEWS_DELTA_MODE = os.getenv('NEWS_DELTA_MODE', '1') == '1'
+# Merge near-duplicate stories across the news and ideas feeds into one row with a mention count
+NEWS_DEDUP = os.getenv('NEWS_DEDUP', '1') == '1'
+# Seconds allowed for the whole acquisition stage and for chart capture within it
+ACQUISITION_DEADLINE = float(os.getenv('ACQUISITION_DEADLINE', '420'))
+CHART_TIMEOUT = float(os.getenv('CHART_TIMEOUT', '360'))
+# Minutes ahead of each slot at which the slow inputs are prefetched
+PREFETCH_LEAD = float(os.getenv('PREFETCH_LEAD_MINUTES', '6')) * 60
+# Oldest acceptable age (seconds) of prefetched and of finalized inputs when the model is called; older inputs
+# are fetched again
+PREFETCH_MAX_AGE = float(os.getenv('PREFETCH_MAX_AGE', str(PREFETCH_LEAD + 300)))
+FINALIZE_MAX_AGE = float(os.getenv('FINALIZE_MAX_AGE', '30'))
+# Seconds a run in progress may take to finish after a shutdown signal before it is cancelled
+SHUTDOWN_TIMEOUT = float(os.getenv('SHUTDOWN_TIMEOUT', '300'))
+# Keep position, wallet and ticker current over Bybit WebSockets so status and pre-trade reads are local
+LIVE_STATE = os.getenv('LIVE_STATE', '1') == '1'
 
 # Initialize clients
-discord_notifier = DiscordNotifier(DISCORD_WEBHOOK_URL)
 logger.info("Initializing OpenAI client")
 client = OpenAI(api_key=OPENAI_API_KEY)
 logger.info("Initializing BYBIT client")
 
 api_token_usage = 0
-
-
-async def make_decision_and_execute() -> None:
-    logger.info("Starting decision-making and execution")
+# Prompt cache accounting across calls, split by whether the provider reported cached prompt tokens
+prompt_cache_stats = {"calls": 0, "prompt_tokens": 0, "cached_tokens": 0,
+                      "hit_latency": 0.0, "hits": 0, "miss_latency": 0.0, "misses": 0}
+
+INSTRUCTION_PATHS = ["instructions_3_Long.md", "instructions_3_Short.md", "instructions_3_Closed.md"]
+# Static message sent right after the instructions; keep it free of anything that changes between runs
+DATA_LAYOUT = ("The trading data follows as separate messages in this order: Data 8 Indicator Features (when "
+               "available), Data 2 Past Trading Decisions, Data 3 CoinDesk Crypto News, Data 4 TradingView User "
+               "Ideas, Data 5 The Crypto Fear and Greed Index, Data 6 Latest Market News, Data 7 Current "
+               "Investment Status, and finally Data 1 TradingView Chart Images.")
+
+# Slow inputs fetched in the prefetch phase, and fast volatile ones refreshed at the slot
+PREFETCH_SOURCES = ['crypto_news', 'tradingview_ideas', 'tradingview_news', 'fear_and_greed', 'last_decisions',
+                    'candle_history', 'charts']
+FINALIZE_SOURCES = ['account_status']
+
+# Started in serve(); runs on its own thread so stream handling never waits behind work on the main loop
+live_state = get_live_state(BYBIT_API_KEY_1, BYBIT_API_SECRET_1, testnet=False) if LIVE_STATE else None
+
+
+async def acquire_inputs(names: List[str]) -> AcquisitionResult:
+    """Start the named data sources at once; charts and account status are required, the rest degrade."""
+    candle_history_task = None
+
+    # Local chart rendering reads the same candle sync as the indicator features
+    async def candle_history():
+        nonlocal candle_history_task
+        if candle_history_task is None:
+            candle_history_task = asyncio.create_task(sync_candle_history(BYBIT_API_KEY_1, BYBIT_API_SECRET_1))
+        return await asyncio.shield(candle_history_task)
+
+    async def charts():
+        if CHART_SOURCE == 'local':
+            candles_1d, candles_4h = await candle_history()
+            return await render_chart_images(candles_1d, candles_4h)
+        return await capture_tradingview_charts(get_chart_images())
+
+    article_index = get_article_index() if NEWS_DELTA_MODE else None
+    if article_index is not None and {'crypto_news', 'tradingview_news'} & set(names):
+        article_index.discard_pending()
+    sources = [
+        Source('crypto_news',
+               lambda: fetch_and_nomalized_crypto_news_data(RAPIDAPI_NEWS_KEY, RAPIDAPI_NEWS_HOST, article_index),
+               timeout=30, default="No coindesk newspaper articles in the last 24 hours."),
+        Source('tradingview_ideas',
+               lambda: get_normalized_tradingview_ideas(RAPIDAPI_TRADINGVIEW_KEY, RAPIDAPI_TRADINGVIEW_HOST),
+               timeout=30, default=[]),
+        Source('tradingview_news',
+               lambda: fetch_and_normalized_tradingview_news(RAPIDAPI_TRADINGVIEW_KEY, RAPIDAPI_TRADINGVIEW_HOST,
+                                                             article_index),
+               timeout=30, default=[]),
+        Source('fear_and_greed', fetch_fear_and_greed_index, timeout=20, default={}),
+        Source('last_decisions', fetch_recent_decisions, timeout=10,
+               default="No Recent Trading Decisions found."),
+        Source('candle_history', candle_history, timeout=60),
+        Source('charts', charts, timeout=CHART_TIMEOUT, required=True),
+        Source('account_status',
+               lambda: fetch_bybit_current_status_async(BYBIT_API_KEY_1, BYBIT_API_SECRET_1, testnet=False,
+                                                        live_state=live_state),
+               timeout=30, required=True),
+    ]
     try:
-        # Create tasks for all async operations
-        crypto_news_task = asyncio.create_task(
-            fetch_and_nomalized_crypto_news_data(RAPIDAPI_NEWS_KEY, RAPIDAPI_NEWS_HOST))
-        tradingview_ideas_task = asyncio.create_task(
-            get_normalized_tradingview_ideas(RAPIDAPI_TRADINGVIEW_KEY, RAPIDAPI_TRADINGVIEW_HOST))
-        tradingview_news_task = asyncio.create_task(
-            fetch_and_normalized_tradingview_news(RAPIDAPI_TRADINGVIEW_KEY, RAPIDAPI_TRADINGVIEW_HOST))
-        last_decisions_task = asyncio.create_task(fetch_recent_decisions())
-        fear_and_greed_task = asyncio.create_task(fetch_fear_and_greed_index())
-
-        # Wait for all tasks to complete and log each result
-        crypto_news = await crypto_news_task
-        logger.info("Crypto news fetched successfully")
-
-        tradingview_ideas = await tradingview_ideas_task
-        logger.info("TradingView ideas fetched successfully")
-
-        tradingview_overall_news = await tradingview_news_task
-        logger.info("TradingView news fetched successfully")
-
-        last_decisions = await last_decisions_task
-        logger.info("Last decisions fetched successfully")
-
-        fear_and_greed = await fear_and_greed_task
-        logger.info("Fear and Greed index fetched successfully")
-
-        # Error handling for capture_tradingview_charts
-        try:
-            tradingview_chart_images = await capture_tradingview_charts(get_chart_images())
-        except Exception as e:
-            error_message = f"Failed to capture TradingView charts: {str(e)}"
-            logger.error(error_message)
-            send_error_notifications(error_message, DISCORD_WEBHOOK_URL)
-            return
-        logger.info("TradingView charts captured successfully")
-
-        # Error handling for get_bybit_current_status
-        try:
-            current_account_status = fetch_bybit_current_status(BYBIT_API_KEY_1, BYBIT_API_SECRET_1, testnet=False)
-            logger.info("Bybit account status fetched successfully")
-
-            # Determine the instructions path based on the current position type
-            if current_account_status['position']['type'] == 'Short':
-                instructions_path = "instructions_3_Short.md"
-            elif current_account_status['position']['type'] == 'Long':
-                instructions_path = "instructions_3_Long.md"
-            else:  # None or any other type (which means Closed)
-                instructions_path = "instructions_3_Closed.md"
-
-            logger.info(f"Selected instructions path: {instructions_path}")
-        except Exception as e:
-            error_message = f"Failed to fetch Bybit account status: {str(e)}"
-            logger.error(error_message)
-            send_error_notifications(error_message, DISCORD_WEBHOOK_URL)
-            return
-
+        return await acquire([source for source in sources if source.name in names], deadline=ACQUISITION_DEADLINE)
+    finally:
+        if candle_history_task is not None and not candle_history_task.done():
+            candle_history_task.cancel()
+
+
+def stale_inputs(acquired: AcquisitionResult) -> List[str]:
+    """Inputs older than their bound: FINALIZE_MAX_AGE for the volatile ones, PREFETCH_MAX_AGE for the rest."""
+    return [name for name in acquired.report
+            if acquired.age(name) > (FINALIZE_MAX_AGE if name in FINALIZE_SOURCES else PREFETCH_MAX_AGE)]
+
+
+async def finalize_inputs(prefetched: AcquisitionResult) -> AcquisitionResult:
+    """Refresh the volatile inputs, plus any prefetched input that has gone stale, right before the model call."""
+    names = FINALIZE_SOURCES + [name for name in stale_inputs(prefetched) if name not in FINALIZE_SOURCES]
+    for _ in range(2):
+        if len(names) > len(FINALIZE_SOURCES):
+            logger.warning(f"Prefetched inputs are stale and will be fetched again: {names[len(FINALIZE_SOURCES):]}")
+        prefetched.update(await acquire_inputs(names))
+        # Refetching slow inputs can outlast the volatile ones, so check every bound again
+        names = stale_inputs(prefetched)
+        if not names:
+            return prefetched
+    raise AcquisitionError(f"Inputs still stale before the model call: {names}", prefetched.report)
+
+
+async def make_decision_and_execute(slot: Optional[datetime] = None) -> None:
+    """Prefetch the slow inputs, wait for the slot, then refresh the volatile ones, decide and execute."""
+    logger.info(f"Starting decision-making and execution for {slot_label(slot)}")
+    # Unscheduled runs measure their latency from the start of the run
+    reference = slot or datetime.now(timezone.utc)
+    phases = {}
+    try:
+        phase_start = time.perf_counter()
+        with span("prefetch"):
+            acquired = await acquire_inputs(PREFETCH_SOURCES)
+        phases['prefetch'] = time.perf_counter() - phase_start
+        logger.info(f"Prefetch finished in {acquired.elapsed:.1f}s: {acquired.summary()}")
+        if slot is not None:
+            with span("wait_for_slot"):
+                await sleep_until(slot)
+
+        phase_start = time.perf_counter()
+        with span("finalize"):
+            acquired = await finalize_inputs(acquired)
+        phases['finalize'] = time.perf_counter() - phase_start
+        logger.info(f"Finalize finished in {phases['finalize']:.1f}s: {acquired.summary()}")
+        logger.info(f"HTTP connection timings: {summarize_timings()}, cache: {get_response_cache().stats()}")
+
+        crypto_news = acquired['crypto_news']
+        tradingview_ideas = acquired['tradingview_ideas']
+        tradingview_overall_news = acquired['tradingview_news']
+        last_decisions = acquired['last_decisions']
+        fear_and_greed = acquired['fear_and_greed']
+        tradingview_chart_images = acquired['charts']
+        current_account_status = acquired['account_status']
+
+        if NEWS_DEDUP:
+            with span("dedup"):
+                deduplicated, _ = deduplicate_sources([
+                    TextSource('crypto_news', crypto_news, text_columns=[1, 2], title_column=1,
+                               flagged=NEWS_DELTA_MODE),
+                    TextSource('tradingview_news', tradingview_overall_news, text_columns=[2], title_column=2,
+                               flagged=NEWS_DELTA_MODE),
+                    TextSource('tradingview_ideas', tradingview_ideas, text_columns=[2, 3], title_column=2),
+                ])
+            crypto_news = deduplicated['crypto_news']
+            tradingview_overall_news = deduplicated['tradingview_news']
+            tradingview_ideas = deduplicated['tradingview_ideas']
+
+        if NEWS_DELTA_MODE:
+            crypto_news = split_new_and_seen(crypto_news, digest_columns=[0, 1])
+            tradingview_overall_news = split_new_and_seen(tradingview_overall_news, digest_columns=[0, 2])
+
+        # Indicator features are supplementary; a failed candle fetch only drops them from the prompt
+        indicator_features = None
+        if acquired['candle_history'] is not None:
+            try:
+                candles_1d, candles_4h = acquired['candle_history']
+                with span("indicators"):
+                    indicator_features = build_indicator_features({"1D": candles_1d, "4H": candles_4h})
+                logger.info("Indicator features computed successfully")
+            except Exception as e:
+                logger.error(f"Failed to compute indicator features: {str(e)}")
+
+        # Determine the instructions path based on the current position type
+        if current_account_status['position']['type'] == 'Short':
+            instructions_path = "instructions_3_Short.md"
+        elif current_account_status['position']['type'] == 'Long':
+            instructions_path = "instructions_3_Long.md"
+        else:  # None or any other type (which means Closed)
+            instructions_path = "instructions_3_Closed.md"
+
+        logger.info(f"Selected instructions path: {instructions_path}")
+    except AcquisitionError as e:
+        error_message = f"Failed to acquire required data: {str(e)}. Analysis terminated."
+        logger.error(error_message)
+        send_error_notifications(error_message, DISCORD_WEBHOOK_URL)
+        return
     except Exception as e:
         error_message = f"An error occurred while fetching data: {str(e)}. Analysis terminated."
         logger.error(error_message, exc_info=True)
@@ -113,18 +246,28 @@ async def make_decision_and_execute() -> None:
         return
 
     try:
-        advice = analyze_data_with_gpt4(
-            instructions_path,
-            tradingview_chart_images,
-            crypto_news,
-            tradingview_ideas,
-            tradingview_overall_news,
-            fear_and_greed,
-            last_decisions,
-            current_account_status
-        )
+        phase_start = time.perf_counter()
+        with span("model"):
+            # The OpenAI client is synchronous; like order execution it runs off the loop so the metrics endpoint,
+            # notifier queue, cache revalidation and signal handlers keep running during the request
+            advice = await asyncio.to_thread(
+                analyze_data_with_gpt4,
+                instructions_path,
+                tradingview_chart_images,
+                crypto_news,
+                tradingview_ideas,
+                tradingview_overall_news,
+                fear_and_greed,
+                last_decisions,
+                current_account_status,
+                indicator_features
+            )
         decision = json.loads(advice)
+        decided_at = time.perf_counter()
+        phases['model'] = decided_at - phase_start
         decision['timestamp'] = int(datetime.now().timestamp())
+        if NEWS_DELTA_MODE:
+            await get_article_index().mark_pending_seen()
         logger.info(f"Decision made: {json.dumps(decision, indent=2)}")
     except json.JSONDecodeError as e:
         logger.error(f"JSON parsing failed: {e}")
@@ -138,10 +281,14 @@ async def make_decision_and_execute() -> None:
         return
 
     try:
-        order_result = execute_bybit_trade(decision, BYBIT_API_KEY_1, BYBIT_API_SECRET_1, testnet=False)
+        # pybit is blocking; run it off the event loop so background work keeps going
+        order_result = await asyncio.to_thread(execute_bybit_trade, decision, BYBIT_API_KEY_1, BYBIT_API_SECRET_1,
+                                               testnet=False, decided_at=decided_at)
         if isinstance(order_result, dict) and 'error' in order_result:
             raise Exception(order_result['error'])
+        phases['execution'] = time.perf_counter() - decided_at
         logger.info(f"Order execution result: {order_result}")
+        log_slot_latency(slot, reference, phases)
     except Exception as e:
         logger.error(f"Error in executing decision: {str(e)}")
         error_message = f"Error in executing decision: {str(e)}\nDecision: {json.dumps(decision, indent=2)}"
@@ -149,23 +296,33 @@ async def make_decision_and_execute() -> None:
         return
 
     logger.info("Saving decision to DB")
-    await save_decision_to_db(decision)
+    with span("save_decision"):
+        await save_decision_to_db(decision)
     logger.info("Decision saved to DB")
     logger.info("Sending notifications about the decision")
-    send_notifications(json.dumps(decision), tradingview_chart_images, DISCORD_WEBHOOK_URL)
+    with span("notify"):
+        send_notifications(json.dumps(decision), tradingview_chart_images, DISCORD_WEBHOOK_URL)
     logger.info("Finished sending notifications about the decision")
     logger.info("Decision making and execution process completed")
 
 
+def log_slot_latency(slot: Optional[datetime], reference: datetime, phases: Dict[str, float]) -> None:
+    latency = (datetime.now(timezone.utc) - reference).total_seconds()
+    breakdown = ", ".join(f"{name} {seconds:.1f}s" for name, seconds in phases.items())
+    logger.info(f"End-to-end latency from {'the ' + slot_label(slot) if slot else 'run start'} to the order: "
+                f"{latency:.1f}s ({breakdown})")
+
+
 def analyze_data_with_gpt4(
         instructions_path: str,
-        tradingview_chart_images: List[Dict[str, Any]],
+        tradingview_chart_images: List[ChartArtifact],
         crypto_news: Dict[str, Any],
         tradingview_ideas: Dict[str, Any],
         tradingview_overall_news: Dict[str, Any],
         fear_and_greed: Dict[str, Any],
         last_decisions: List[Dict[str, Any]],
-        current_account_status: Dict[str, Any]
+        current_account_status: Dict[str, Any],
+        indicator_features: Optional[Dict[str, Any]] = None
 ) -> Optional[str]:
     global api_token_usage
 
@@ -175,45 +332,58 @@ def analyze_data_with_gpt4(
             logger.error("No instructions found.")
             return None
 
+        # Stable prefix first (instructions, then the fixed data layout) so it is byte-identical across runs and
+        # served from the provider's prompt cache; volatile data follows and the images come last
         messages = [
             {"role": "system", "content": instructions},
+            {"role": "user", "content": DATA_LAYOUT},
         ]
 
+        # Compact data sections in the order the instructions describe them, trimmed to the token budget.
+        # Lower priority numbers are truncated last.
+        builder = PromptBuilder()
+        if indicator_features:
+            # Exact indicator values so the model does not have to read them off the charts
+            builder.add('indicator_features', format_indicator_features(indicator_features), priority=1,
+                        preformatted=True)
+        builder.add('last_decisions', last_decisions, priority=2, budget=2500, tabular=True)
+        builder.add('crypto_news', crypto_news, priority=3, budget=3000)
+        builder.add('tradingview_ideas', tradingview_ideas, priority=5, budget=3000)
+        builder.add('fear_and_greed', fear_and_greed, priority=1)
+        builder.add('tradingview_overall_news', tradingview_overall_news, priority=4, budget=1500)
+        builder.add('current_account_status', current_account_status, priority=0)
+        with span("prompt_build"):
+            sections, _ = builder.build()
+        messages.extend({"role": "user", "content": section} for section in sections)
+
         # Adding each trading view image separately
-        for chart_info in tradingview_chart_images:
-            if chart_info["image_data"]:
-                try:
-                    messages.append({
-                        "role": "user",
-                        "content": [
-                            {"type": "image_url",
-                             "image_url": {"url": f"data:image/png;base64,{chart_info['image_data']}"}}
-                        ]
-                    })
-                    logger.info(f"Added image for {chart_info['file_name']} to messages")
-                except Exception as e:
-                    logger.error(f"Error adding image for {chart_info['file_name']}: {str(e)}")
+        for chart in tradingview_chart_images:
+            if chart:
+                messages.append({"role": "user", "content": [chart.openai_content()]})
+                logger.info(f"Added image for {chart.file_name} to messages")
             else:
-                logger.warning(f"Image data not available for {chart_info['file_name']}")
-
-        # Adding other data
-        messages.extend(
-            {"role": "user", "content": json.dumps(data, ensure_ascii=False, indent=2)}
-            for data in [last_decisions, crypto_news, tradingview_ideas, fear_and_greed, tradingview_overall_news,
-                         current_account_status]
-        )
+                logger.warning(f"Image data not available for {chart.file_name}")
 
         try:
-            response = client.chat.completions.create(
-                model="chatgpt-4o-latest",
-                messages=messages,
-                response_format={"type": "json_object"}
-            )
+            start = time.perf_counter()
+            with span("openai", model="chatgpt-4o-latest") as current:
+                response = client.chat.completions.create(
+                    model="chatgpt-4o-latest",
+                    messages=messages,
+                    response_format={"type": "json_object"}
+                )
+                current.set(prompt_tokens=response.usage.prompt_tokens,
+                            completion_tokens=response.usage.completion_tokens)
+            elapsed = time.perf_counter() - start
+            # The request body is sent; drop the base64 copies of the charts
+            for chart in tradingview_chart_images:
+                chart.release_views()
 
             advice = response.choices[0].message.content
 
             # Increment the token usage counter based on the response
             api_token_usage += response.usage.total_tokens
+            record_prompt_cache_usage(response.usage, elapsed)
             logger.info(f"Finished analyze_data_with_gpt4. Updated api_token_usage: {api_token_usage}")
 
             return advice
@@ -226,17 +396,85 @@ def analyze_data_with_gpt4(
         return None
 
 
-def run_make_decision_and_execute() -> None:
-    asyncio.run(make_decision_and_execute())
-
-
-if __name__ == "__main__":
+def record_prompt_cache_usage(usage, elapsed: float) -> None:
+    details = getattr(usage, 'prompt_tokens_details', None)
+    cached_tokens = (getattr(details, 'cached_tokens', 0) or 0) if details is not None else 0
+    count('openai_tokens_total', usage.prompt_tokens - cached_tokens, kind="prompt_uncached")
+    count('openai_tokens_total', cached_tokens, kind="prompt_cached")
+    count('openai_tokens_total', usage.completion_tokens, kind="completion")
+    stats = prompt_cache_stats
+    stats["calls"] += 1
+    stats["prompt_tokens"] += usage.prompt_tokens
+    stats["cached_tokens"] += cached_tokens
+    if cached_tokens:
+        stats["hits"] += 1
+        stats["hit_latency"] += elapsed
+    else:
+        stats["misses"] += 1
+        stats["miss_latency"] += elapsed
+    hit_rate = stats["cached_tokens"] / stats["prompt_tokens"] if stats["prompt_tokens"] else 0.0
+    hit_latency = f"{stats['hit_latency'] / stats['hits']:.1f}s" if stats["hits"] else "n/a"
+    miss_latency = f"{stats['miss_latency'] / stats['misses']:.1f}s" if stats["misses"] else "n/a"
+    logger.info(f"Prompt cache: {cached_tokens}/{usage.prompt_tokens} tokens cached this call in {elapsed:.1f}s; "
+                f"cumulative hit rate {hit_rate:.1%}, avg latency cached {hit_latency} vs uncached {miss_latency}")
+
+
+async def run_decision_cycle(slot: Optional[datetime] = None) -> None:
+    with span(RUN_SPAN, slot=slot.isoformat() if slot else None):
+        try:
+            await make_decision_and_execute(slot)
+        finally:
+            # Notifications are delivered in the background; let the queue drain before the run is reported done
+            with span("notify_flush"):
+                await flush_notifiers()
+
+
+async def close_resources() -> None:
+    """Release everything kept alive between runs: notifier workers, browser, databases, HTTP pool."""
+    await close_notifiers()
+    await get_browser_pool().close()
+    if NEWS_DELTA_MODE:
+        await get_article_index().close()
+    await close_decision_repositories()
+    await close_session()
+    if live_state is not None:
+        await asyncio.to_thread(live_state.stop)
+    get_execution_client(BYBIT_API_KEY_1, BYBIT_API_SECRET_1, testnet=False).close()
+
+
+async def serve() -> None:
+    """Long-lived service: one event loop that sleeps until each UTC slot and keeps pools warm in between."""
     initialize_db()
-    run_make_decision_and_execute()
-    for hour in ["03:58", "07:58", "11:58", "15:58", "19:58", "23:58"]:
-        schedule.every().day.at(hour, "UTC").do(run_make_decision_and_execute)
+    preload_instructions(INSTRUCTION_PATHS)
+    execution_client = get_execution_client(BYBIT_API_KEY_1, BYBIT_API_SECRET_1, testnet=False)
+    await asyncio.to_thread(execution_client.warm_up)
+    if CHART_SOURCE == 'tradingview':
+        try:
+            await get_browser_pool().warm_up([url for url, _ in get_chart_images()])
+        except Exception as e:
+            logger.error(f"Browser warm-up failed, the first capture starts cold: {e}")
+    if live_state is not None:
+        execution_client.live_state = live_state.start()
+        if not await asyncio.to_thread(live_state.wait_until_fresh, 15):
+            logger.warning(f"Live state not synced yet, reads fall back to REST: {live_state.status()}")
+
+    metrics_runner = await start_metrics_server() if METRICS_PORT else None
+
+    scheduler = DecisionScheduler(run_decision_cycle, lead=PREFETCH_LEAD)
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, scheduler.stop)
+    try:
+        await scheduler.run(run_immediately=True)
+        await scheduler.wait_for_current(SHUTDOWN_TIMEOUT)
+    finally:
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.remove_signal_handler(signum)
+        await close_resources()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        logger.info("Shutdown complete")
 
-    logger.info("Scheduler initialized. Waiting for scheduled runs.")
 
-    while True:
-        schedule.run_pending()
+if __name__ == "__main__":
+    asyncio.run(serve())
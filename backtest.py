@@ -0,0 +1,159 @@
+import argparse
+import sqlite3
+import time
+
+import numpy as np
+
+from candle_store import INTERVAL_MS, get_candle_store
+from fetch_bybit_status import CANDLE_DTYPE
+from logger_setup import setup_logger
+
+logger = setup_logger(__name__)
+
+# Sizing rules from execute_bybit_trade
+LEVERAGE = 3.0
+EQUITY_FRACTION = 0.9
+TAKER_FEE = 0.00055
+
+# Target position per action; NaN keeps whatever position is open
+ACTION_TARGETS = {
+    "Open Long": 1.0,
+    "Switch to Long": 1.0,
+    "Open Short": -1.0,
+    "Switch to Short": -1.0,
+    "Close Long": 0.0,
+    "Close Short": 0.0,
+    "Maintain Long": np.nan,
+    "Maintain Short": np.nan,
+    "Stay Out of the Market": np.nan,
+}
+
+
+def load_decisions(db_path='trading_decisions.sqlite'):
+    """Decision history as (timestamps in seconds, actions) arrays in time order.
+
+    The database is opened read-only, so a missing file raises sqlite3.OperationalError instead of being created.
+    """
+    with sqlite3.connect(f"file:{db_path}?mode=ro", uri=True) as conn:
+        rows = conn.execute('SELECT timestamp, action FROM decisions ORDER BY timestamp').fetchall()
+    timestamps = np.array([row[0] for row in rows], dtype=np.int64)
+    actions = np.array([row[1] for row in rows], dtype=object)
+    return timestamps, actions
+
+
+def run_backtest(timestamps, actions, candles, initial_equity=10000.0, fee_rate=TAKER_FEE,
+                 leverage=LEVERAGE, equity_fraction=EQUITY_FRACTION):
+    """Replay decisions against candle closes.
+
+    Each decision fills at the close of the bar it was made in. Opening or switching puts
+    equity_fraction * leverage of the current equity into the new side, closing goes flat, and
+    Maintain / Stay Out keep the open position. An Open in the direction already held is treated as a
+    no-op rather than adding to the position.
+    """
+    exposure = equity_fraction * leverage
+    bar_times = candles['timestamp']
+    closes = np.asarray(candles['close'], dtype=np.float64)
+
+    decision_bars = np.searchsorted(bar_times, np.asarray(timestamps, dtype=np.int64) * 1000, side='right') - 1
+    in_range = (decision_bars >= 0) & (decision_bars < closes.size)
+    decision_bars = decision_bars[in_range]
+    targets = np.array([ACTION_TARGETS.get(action, np.nan) for action in np.asarray(actions)[in_range]],
+                       dtype=np.float64)
+
+    # Forward-fill the target position starting flat
+    targets = np.concatenate(([0.0], targets))
+    filled = np.where(~np.isnan(targets), np.arange(targets.size), 0)
+    sides = targets[np.maximum.accumulate(filled)]
+    changed = np.flatnonzero(sides[1:] != sides[:-1])
+
+    event_bars = decision_bars[changed]
+    event_prices = closes[event_bars]
+    event_sides = sides[1:][changed]
+
+    # Equity multiplier of every completed segment between two position changes
+    entry, exit_ = event_prices[:-1], event_prices[1:]
+    held = event_sides[:-1]
+    ratio = exit_ / entry
+    fee_weight = fee_rate * exposure * np.abs(held)
+    multipliers = np.clip(1.0 + exposure * held * (ratio - 1.0) - fee_weight * (1.0 + ratio), 0.0, None)
+    equity_before = initial_equity * np.concatenate(([1.0], np.cumprod(multipliers)))
+
+    # Mark every bar to market against the segment active at its close
+    first_bar = decision_bars[0] if decision_bars.size else closes.size
+    bars = np.arange(first_bar, closes.size)
+    segment = np.searchsorted(event_bars, bars, side='right') - 1
+    active = segment >= 0
+    segment = np.maximum(segment, 0)
+    side = np.where(active, event_sides[segment] if event_sides.size else 0.0, 0.0)
+    base = np.where(active, equity_before[segment] if event_sides.size else initial_equity, initial_equity)
+    entry_price = event_prices[segment] if event_prices.size else closes[bars]
+    open_fee = fee_rate * exposure * np.abs(side)
+    equity = np.clip(base * (1.0 + exposure * side * (closes[bars] / entry_price - 1.0) - open_fee), 0.0, None)
+
+    traded = held != 0
+    fees = equity_before[:-1] * fee_weight * (1.0 + ratio)
+    if event_sides.size and event_sides[-1] != 0:
+        fees = np.append(fees, equity_before[-1] * fee_rate * exposure)
+    peaks = np.maximum.accumulate(equity) if equity.size else equity
+    drawdown = equity / peaks - 1.0 if equity.size else equity
+    final_equity = float(equity[-1]) if equity.size else initial_equity
+
+    return {
+        "initial_equity": initial_equity,
+        "final_equity": round(final_equity, 2),
+        "total_return": round(final_equity / initial_equity - 1.0, 4),
+        "max_drawdown": round(float(drawdown.min()), 4) if drawdown.size else 0.0,
+        "fees_paid": round(float(fees.sum()), 2),
+        "trades": int(traded.sum()),
+        "win_rate": round(float((multipliers[traded] > 1.0).mean()), 4) if traded.any() else None,
+        "decisions": int(decision_bars.size),
+        "equity_curve": np.column_stack((bar_times[bars], equity)),
+        "drawdown": drawdown,
+    }
+
+
+def synthetic_history(decision_count, bars_per_decision=1, seed=0):
+    """Random-walk 4H candles with one random decision per bar, for benchmarking."""
+    count = decision_count * bars_per_decision + 1
+    rng = np.random.default_rng(seed)
+    candles = np.zeros(count, dtype=CANDLE_DTYPE)
+    candles['timestamp'] = np.arange(count, dtype=np.int64) * INTERVAL_MS["240"]
+    candles['close'] = 30000 * np.exp(np.cumsum(rng.normal(0, 0.01, count)))
+    action_names = np.array(list(ACTION_TARGETS), dtype=object)
+    timestamps = candles['timestamp'][:-1:bars_per_decision] // 1000 + 14280
+    actions = action_names[rng.integers(0, action_names.size, timestamps.size)]
+    return timestamps, actions, candles
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay the decisions table against stored candles.")
+    parser.add_argument("--db", default="trading_decisions.sqlite")
+    parser.add_argument("--interval", default="240", choices=sorted(INTERVAL_MS))
+    parser.add_argument("--equity", type=float, default=10000.0)
+    parser.add_argument("--fee", type=float, default=TAKER_FEE)
+    parser.add_argument("--benchmark", type=int, metavar="N",
+                        help="run on N random decisions over synthetic candles instead of the database")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.benchmark:
+        timestamps, actions, candles = synthetic_history(args.benchmark)
+    else:
+        try:
+            timestamps, actions = load_decisions(args.db)
+        except sqlite3.OperationalError as e:
+            raise SystemExit(f"No decision history in {args.db} ({e}). Run autotrade.py first or pass --db.")
+        candles = get_candle_store(args.interval).candles()
+    loaded = time.perf_counter()
+    result = run_backtest(timestamps, actions, candles, initial_equity=args.equity, fee_rate=args.fee)
+    finished = time.perf_counter()
+
+    for key in ("decisions", "trades", "win_rate", "initial_equity", "final_equity", "total_return",
+                "max_drawdown", "fees_paid"):
+        print(f"{key:>15}: {result[key]}")
+    print(f"{'load time':>15}: {(loaded - start) * 1000:.1f} ms")
+    print(f"{'backtest time':>15}: {(finished - loaded) * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
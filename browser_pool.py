@@ -0,0 +1,212 @@
+import asyncio
+import os
+from urllib.parse import urlparse
+
+from playwright.async_api import async_playwright
+
+from logger_setup import setup_logger
+
+logger = setup_logger(__name__)
+
+BROWSER_USER_DATA_DIR = os.getenv("BROWSER_USER_DATA_DIR", "browser_data")
+BROWSER_VIEWPORT = {"width": 1420, "height": 800}
+BROWSER_ARGS = [
+    '--disable-gpu',
+    '--disable-software-rasterizer',
+    '--disable-extensions',
+    '--mute-audio',
+    '--no-sandbox',
+    '--disable-setuid-sandbox',
+    '--disable-dev-shm-usage',
+]
+
+# Ad and tracker hosts requested by the TradingView chart pages
+BLOCKED_HOSTS = [
+    "doubleclick.net",
+    "googlesyndication.com",
+    "googleadservices.com",
+    "google-analytics.com",
+    "googletagmanager.com",
+    "googletagservices.com",
+    "adservice.google.com",
+    "facebook.net",
+    "connect.facebook.net",
+    "criteo.com",
+    "criteo.net",
+    "amazon-adsystem.com",
+    "adnxs.com",
+    "taboola.com",
+    "outbrain.com",
+    "scorecardresearch.com",
+    "hotjar.com",
+    "snap.licdn.com",
+    "ads.twitter.com",
+    "static.ads-twitter.com",
+]
+
+
+def is_blocked_host(url):
+    host = urlparse(url).hostname or ''
+    return any(host == blocked or host.endswith('.' + blocked) for blocked in BLOCKED_HOSTS)
+
+
+class ChartBrowserPool:
+    """Long-lived Chromium with a persistent disk cache and one warm page per chart URL."""
+
+    def __init__(self, user_data_dir=BROWSER_USER_DATA_DIR, viewport=None, launch_args=None):
+        self.user_data_dir = user_data_dir
+        self.viewport = viewport or BROWSER_VIEWPORT
+        self.launch_args = launch_args or BROWSER_ARGS
+        self._playwright = None
+        self._context = None
+        self._loop = None
+        self._pages = {}
+        self._lock = asyncio.Lock()
+        self._crashed = False
+        self.metrics = {
+            "browser_starts": 0,
+            "browser_restarts": 0,
+            "pages_opened": 0,
+            "pages_reused": 0,
+            "requests": 0,
+            "requests_blocked": 0,
+            "bytes_transferred": 0,
+        }
+
+    async def start(self):
+        os.makedirs(self.user_data_dir, exist_ok=True)
+        self._playwright = await async_playwright().start()
+        # Requests to ad hosts are failed at DNS level. Playwright's route interception would also work but
+        # it disables the HTTP cache, which is what keeps the TradingView assets warm between runs.
+        resolver_rules = ", ".join(f"MAP {host} ~NOTFOUND, MAP *.{host} ~NOTFOUND" for host in BLOCKED_HOSTS)
+        self._context = await self._playwright.chromium.launch_persistent_context(
+            self.user_data_dir,
+            headless=True,
+            viewport=self.viewport,
+            args=self.launch_args + [f"--host-resolver-rules={resolver_rules}"],
+        )
+        self._context.on("close", self._on_context_close)
+        self._context.on("requestfinished", self._on_request_finished)
+        self._context.on("requestfailed", self._on_request_failed)
+        self._loop = asyncio.get_running_loop()
+        self._crashed = False
+        self._pages = {}
+        self.metrics["browser_starts"] += 1
+        logger.info(f"Browser pool started with user data dir {self.user_data_dir}")
+
+    async def close(self):
+        for page in list(self._pages.values()):
+            try:
+                await page.close()
+            except Exception:
+                pass
+        self._pages = {}
+        if self._context is not None:
+            try:
+                await self._context.close()
+            except Exception as e:
+                logger.warning(f"Error closing browser context: {e}")
+        if self._playwright is not None:
+            try:
+                await self._playwright.stop()
+            except Exception as e:
+                logger.warning(f"Error stopping playwright: {e}")
+        self._context = None
+        self._playwright = None
+        self._loop = None
+
+    async def is_healthy(self):
+        if self._context is None or self._crashed:
+            return False
+        try:
+            page = next(iter(self._pages.values()), None)
+            if page is None:
+                page = await self._context.new_page()
+                await page.close()
+            else:
+                await asyncio.wait_for(page.evaluate("1"), timeout=10)
+            return True
+        except Exception as e:
+            logger.warning(f"Browser health check failed: {e}")
+            return False
+
+    async def ensure_healthy(self):
+        # Playwright objects are bound to the event loop that created them; the pool lives on the service loop
+        if self._loop is not None and self._loop is not asyncio.get_running_loop():
+            raise RuntimeError("Browser pool was started on another event loop; close it there before reuse")
+        async with self._lock:
+            if self._context is not None and await self.is_healthy():
+                return
+            if self._context is not None:
+                logger.warning("Restarting unhealthy browser")
+                self.metrics["browser_restarts"] += 1
+                await self.close()
+            await self.start()
+
+    async def acquire_page(self, url):
+        """Return (page, reused) for the chart URL, opening a new page when none is warm."""
+        page = self._pages.get(url)
+        if page is not None and not page.is_closed():
+            self.metrics["pages_reused"] += 1
+            return page, True
+
+        page = await self._context.new_page()
+        page.on("crash", lambda _: self._on_page_crash(url))
+        self._pages[url] = page
+        self.metrics["pages_opened"] += 1
+        return page, False
+
+    async def discard_page(self, url):
+        page = self._pages.pop(url, None)
+        if page is not None:
+            try:
+                await page.close()
+            except Exception:
+                pass
+
+    async def warm_up(self, urls):
+        """Open and load a page per chart URL so later captures only need a refresh."""
+        await self.ensure_healthy()
+
+        async def open_page(url):
+            try:
+                page, reused = await self.acquire_page(url)
+                if not reused:
+                    await page.goto(url, timeout=600000, wait_until="domcontentloaded")
+            except Exception as e:
+                logger.error(f"Failed to warm up page for {url}: {e}")
+                await self.discard_page(url)
+
+        await asyncio.gather(*(open_page(url) for url in urls))
+        logger.info(f"Browser pool warmed up with {len(self._pages)} pages")
+
+    def _on_context_close(self, _):
+        logger.warning("Browser context closed")
+        self._crashed = True
+
+    def _on_page_crash(self, url):
+        logger.warning(f"Page crashed for {url}")
+        self._pages.pop(url, None)
+
+    async def _on_request_finished(self, request):
+        self.metrics["requests"] += 1
+        try:
+            sizes = await request.sizes()
+            self.metrics["bytes_transferred"] += sizes["responseHeadersSize"] + sizes["responseBodySize"]
+        except Exception:
+            pass
+
+    def _on_request_failed(self, request):
+        self.metrics["requests"] += 1
+        if is_blocked_host(request.url):
+            self.metrics["requests_blocked"] += 1
+
+
+_browser_pool = None
+
+
+def get_browser_pool():
+    global _browser_pool
+    if _browser_pool is None:
+        _browser_pool = ChartBrowserPool()
+    return _browser_pool
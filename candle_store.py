@@ -0,0 +1,155 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from dotenv import load_dotenv
+
+from fetch_bybit_status import CANDLE_DTYPE, get_btcusdt_klines, klines_to_array
+from logger_setup import setup_logger
+
+logger = setup_logger(__name__)
+
+STORE_DIRECTORY = "market_data"
+INTERVAL_MS = {
+    "1": 60_000,
+    "5": 5 * 60_000,
+    "15": 15 * 60_000,
+    "60": 60 * 60_000,
+    "240": 4 * 60 * 60_000,
+    "D": 24 * 60 * 60_000,
+}
+# First BTCUSDT linear perpetual bar on Bybit
+HISTORY_START_MS = 1585180800000  # 2020-03-26 00:00 UTC
+PAGE_SIZE = 1000
+SYNC_WORKERS = 8
+
+
+class CandleStore:
+    """Append-only OHLCV file per interval, read back through a memory map.
+
+    The file is a flat sequence of CANDLE_DTYPE records in ascending timestamp order, so range reads are
+    binary searches over the memory-mapped timestamp column that return views instead of copies.
+    """
+
+    def __init__(self, interval, directory=STORE_DIRECTORY, symbol="BTCUSDT", category="linear"):
+        if interval not in INTERVAL_MS:
+            raise ValueError(f"Unsupported interval: {interval}")
+        self.interval = interval
+        self.interval_ms = INTERVAL_MS[interval]
+        self.path = os.path.join(directory, f"{symbol}_{category}_{interval}.bin")
+        self._map = None
+        self._map_size = -1
+        os.makedirs(directory, exist_ok=True)
+
+    def candles(self):
+        """All stored candles as a read-only memory-mapped array."""
+        size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        if size != self._map_size:
+            count = size // CANDLE_DTYPE.itemsize
+            if count:
+                self._map = np.memmap(self.path, dtype=CANDLE_DTYPE, mode='r', shape=(count,))
+            else:
+                self._map = np.empty(0, dtype=CANDLE_DTYPE)
+            self._map_size = size
+        return self._map
+
+    def __len__(self):
+        return self.candles().size
+
+    def last_timestamp(self):
+        candles = self.candles()
+        return int(candles['timestamp'][-1]) if candles.size else None
+
+    def range(self, start_ms=None, end_ms=None):
+        """Candles with start_ms <= open time <= end_ms, as a view into the memory map."""
+        candles = self.candles()
+        timestamps = candles['timestamp']
+        lower = 0 if start_ms is None else int(np.searchsorted(timestamps, start_ms, side='left'))
+        upper = candles.size if end_ms is None else int(np.searchsorted(timestamps, end_ms, side='right'))
+        return candles[lower:upper]
+
+    def tail(self, count):
+        return self.candles()[-count:]
+
+    def append(self, candles):
+        """Append candles newer than the last stored bar. Returns the number written."""
+        last = self.last_timestamp()
+        if last is not None:
+            candles = candles[candles['timestamp'] > last]
+        if not candles.size:
+            return 0
+        with open(self.path, 'ab') as f:
+            f.write(np.ascontiguousarray(candles, dtype=CANDLE_DTYPE).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        return candles.size
+
+    def sync(self, api_key, api_secret, testnet=False, now_ms=None):
+        """Fetch only the closed bars missing since the last stored one. Returns the number added."""
+        now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+        last = self.last_timestamp()
+        start = HISTORY_START_MS if last is None else last + self.interval_ms
+        # Open time of the newest closed bar
+        end = (now_ms // self.interval_ms) * self.interval_ms - self.interval_ms
+        if start > end:
+            return 0
+
+        page_span = PAGE_SIZE * self.interval_ms
+        pages = [(page_start, min(page_start + page_span - self.interval_ms, end))
+                 for page_start in range(start, end + 1, page_span)]
+        logger.info(f"Syncing {self.path}: {len(pages)} page(s) from {start} to {end}")
+
+        def fetch_page(bounds):
+            page_start, page_end = bounds
+            response = get_btcusdt_klines(api_key, api_secret, self.interval, start=page_start, end=page_end,
+                                          limit=PAGE_SIZE, testnet=testnet)
+            if not response or response.get('retCode') != 0:
+                raise Exception(f"Failed to fetch klines {page_start}-{page_end}: "
+                                f"{response.get('retMsg') if response else 'no response'}")
+            return klines_to_array(response)
+
+        with ThreadPoolExecutor(max_workers=min(SYNC_WORKERS, len(pages))) as executor:
+            fetched = list(executor.map(fetch_page, pages))
+
+        candles = np.concatenate(fetched) if fetched else np.empty(0, dtype=CANDLE_DTYPE)
+        candles = candles[(candles['timestamp'] >= start) & (candles['timestamp'] <= end)]
+        _, unique = np.unique(candles['timestamp'], return_index=True)
+        added = self.append(candles[unique])
+        logger.info(f"Synced {added} new candles into {self.path} ({len(self)} total)")
+        return added
+
+
+_stores = {}
+
+
+def get_candle_store(interval):
+    if interval not in _stores:
+        _stores[interval] = CandleStore(interval)
+    return _stores[interval]
+
+
+async def sync_candle_history(api_key, api_secret, testnet=False):
+    """Bring the daily and 4H stores up to date concurrently. Returns (candles_1d, candles_4h)."""
+    daily, four_hour = get_candle_store("D"), get_candle_store("240")
+    await asyncio.gather(
+        asyncio.to_thread(daily.sync, api_key, api_secret, testnet),
+        asyncio.to_thread(four_hour.sync, api_key, api_secret, testnet),
+    )
+    return daily.candles(), four_hour.candles()
+
+
+def main():
+    load_dotenv()
+    api_key = os.getenv('BYBIT_API_KEY_1')
+    api_secret = os.getenv('BYBIT_API_SECRET_1')
+    for interval in ("D", "240"):
+        store = get_candle_store(interval)
+        start = time.perf_counter()
+        added = store.sync(api_key, api_secret)
+        logger.info(f"{interval}: added {added}, {len(store)} stored, sync took {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
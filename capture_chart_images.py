@@ -1,10 +1,10 @@
 import asyncio
 import os
-import base64
-import io
-from PIL import Image
-from playwright.async_api import async_playwright
+from browser_pool import get_browser_pool
+from chart_artifact import ChartArtifact
+from image_optimizer import optimize_image
 from logger_setup import setup_logger
+from tracing import count, span
 
 logger = setup_logger(__name__)
 
@@ -19,12 +19,146 @@ def get_chart_images():
     return tradingview_url
 
 
-async def navigate_and_capture(page, url):
+# Readiness detection: capture as soon as the chart has rendered instead of sleeping a fixed 90 seconds
+CHART_READY_MAX_WAIT = float(os.getenv("CHART_READY_MAX_WAIT", "90"))  # hard deadline in seconds
+CHART_READY_POLL_INTERVAL = 0.5
+CHART_READY_STABLE_POLLS = 3  # consecutive polls of every pane without a significant change
+CHART_READY_MIN_PANES = 2  # price pane plus at least one indicator pane, each with something drawn on it
+# Canvases at least this many CSS pixels tall and as wide as the widest one are panes; the rest are axes
+CHART_PANE_MIN_HEIGHT = 40
+# TradingView streams quotes, so the network rarely goes idle; this is only a short hint
+CHART_NETWORK_IDLE_WAIT = 3.0
+# Share of each pane, from the left, treated as settled history; the live candle sits on the right
+CHART_HISTORY_FRACTION = 0.85
+# A probe cell counts as changed above this channel difference; the pane is stable below this share of cells
+CHART_PIXEL_TOLERANCE = 8
+CHART_CHANGED_CELLS_TOLERANCE = 0.01
+
+# Per-chart time-to-ready and how the wait ended ("converged" or "deadline") of the most recent capture, by URL
+chart_ready_times = {}
+chart_ready_outcomes = {}
+
+# Groups the full-width canvases by pane (each pane stacks a series canvas and an overlay canvas in one cell)
+# and samples every pane left of the live candle. The price and time axes, last-price labels and crosshair
+# live on narrower or shorter canvases and change on every tick, so they are skipped. A pane counts as inked
+# when some probe cells differ from its dominant (background) color.
+CHART_STATE_SCRIPT = """
+(args) => {
+    const [historyFraction, minHeight] = args;
+    const container = document.querySelector('.chart-container');
+    if (!container) return null;
+    const spinner = document.querySelector('.tv-spinner--shown, .chart-loading-screen');
+    const canvases = [...container.querySelectorAll('canvas')].filter(canvas => canvas.width && canvas.height);
+    if (!canvases.length) return {canvases: 0, panes: 0, inked: [], samples: [], loading: !!spinner};
+    const widest = Math.max(...canvases.map(canvas => canvas.width));
+    const panes = new Map();
+    for (const canvas of canvases) {
+        if (canvas.width !== widest || canvas.clientHeight < minHeight) continue;
+        if (!panes.has(canvas.parentElement)) panes.set(canvas.parentElement, []);
+        panes.get(canvas.parentElement).push(canvas);
+    }
+    const probe = document.createElement('canvas');
+    probe.width = 48;
+    probe.height = 24;
+    const ctx = probe.getContext('2d', {willReadFrequently: true});
+    const samples = [];
+    const inked = [];
+    for (const layers of panes.values()) {
+        ctx.clearRect(0, 0, probe.width, probe.height);
+        for (const canvas of layers) {
+            try {
+                ctx.drawImage(canvas, 0, 0, Math.floor(canvas.width * historyFraction), canvas.height,
+                              0, 0, probe.width, probe.height);
+            } catch (e) {
+                continue;
+            }
+        }
+        const pixels = ctx.getImageData(0, 0, probe.width, probe.height).data;
+        const colors = new Map();
+        for (let i = 0; i < pixels.length; i += 4) {
+            const color = pixels.slice(i, i + 4).join();
+            colors.set(color, (colors.get(color) || 0) + 1);
+            samples.push(pixels[i], pixels[i + 1], pixels[i + 2]);
+        }
+        inked.push(pixels.length / 4 - Math.max(...colors.values()));
+    }
+    return {canvases: canvases.length, panes: panes.size, inked: inked, samples: samples, loading: !!spinner};
+}
+"""
+
+
+def changed_share(previous, samples, tolerance=CHART_PIXEL_TOLERANCE):
+    """Share of probe cells whose color moved by more than tolerance on any channel."""
+    if previous is None or len(previous) != len(samples) or not samples:
+        return 1.0
+    changed = 0
+    for index in range(0, len(samples), 3):
+        if any(abs(samples[index + channel] - previous[index + channel]) > tolerance for channel in range(3)):
+            changed += 1
+    return changed / (len(samples) // 3)
+
+
+async def wait_for_chart_ready(page, max_wait=CHART_READY_MAX_WAIT, poll_interval=CHART_READY_POLL_INTERVAL,
+                               stable_polls=CHART_READY_STABLE_POLLS, min_panes=CHART_READY_MIN_PANES):
+    """Wait until every chart pane is drawn and stable. Returns (outcome, seconds waited).
+
+    outcome is "converged" when the panes settled, "deadline" when max_wait ran out first and "no_container"
+    when the chart never appeared.
+    """
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    deadline = start + max_wait
+
+    try:
+        await page.wait_for_selector(".chart-container", timeout=max_wait * 1000)
+    except Exception as e:
+        logger.warning(f"Chart container did not appear: {e}")
+        return "no_container", loop.time() - start
+
+    try:
+        await page.wait_for_load_state("networkidle",
+                                       timeout=min(CHART_NETWORK_IDLE_WAIT, max(deadline - loop.time(), 0)) * 1000)
+    except Exception:
+        logger.info("Network did not go idle, continuing with canvas checks")
+
+    previous = None
+    stable = 0
+    while loop.time() < deadline:
+        state = await page.evaluate(CHART_STATE_SCRIPT, [CHART_HISTORY_FRACTION, CHART_PANE_MIN_HEIGHT])
+        if state and not state["loading"] and state["panes"] >= min_panes and all(state["inked"]):
+            if changed_share(previous, state["samples"]) <= CHART_CHANGED_CELLS_TOLERANCE:
+                stable += 1
+                if stable >= stable_polls:
+                    return "converged", loop.time() - start
+            else:
+                stable = 1
+            previous = state["samples"]
+        else:
+            stable = 0
+            previous = None
+        await asyncio.sleep(poll_interval)
+
+    return "deadline", loop.time() - start
+
+
+async def navigate_and_capture(page, url, reload=False):
     try:
-        logger.info(f"Navigating to {url}")
-        await page.goto(url, timeout=600000)
-        logger.info("Waiting 90 seconds for elements to load...")
-        await asyncio.sleep(90)  # Wait for all elements to load
+        if reload:
+            logger.info(f"Refreshing warm page for {url}")
+            await page.reload(timeout=600000, wait_until="domcontentloaded")
+        else:
+            logger.info(f"Navigating to {url}")
+            await page.goto(url, timeout=600000, wait_until="domcontentloaded")
+        with span("chart.ready", url=url) as current:
+            outcome, time_to_ready = await wait_for_chart_ready(page)
+            current.set(outcome=outcome)
+        chart_ready_times[url] = time_to_ready
+        chart_ready_outcomes[url] = outcome
+        count('chart_ready_total', outcome=outcome)
+        if outcome == "converged":
+            logger.info(f"Chart ready after {time_to_ready:.1f}s: {url}")
+        else:
+            logger.warning(f"Chart not stable after {time_to_ready:.1f}s ({outcome}), capturing anyway: {url}")
         chart_container = await page.query_selector(".chart-container")
         return await chart_container.screenshot(type='png')
     except Exception as e:
@@ -33,31 +167,51 @@ async def navigate_and_capture(page, url):
 
 
 async def process_image(png_bytes, file_name):
+    """Save the full-size PNG and return the optimized chart for the model, or None."""
     if png_bytes:
         try:
-            image = Image.open(io.BytesIO(png_bytes))
             image_path = os.path.join("captured_images", f"{file_name}.png")
-            image.save(image_path, format="PNG")
+            with open(image_path, "wb") as file:
+                file.write(png_bytes)
             logger.info(f"Image saved as {file_name}.png")
 
-            image_data = base64.b64encode(png_bytes).decode("utf-8")
-            return image_data
+            with span("chart.optimize", file_name=file_name) as current:
+                image = await asyncio.to_thread(optimize_image, png_bytes)
+                report = image.report
+                current.set(format=report['format'], original_bytes=report['original_bytes'], bytes=report['bytes'])
+            count('chart_bytes_total', report['original_bytes'], stage="captured")
+            count('chart_bytes_total', report['bytes'], stage="optimized")
+            logger.info(f"Optimized {file_name}: {report['original_bytes']} -> {report['bytes']} bytes "
+                        f"({report['format']}, {report['size']}), ~{report['tokens_saved']} image tokens saved "
+                        f"at detail={report['detail']}, PSNR {report['psnr'] or 'lossless'}")
+            return image
         except Exception as e:
             logger.error(f"Error processing image: {e}")
     return None
 
 
-async def capture_screenshot_with_retry(url, file_name, context, max_retries=4):
+def chart_result(file_name, image, time_to_ready):
+    """Chart handed to the model and the notifiers; falsy when the capture failed."""
+    if image is None:
+        return ChartArtifact(file_name, time_to_ready=time_to_ready)
+    return ChartArtifact(file_name, image.data, image.mime_type, image.detail, time_to_ready, image.report)
+
+
+async def capture_screenshot_with_retry(url, file_name, pool, max_retries=4):
     for attempt in range(max_retries):
+        if attempt:
+            count('chart_capture_retries_total')
         try:
-            page = await context.new_page()
-            png_bytes = await navigate_and_capture(page, url)
-            image_data = await process_image(png_bytes, file_name)
-            await page.close()
-            if image_data:
-                return image_data
+            page, reused = await pool.acquire_page(url)
+            png_bytes = await navigate_and_capture(page, url, reload=reused)
+            image = await process_image(png_bytes, file_name)
+            if image:
+                return image
+            # Start the next attempt from a fresh page
+            await pool.discard_page(url)
         except Exception as e:
             logger.error(f"Attempt {attempt + 1} failed for {url}: {e}")
+            await pool.discard_page(url)
             if attempt == max_retries - 1:
                 logger.error(f"All {max_retries} attempts failed for {url}")
                 return None
@@ -67,40 +221,40 @@ async def capture_screenshot_with_retry(url, file_name, context, max_retries=4):
 
 async def capture_tradingview_charts(url_list):
     os.makedirs("captured_images", exist_ok=True)
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True, args=[
-            '--disable-gpu',
-            '--disable-software-rasterizer',
-            '--disable-extensions',
-            '--mute-audio',
-            '--no-sandbox',
-            '--disable-setuid-sandbox',
-            '--disable-dev-shm-usage',
-        ])
-        context = await browser.new_context(viewport={"width": 1420, "height": 800})
+    pool = get_browser_pool()
+    await pool.ensure_healthy()
 
-        semaphore = asyncio.Semaphore(3)
+    semaphore = asyncio.Semaphore(3)
 
-        async def process_url(url, file_name):
-            async with semaphore:
-                image_data = await capture_screenshot_with_retry(url, file_name, context)
-                return {"file_name": file_name, "image_data": image_data}
+    async def process_url(url, file_name):
+        async with semaphore:
+            with span("chart.capture", file_name=file_name):
+                image = await capture_screenshot_with_retry(url, file_name, pool)
+            return chart_result(file_name, image, chart_ready_times.get(url))
 
-        tasks = [process_url(url, file_name) for url, file_name in url_list]
-        results = await asyncio.gather(*tasks)
+    tasks = [process_url(url, file_name) for url, file_name in url_list]
+    results = await asyncio.gather(*tasks)
 
-        await browser.close()
-        return results  # This is now a list of dictionaries
+    logger.info(f"Browser pool metrics: {pool.metrics}")
+    return results  # A list of ChartArtifact
+
+
+async def capture_and_close(url_list):
+    try:
+        return await capture_tradingview_charts(url_list)
+    finally:
+        await get_browser_pool().close()
 
 
 def main():
-    results = asyncio.run(capture_tradingview_charts(tradingview_url))
+    results = asyncio.run(capture_and_close(tradingview_url))
     logger.info("Completed all captures.")
-    for result in results:
-        file_name = result["file_name"]
-        image_data = result["image_data"]
-        if image_data:
-            logger.info(f"Result: {file_name} - Image Data Length: {len(image_data)}")
+    for (url, _), result in zip(tradingview_url, results):
+        file_name = result.file_name
+        if result:
+            outcome = chart_ready_outcomes.get(url)
+            logger.info(f"Result: {file_name} - Image Size: {result.size} bytes - "
+                        f"Time to ready: {result.time_to_ready:.1f}s ({outcome})")
         else:
             logger.warning(f"Failed to capture image for {file_name} after all retries")
 
@@ -0,0 +1,99 @@
+import base64
+import gc
+import io
+import os
+import tracemalloc
+from functools import cached_property
+
+from logger_setup import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class ChartArtifact:
+    """One chart image whose encoded bytes are held once; consumer-specific views are derived on demand.
+
+    data is None when the capture failed. The OpenAI data URL is built on first use and can be released once
+    the request is sent; Discord receives the bytes object itself, without decoding or copying.
+    """
+
+    def __init__(self, file_name, data=None, mime_type='image/png', detail='high', time_to_ready=None, report=None):
+        self.file_name = file_name
+        self.data = data
+        self.mime_type = mime_type
+        self.detail = detail
+        self.time_to_ready = time_to_ready
+        self.report = report
+
+    def __bool__(self):
+        return self.data is not None
+
+    @property
+    def size(self):
+        return len(self.data) if self.data is not None else 0
+
+    @property
+    def extension(self):
+        return self.mime_type.split('/')[1]
+
+    @cached_property
+    def data_url(self):
+        return f"data:{self.mime_type};base64,{base64.b64encode(self.data).decode('ascii')}"
+
+    def openai_content(self):
+        return {"type": "image_url", "image_url": {"url": self.data_url, "detail": self.detail}}
+
+    def discord_file(self):
+        """(file name, bytes, content type) tuple for a multipart upload; shares the underlying buffer."""
+        return f"{self.file_name}.{self.extension}", self.data, self.mime_type
+
+    def release_views(self):
+        self.__dict__.pop('data_url', None)
+
+
+def _pipeline_peak(pipeline, charts):
+    gc.collect()
+    tracemalloc.start()
+    pipeline(charts)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def _base64_pipeline(charts):
+    """The previous flow: base64 strings in the chart dicts, a data URL per message, two decodes for notifications."""
+    images = [{"file_name": name, "image_data": base64.b64encode(data).decode("utf-8")} for name, data in charts]
+    del charts[:]
+    messages = [{"url": f"data:image/png;base64,{image['image_data']}"} for image in images]
+    discord_files = [(f"{image['file_name']}.png", base64.b64decode(image['image_data']), 'image/png')
+                     for image in images]
+    telegram_files = [(f"{image['file_name']}.png", io.BytesIO(base64.b64decode(image['image_data'])), 'image/png')
+                      for image in images]
+    return messages, discord_files, telegram_files
+
+
+def _artifact_pipeline(charts):
+    artifacts = [ChartArtifact(name, data) for name, data in charts]
+    del charts[:]
+    messages = [artifact.openai_content() for artifact in artifacts]
+    for artifact in artifacts:
+        artifact.release_views()
+    del messages
+    discord_files = [artifact.discord_file() for artifact in artifacts]
+    return discord_files
+
+
+def main(chart_count=3, chart_bytes=600_000):
+    """Compare peak traced memory of the base64 flow and the artifact flow for the same chart bytes."""
+    peaks = {}
+    for name, pipeline in (("base64 strings", _base64_pipeline), ("ChartArtifact", _artifact_pipeline)):
+        charts = [(f"chart{i}", os.urandom(chart_bytes)) for i in range(chart_count)]
+        payload = sum(len(data) for _, data in charts)
+        peaks[name] = _pipeline_peak(pipeline, charts)
+        logger.info(f"{name}: peak {peaks[name] / 1e6:.2f} MB over {payload / 1e6:.2f} MB of images "
+                    f"({peaks[name] / payload:.2f}x)")
+    logger.info(f"Peak memory reduced by {(1 - peaks['ChartArtifact'] / peaks['base64 strings']):.0%}")
+
+
+if __name__ == '__main__':
+    main()
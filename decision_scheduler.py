@@ -0,0 +1,220 @@
+import asyncio
+import os
+from datetime import datetime, time, timedelta, timezone
+
+from logger_setup import setup_logger
+
+logger = setup_logger(__name__)
+
+# UTC times of day ("HH:MM" or "HH:MM:SS") at which a decision is made
+DECISION_SLOTS = [slot.strip() for slot in
+                  os.getenv('DECISION_SLOTS', '03:58,07:58,11:58,15:58,19:58,23:58').split(',')]
+# A slot found overdue (the previous run overran it, or the machine was suspended) still runs when it is at
+# most this many seconds late; older slots are skipped
+MISSED_SLOT_GRACE = float(os.getenv('MISSED_SLOT_GRACE', '900'))
+# Longest single sleep, so wall-clock jumps after a suspend or clock change are noticed within a minute
+MAX_SLEEP = 60
+
+
+def parse_slot(slot):
+    return time(*(int(part) for part in slot.split(':')))
+
+
+def next_slot(after, slots=DECISION_SLOTS):
+    """The first slot strictly after the given UTC datetime."""
+    candidates = [datetime.combine(after.date() + timedelta(days=offset), parse_slot(slot), tzinfo=timezone.utc)
+                  for offset in (0, 1) for slot in slots]
+    return min(candidate for candidate in candidates if candidate > after)
+
+
+async def sleep_until(moment):
+    """Sleep until a UTC datetime in steps of at most MAX_SLEEP, so a suspend or clock change cannot oversleep it."""
+    while (remaining := (moment - datetime.now(timezone.utc)).total_seconds()) > 0:
+        await asyncio.sleep(min(remaining, MAX_SLEEP))
+
+
+def slot_label(slot):
+    return f"slot {slot:%Y-%m-%d %H:%M} UTC" if slot is not None else "manual trigger"
+
+
+class DecisionScheduler:
+    """Runs an async job at fixed UTC slots on the running event loop, never more than one run at a time.
+
+    The job is called with the slot it runs for (None for an unscheduled run), lead seconds ahead of it so it
+    can prepare; waiting for the slot itself is up to the job. Several overdue slots collapse into the latest
+    one, which runs late within MISSED_SLOT_GRACE and is skipped otherwise. stop() lets the current run
+    finish; a second stop() cancels it.
+    """
+
+    def __init__(self, job, slots=DECISION_SLOTS, grace=MISSED_SLOT_GRACE, lead=0.0, clock=None):
+        self.job = job
+        self.slots = slots
+        self.grace = grace
+        self.lead = timedelta(seconds=lead)
+        self.clock = clock or (lambda: datetime.now(timezone.utc))
+        self.history = []
+        self._stopping = asyncio.Event()
+        self._current = None
+
+    @property
+    def busy(self):
+        return self._current is not None and not self._current.done()
+
+    async def wait(self, seconds):
+        """Sleep for up to seconds; True when stop() was called meanwhile."""
+        try:
+            await asyncio.wait_for(self._stopping.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+        return self._stopping.is_set()
+
+    async def run_once(self, slot=None):
+        """Run the job now unless a run is already in progress; returns whether it ran."""
+        if self.busy:
+            logger.warning(f"Run for {slot_label(slot)} skipped: the previous run is still in progress")
+            self.history.append((slot, "overlap"))
+            return False
+        started = asyncio.get_running_loop().time()
+        self._current = asyncio.ensure_future(self.job(slot))
+        try:
+            # Shielded so stopping the scheduler lets the run finish instead of interrupting it
+            await asyncio.shield(self._current)
+            status = "ok"
+        except asyncio.CancelledError:
+            status = "cancelled"
+            if not self._current.cancelled():
+                raise
+        except Exception as e:
+            logger.error(f"Run for {slot_label(slot)} failed: {e}")
+            status = "error"
+        elapsed = asyncio.get_running_loop().time() - started
+        logger.info(f"Run for {slot_label(slot)} finished ({status}) in {elapsed:.1f}s")
+        self.history.append((slot, status))
+        return True
+
+    async def run(self, run_immediately=False):
+        if run_immediately and not self._stopping.is_set():
+            await self.run_once()
+        last = self.clock()
+        logger.info(f"Scheduler started. Next run at {next_slot(last, self.slots) - self.lead:%Y-%m-%d %H:%M:%S} "
+                    f"UTC")
+        while not self._stopping.is_set():
+            slot = next_slot(last, self.slots)
+            remaining = (slot - self.lead - self.clock()).total_seconds()
+            if remaining > 0:
+                if await self.wait(min(remaining, MAX_SLEEP)):
+                    break
+                continue
+
+            now = self.clock()
+            following = next_slot(slot, self.slots)
+            while following - self.lead <= now:
+                logger.warning(f"Slot {slot:%Y-%m-%d %H:%M} UTC was missed")
+                self.history.append((slot, "missed"))
+                slot, following = following, next_slot(following, self.slots)
+            last = slot
+
+            lateness = (now - slot).total_seconds()
+            if lateness > self.grace:
+                logger.warning(f"Slot {slot:%Y-%m-%d %H:%M} UTC skipped: {lateness:.0f}s late, "
+                               f"grace is {self.grace:.0f}s")
+                self.history.append((slot, "missed"))
+                continue
+            if lateness > 1:
+                logger.warning(f"Slot {slot:%Y-%m-%d %H:%M} UTC is running {lateness:.0f}s late")
+            await self.run_once(slot)
+        logger.info("Scheduler stopped")
+
+    def stop(self):
+        if self._stopping.is_set() and self.busy:
+            logger.warning("Second stop request: cancelling the run in progress")
+            self._current.cancel()
+            return
+        logger.info("Stopping scheduler" + (" after the run in progress" if self.busy else ""))
+        self._stopping.set()
+
+    async def wait_for_current(self, timeout):
+        """Wait for a run in progress to finish, cancelling it after timeout seconds."""
+        if not self.busy:
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(self._current), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Run still in progress after {timeout}s, cancelling it")
+            self._current.cancel()
+            await asyncio.gather(self._current, return_exceptions=True)
+        except Exception:
+            pass
+
+
+class _SimulatedClock:
+    """Wall clock for main() that only moves when the scheduler sleeps or a run takes time."""
+
+    def __init__(self, start):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += timedelta(seconds=seconds)
+
+
+def main():
+    """Simulate two days of slots, including an overrunning job and a suspend, without real waiting."""
+    clock = _SimulatedClock(datetime(2024, 8, 27, 0, 0, tzinfo=timezone.utc))
+    durations = {datetime(2024, 8, 27, 7, 58, tzinfo=timezone.utc): 4 * 3600 + 120}
+    runs = []
+    starts = []
+
+    async def job(slot):
+        runs.append(slot)
+        starts.append(clock.now)
+        clock.advance(durations.get(slot, 90))
+        await asyncio.sleep(0)
+
+    async def simulate(lead):
+        scheduler = DecisionScheduler(job, grace=900, lead=lead, clock=clock)
+
+        async def wait(seconds):
+            clock.advance(seconds)
+            # Suspended from 13:00 to 15:50: the scheduler must not sleep through 15:58, and 11:58 already ran
+            if datetime(2024, 8, 27, 13, 0, tzinfo=timezone.utc) <= clock.now < \
+                    datetime(2024, 8, 27, 13, 1, tzinfo=timezone.utc):
+                clock.advance(170 * 60)
+            # Woken at 20:10: 19:58 is 12 minutes late and still runs
+            if datetime(2024, 8, 27, 18, 0, tzinfo=timezone.utc) <= clock.now < \
+                    datetime(2024, 8, 27, 18, 1, tzinfo=timezone.utc):
+                clock.advance(130 * 60)
+            # Woken at 08:30 the next day: 03:58 and 07:58 are collapsed and skipped
+            if datetime(2024, 8, 28, 0, 0, tzinfo=timezone.utc) <= clock.now < \
+                    datetime(2024, 8, 28, 0, 1, tzinfo=timezone.utc):
+                clock.advance(510 * 60)
+            if clock.now >= datetime(2024, 8, 28, 12, 0, tzinfo=timezone.utc):
+                scheduler.stop()
+            await asyncio.sleep(0)
+            return scheduler._stopping.is_set()
+
+        scheduler.wait = wait
+        await scheduler.run()
+        return scheduler.history
+
+    for lead in (0, 360):
+        clock.now = datetime(2024, 8, 27, 0, 0, tzinfo=timezone.utc)
+        runs.clear()
+        starts.clear()
+        history = asyncio.run(simulate(lead))
+        for slot, status in history:
+            logger.info(f"lead {lead}s: {slot:%Y-%m-%d %H:%M} {status}")
+        ran = [f"{slot:%d %H:%M}" for slot in runs]
+        # 07:58 overran until 12:00, so 11:58 was at most 122 s late and still ran
+        assert ran == ["27 03:58", "27 07:58", "27 11:58", "27 15:58", "27 19:58", "27 23:58", "28 11:58"], ran
+        missed = [f"{slot:%d %H:%M}" for slot, status in history if status == "missed"]
+        assert missed == ["28 03:58", "28 07:58"], missed
+        # Jobs start lead seconds ahead of their slot
+        assert starts[0] == runs[0] - timedelta(seconds=lead), starts[0]
+    logger.info("Scheduler simulation passed")
+
+
+if __name__ == '__main__':
+    main()
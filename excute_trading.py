@@ -1,164 +1,375 @@
 import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal, ROUND_DOWN
 
 from dotenv import load_dotenv
+from pybit.exceptions import InvalidRequestError
 from pybit.unified_trading import HTTP
 from logger_setup import setup_logger
+from tracing import count, span
 
 logger = setup_logger(__name__)
 
 
-def execute_bybit_trade(decision, api_key, api_secret, testnet=True):
-    # Initialize the HTTP session
-    session = HTTP(
-        testnet=testnet,
-        api_key=api_key,
-        api_secret=api_secret
-    )
-
-    # Extract trade details
-    action = decision['action']
-
-    # Set desired leverage
-    desired_leverage = 3.0
-
-    # Get current position
-    position_info = session.get_positions(category="linear", symbol="BTCUSDT")
-    if position_info['retCode'] != 0:
-        raise Exception(f"Failed to get position info: {position_info['retMsg']}")
-
-    current_position = position_info['result']['list'][0]
-    current_leverage = float(current_position['leverage'])
-    current_size = float(current_position['size'])
-    current_side = current_position['side']
+SYMBOL = "BTCUSDT"
+DESIRED_LEVERAGE = 3.0
+EQUITY_FRACTION = 0.9
+# Instrument filters change rarely; refresh them hourly
+INSTRUMENT_CACHE_TTL = 3600
+TRADING_ACTIONS = ["Open Long", "Open Short", "Close Long", "Close Short", "Switch to Long", "Switch to Short"]
+LEVERAGE_NOT_MODIFIED = 110043
+DUPLICATE_ORDER_LINK_ID = 110072
+ORDER_RETRIES = 3
+ORDER_RETRY_BACKOFF = 0.25  # seconds before the first retry, doubled for each further one
+ACTION_CODES = {"Open Long": "ol", "Open Short": "os", "Close Long": "cl", "Close Short": "cs",
+                "Switch to Long": "sl", "Switch to Short": "ss"}
+
+
+class ExecutionClient:
+    """Long-lived Bybit client for order execution.
+
+    Keeps one pybit session (and so one pooled HTTPS connection), caches the instrument filters and the
+    leverage already applied, and runs the read-only pre-trade queries concurrently. With a fresh live_state
+    (live_state.LiveState) the pre-trade reads come from memory instead.
+    """
+
+    def __init__(self, api_key, api_secret, testnet=False, session=None, live_state=None):
+        # session can be any object with the pybit HTTP interface, such as mock_exchange.MockExchange
+        self.session = session or HTTP(
+            testnet=testnet,
+            api_key=api_key,
+            api_secret=api_secret
+        )
+        self._executor = ThreadPoolExecutor(max_workers=3, thread_name_prefix="bybit-execution")
+        self._filters = None
+        self._filters_loaded_at = 0.0
+        self._leverage = None
+        self.live_state = live_state
+        self.latencies = deque(maxlen=100)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    def instrument_filters(self):
+        if self._filters is None or time.monotonic() - self._filters_loaded_at > INSTRUMENT_CACHE_TTL:
+            info = self.session.get_instruments_info(category="linear", symbol=SYMBOL)
+            if info['retCode'] != 0:
+                raise Exception(f"Failed to get instrument info: {info['retMsg']}")
+            instrument = info['result']['list'][0]
+            self._filters = {
+                "qty_step": Decimal(instrument['lotSizeFilter']['qtyStep']),
+                "min_qty": Decimal(instrument['lotSizeFilter']['minOrderQty']),
+                "max_qty": Decimal(instrument['lotSizeFilter']['maxOrderQty']),
+            }
+            self._filters_loaded_at = time.monotonic()
+            logger.info(f"Instrument filters for {SYMBOL}: {self._filters}")
+        return self._filters
+
+    def round_qty(self, qty):
+        """Round a quantity down to the lot-size step; None when it is below the minimum order size."""
+        filters = self.instrument_filters()
+        steps = (Decimal(str(qty)) / filters["qty_step"]).to_integral_value(rounding=ROUND_DOWN)
+        rounded = min(steps * filters["qty_step"], filters["max_qty"])
+        return rounded if rounded >= filters["min_qty"] else None
+
+    def warm_up(self):
+        """Load the instrument filters before the first trade so they are off the latency path."""
+        try:
+            self.instrument_filters()
+        except Exception as e:
+            logger.warning(f"Could not preload instrument filters: {e}")
 
-    logger.info(f"Current leverage: {current_leverage}")
-    logger.info(f"Current position: {current_size} ({current_side})")
+    def _position(self):
+        position_info = self.session.get_positions(category="linear", symbol=SYMBOL)
+        if position_info['retCode'] != 0:
+            raise Exception(f"Failed to get position info: {position_info['retMsg']}")
+        return position_info['result']['list'][0]
 
-    if action in ["Open Long", "Open Short", "Close Long", "Close Short", "Switch to Long", "Switch to Short"]:
-        # Get account balance
-        account_info = session.get_wallet_balance(accountType="UNIFIED")
+    def _balance(self):
+        account_info = self.session.get_wallet_balance(accountType="UNIFIED")
         if account_info['retCode'] != 0:
             raise Exception(f"Failed to get account balance: {account_info['retMsg']}")
+        return float(account_info['result']['list'][0]['totalEquity'])
 
-        balance = float(account_info['result']['list'][0]['totalEquity'])
-
-        # Get current market price
-        ticker = session.get_tickers(category="linear", symbol="BTCUSDT")
+    def _price(self):
+        ticker = self.session.get_tickers(category="linear", symbol=SYMBOL)
         if ticker['retCode'] != 0:
             raise Exception(f"Failed to get ticker: {ticker['retMsg']}")
-
-        current_price = float(ticker['result']['list'][0]['lastPrice'])
-
-        # Check if leverage needs to be changed
-        if current_leverage != desired_leverage:
+        return float(ticker['result']['list'][0]['lastPrice'])
+
+    def pretrade_snapshot(self, include_market=True):
+        """Position, and for trades also equity, last price and instrument filters, fetched concurrently."""
+        live = self.live_state
+        if live is not None and live.is_fresh():
+            with span("bybit.pretrade", source="live_state"):
+                snapshot = {"position": live.position}
+                if include_market:
+                    snapshot.update(balance=live.equity(), price=live.last_price(),
+                                    filters=self.instrument_filters())
+                return snapshot
+        if live is not None:
+            logger.warning(f"Live state is stale, reading pre-trade data over REST: {live.status()}")
+        with span("bybit.pretrade", source="rest"):
+            futures = {"position": self._executor.submit(self._position)}
+            if include_market:
+                futures["balance"] = self._executor.submit(self._balance)
+                futures["price"] = self._executor.submit(self._price)
+                futures["filters"] = self._executor.submit(self.instrument_filters)
+            return {name: future.result() for name, future in futures.items()}
+
+    def ensure_leverage(self, current_leverage, desired_leverage=DESIRED_LEVERAGE):
+        if current_leverage == desired_leverage:
+            self._leverage = current_leverage
+            logger.info(f"Leverage is already set to {current_leverage}. No change needed.")
+            return current_leverage
+        try:
+            leverage_result = self.session.set_leverage(
+                category="linear",
+                symbol=SYMBOL,
+                buyLeverage=str(desired_leverage),
+                sellLeverage=str(desired_leverage)
+            )
+            if leverage_result['retCode'] not in (0, LEVERAGE_NOT_MODIFIED):
+                logger.warning(f"Failed to set leverage: {leverage_result['retMsg']}. Will use current leverage.")
+                return current_leverage
+            logger.info(f"Leverage successfully set to {desired_leverage}")
+            self._leverage = desired_leverage
+            return desired_leverage
+        except Exception as e:
+            if getattr(e, 'status_code', None) == LEVERAGE_NOT_MODIFIED:
+                self._leverage = desired_leverage
+                return desired_leverage
+            logger.warning(f"An error occurred while setting leverage: {str(e)}. Will use current leverage.")
+            return current_leverage
+
+    def _record_latency(self, decided_at, reads, leverage, submitted, acknowledged):
+        latency = {
+            "decision_to_submit_ms": round((submitted - decided_at) * 1000, 1),
+            "reads_ms": round(reads * 1000, 1),
+            "leverage_ms": round(leverage * 1000, 1),
+            "ack_ms": round((acknowledged - submitted) * 1000, 1),
+        }
+        self.latencies.append(latency)
+        logger.info(f"Execution latency: decision to order submission {latency['decision_to_submit_ms']} ms "
+                    f"(pre-trade reads {latency['reads_ms']} ms, leverage {latency['leverage_ms']} ms), "
+                    f"exchange ack {latency['ack_ms']} ms")
+        return latency
+
+    def switch_orders(self, current_side, size, target_side, new_qty, link_id):
+        """Orders moving the position from (current_side, size) to new_qty on target_side.
+
+        An opposite position is flipped with one netted order of size + new_qty. Only when that exceeds the
+        maximum order size is it split into a reduce-only close followed by the open.
+        """
+        if size == 0:
+            return [order_params(target_side, new_qty, link_id)]
+        if current_side != target_side:
+            netted = size + new_qty
+            if netted <= self.instrument_filters()["max_qty"]:
+                return [order_params(target_side, netted, link_id)]
+            return [order_params(target_side, size, f"{link_id}-c", reduce_only=True),
+                    order_params(target_side, new_qty, f"{link_id}-o")]
+        # Already on the target side: resize to the new target instead of closing and reopening
+        delta = new_qty - size
+        if abs(delta) < self.instrument_filters()["min_qty"]:
+            return []
+        if delta > 0:
+            return [order_params(target_side, delta, link_id)]
+        return [order_params(opposite_side(target_side), -delta, link_id, reduce_only=True)]
+
+    def place_order(self, params):
+        """Place an order, retrying transport failures with the same orderLinkId so a retry never doubles it."""
+        with span("bybit.order", link_id=params["orderLinkId"], side=params["side"], qty=params["qty"],
+                  reduce_only=params.get("reduceOnly", False)) as current:
+            result = self._place_order(params, current)
+        count('orders_total', side=params["side"])
+        return result
+
+    def _place_order(self, params, current):
+        for attempt in range(ORDER_RETRIES):
+            current.set(attempts=attempt + 1)
+            if attempt:
+                count('order_retries_total')
+                time.sleep(ORDER_RETRY_BACKOFF * 2 ** (attempt - 1))
             try:
-                leverage_result = session.set_leverage(
-                    category="linear",
-                    symbol="BTCUSDT",
-                    buyLeverage=str(desired_leverage),
-                    sellLeverage=str(desired_leverage)
-                )
-                if leverage_result['retCode'] != 0:
-                    logger.warning(f"Failed to set leverage: {leverage_result['retMsg']}. Will use current leverage.")
+                order = self.session.place_order(**params)
+            except InvalidRequestError as e:
+                if e.status_code == DUPLICATE_ORDER_LINK_ID:
+                    return self._existing_order(params["orderLinkId"])
+                raise Exception(f"Failed to place order: {e.message}")
+            except Exception as e:
+                logger.warning(f"Order {params['orderLinkId']} attempt {attempt + 1} failed: {e}")
+                continue
+            if order['retCode'] == DUPLICATE_ORDER_LINK_ID:
+                return self._existing_order(params["orderLinkId"])
+            if order['retCode'] != 0:
+                raise Exception(f"Failed to place order: {order['retMsg']}")
+            return order['result']
+        # The last attempt may still have reached the exchange
+        existing = self._existing_order(params["orderLinkId"], required=False)
+        if existing is not None:
+            return existing
+        raise Exception(f"Failed to place order {params['orderLinkId']} after {ORDER_RETRIES} attempts")
+
+    def _existing_order(self, link_id, required=True):
+        order = self.live_state.order(link_id) if self.live_state is not None else None
+        if order is not None:
+            logger.info(f"Order {link_id} was already placed: {order['orderId']}")
+            return {"orderId": order['orderId'], "orderLinkId": link_id}
+        history = self.session.get_order_history(category="linear", symbol=SYMBOL, orderLinkId=link_id)
+        orders = history['result']['list'] if history.get('retCode') == 0 else []
+        if not orders:
+            if required:
+                raise Exception(f"Order {link_id} reported as duplicate but not found")
+            return None
+        logger.info(f"Order {link_id} was already placed: {orders[0]['orderId']}")
+        return {"orderId": orders[0]['orderId'], "orderLinkId": link_id}
+
+    def execute(self, decision, decided_at=None):
+        """Execute a decision; decided_at is the time.perf_counter() value when the decision was parsed."""
+        with span("bybit.execute", action=decision.get('action')):
+            return self._execute(decision, decided_at)
+
+    def _execute(self, decision, decided_at=None):
+        decided_at = decided_at if decided_at is not None else time.perf_counter()
+        action = decision['action']
+        if action not in TRADING_ACTIONS + ["Maintain Long", "Maintain Short", "Stay Out of the Market"]:
+            raise ValueError(f"Invalid action: {action}")
+
+        read_start = time.perf_counter()
+        snapshot = self.pretrade_snapshot(include_market=action in TRADING_ACTIONS)
+        reads = time.perf_counter() - read_start
+
+        current_position = snapshot["position"]
+        # Flat positions may report an empty leverage; fall back to the leverage last applied
+        current_leverage = float(current_position['leverage'] or self._leverage or 0)
+        current_size = float(current_position['size'])
+        current_side = current_position['side']
+
+        logger.info(f"Current leverage: {current_leverage}")
+        logger.info(f"Current position: {current_size} ({current_side})")
+
+        if action in TRADING_ACTIONS:
+            balance = snapshot["balance"]
+            current_price = snapshot["price"]
+
+            leverage_start = time.perf_counter()
+            with span("bybit.leverage"):
+                current_leverage = self.ensure_leverage(current_leverage)
+            leverage = time.perf_counter() - leverage_start
+
+            # Size of the position to open, for opens and switches
+            new_qty = None
+            sizing_error = None
+            if action not in ["Close Long", "Close Short"]:
+                # Quantity in BTC: 90% of equity at the current leverage, rounded down to the lot size
+                new_qty = self.round_qty((balance * EQUITY_FRACTION * current_leverage) / current_price)
+                if new_qty is None:
+                    sizing_error = f"Order size is below the minimum of {self.instrument_filters()['min_qty']} BTC"
                 else:
-                    logger.info(f"Leverage successfully set to {desired_leverage}")
-                    current_leverage = desired_leverage
+                    # Check if we have enough balance for the new position
+                    required_margin = (float(new_qty) * current_price) / current_leverage
+                    if required_margin > balance:
+                        sizing_error = (f"Not enough available balance. Required: {required_margin}, "
+                                        f"Available: {balance}")
+                if sizing_error:
+                    logger.warning(sizing_error)
+                    if action in ["Open Long", "Open Short"]:
+                        return None
+
+            link_id = order_link_id(decision, action)
+            size = Decimal(current_position['size'] or '0')
+            target_side = "Buy" if action in ["Open Long", "Switch to Long"] else "Sell"
+            if action in ["Open Long", "Open Short"]:
+                orders = [order_params(target_side, new_qty, link_id)]
+            elif action in ["Close Long", "Close Short"]:
+                if current_size == 0:
+                    logger.info("No position to close.")
+                    return None
+                orders = [order_params(opposite_side(current_side), size, link_id, reduce_only=True)]
+            elif sizing_error:
+                # The new leg can't be opened, but the position being switched away from still has to go
+                if current_size == 0 or current_side == target_side:
+                    return {"error": sizing_error}
+                orders = [order_params(opposite_side(current_side), size, link_id, reduce_only=True)]
+            else:
+                orders = self.switch_orders(current_side, size, target_side, new_qty, link_id)
+                if not orders:
+                    logger.info(f"Position already matches the {action} target. No order needed.")
+                    return None
+
+            try:
+                submitted = time.perf_counter()
+                results = [self.place_order(params) for params in orders]
+                self._record_latency(decided_at, reads, leverage, submitted, time.perf_counter())
+                logger.info(f"Order placed successfully: {results}")
+                if sizing_error:
+                    return {"error": f"Closed the {current_side} position but could not open the new one: "
+                                     f"{sizing_error}"}
+                return results[-1]
+
             except Exception as e:
-                logger.warning(f"An error occurred while setting leverage: {str(e)}. Will use current leverage.")
-        else:
-            logger.info(f"Leverage is already set to {current_leverage}. No change needed.")
+                logger.error(f"An error occurred: {str(e)}")
+                return {"error": str(e)}
 
-        # Determine order details based on action
-        if action in ["Open Long", "Open Short"]:
-            # Calculate quantity in BTC (90% of balance with current leverage)
-            qty = (balance * 0.9 * current_leverage) / current_price
-            qty = round(qty, 3)  # Round to 3 decimal places
-            side = "Buy" if action == "Open Long" else "Sell"
-        elif action in ["Close Long", "Close Short"]:
+        elif action in ["Maintain Long", "Maintain Short"]:
             if current_size == 0:
-                logger.info("No position to close.")
+                logger.info("No position to maintain.")
                 return None
-            qty = current_size
-            side = "Sell" if current_side == "Buy" else "Buy"
-        elif action in ["Switch to Long", "Switch to Short"]:
-            # First, close the existing position
-            if current_size > 0:
-                close_position(session, current_side, current_size)
-                logger.info(f"Closed existing {current_side} position of size {current_size}")
-
-            # Then, open a new position in the opposite direction
-            qty = (balance * 0.9 * current_leverage) / current_price
-            qty = round(qty, 3)  # Round to 3 decimal places
-            side = "Buy" if action == "Switch to Long" else "Sell"
-
-            # Place the order
-        try:
-            order_params = {
-                "category": "linear",
-                "symbol": "BTCUSDT",
-                "side": side,
-                "orderType": "Market",
-                "qty": str(qty),
-                "timeInForce": "GoodTillCancel",
-                "positionIdx": 0  # 0 for one-way mode
-            }
 
-            # Check if we have enough balance for the order
-            required_margin = (qty * current_price) / current_leverage
-            if required_margin > balance:
-                logger.warning(f"Not enough available balance. Required: {required_margin}, Available: {balance}")
+            if (action == "Maintain Long" and current_side != "Buy") or \
+                    (action == "Maintain Short" and current_side != "Sell"):
+                logger.warning(f"Current position ({current_side}) does not match the action ({action}).")
                 return None
 
-            order = session.place_order(**order_params)
+            logger.info("Maintaining current position. No changes made.")
+            return None
 
-            if order['retCode'] != 0:
-                raise Exception(f"Failed to place order: {order['retMsg']}")
+        else:
+            logger.info("Staying out of the market. No action taken.")
+            return None
 
-            logger.info(f"Order placed successfully: {order['result']}")
-            return order['result']
 
-        except Exception as e:
-            logger.error(f"An error occurred: {str(e)}")
-            return None
+_clients = {}
 
-    elif action in ["Maintain Long", "Maintain Short"]:
-        if current_size == 0:
-            logger.info("No position to maintain.")
-            return None
 
-        if (action == "Maintain Long" and current_side != "Buy") or \
-                (action == "Maintain Short" and current_side != "Sell"):
-            logger.warning(f"Current position ({current_side}) does not match the action ({action}).")
-            return None
+def get_execution_client(api_key, api_secret, testnet=False):
+    key = (api_key, testnet)
+    if key not in _clients:
+        _clients[key] = ExecutionClient(api_key, api_secret, testnet)
+    return _clients[key]
 
-        logger.info("Maintaining current position. No changes made.")
-        return None
 
-    elif action == "Stay Out of the Market":
-        logger.info("Staying out of the market. No action taken.")
-        return None
+def execute_bybit_trade(decision, api_key, api_secret, testnet=True, decided_at=None):
+    return get_execution_client(api_key, api_secret, testnet).execute(decision, decided_at)
 
-    else:
-        raise ValueError(f"Invalid action: {action}")
 
+def opposite_side(side):
+    return "Sell" if side == "Buy" else "Buy"
 
-def close_position(session, current_side, current_size):
-    close_side = "Sell" if current_side == "Buy" else "Buy"
-    try:
-        close_order = session.place_order(
-            category="linear",
-            symbol="BTCUSDT",
-            side=close_side,
-            orderType="Market",
-            qty=str(current_size),
-            timeInForce="GoodTillCancel",
-            positionIdx=0
-        )
-        if close_order['retCode'] != 0:
-            raise Exception(f"Failed to close position: {close_order['retMsg']}")
-        logger.info(f"Existing position closed: {close_order['result']}")
-    except Exception as e:
-        logger.error(f"Error closing position: {str(e)}")
+
+def order_link_id(decision, action):
+    """Deterministic client order id for a decision, so resubmitting the same decision is rejected as a duplicate."""
+    timestamp = decision.get('timestamp') or int(time.time())
+    return f"hana-{timestamp}-{ACTION_CODES[action]}"
+
+
+def order_params(side, qty, link_id, reduce_only=False):
+    params = {
+        "category": "linear",
+        "symbol": SYMBOL,
+        "side": side,
+        "orderType": "Market",
+        "qty": format(qty, 'f'),
+        "timeInForce": "GoodTillCancel",
+        "positionIdx": 0,  # 0 for one-way mode
+        "orderLinkId": link_id,
+    }
+    if reduce_only:
+        params["reduceOnly"] = True
+    return params
 
 
 def main():
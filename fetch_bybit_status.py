@@ -1,23 +1,105 @@
+import asyncio
 import hmac
 import hashlib
+import threading
 import time
+import aiohttp
+import numpy as np
 import requests
 from dotenv import load_dotenv
 import os
 
+from http_client import close_session, fetch_json
 from logger_setup import setup_logger
 
 logger = setup_logger(__name__)
 
+CLOCK_SYNC_INTERVAL = 300  # seconds between server time re-syncs
 
-def get_server_time(testnet=False):
-    url = 'https://api-testnet.bybit.com/v5/market/time' if testnet else 'https://api.bybit.com/v5/market/time'
-    response = requests.get(url)
-    if response.status_code == 200:
-        return int(response.json()['result']['timeSecond'])
-    else:
-        logger.error(f"Failed to get server time: {response.text}")
-        return int(time.time())
+
+def _server_time_url(testnet):
+    return 'https://api-testnet.bybit.com/v5/market/time' if testnet else 'https://api.bybit.com/v5/market/time'
+
+
+def _server_time_ms(data):
+    result = data.get('result', {})
+    if 'timeNano' in result:
+        return int(result['timeNano']) // 1_000_000
+    return int(result['timeSecond']) * 1000
+
+
+class ServerClock:
+    """Offset between the local clock and Bybit server time, re-estimated every CLOCK_SYNC_INTERVAL seconds.
+
+    The offset is measured against the midpoint of the request round trip, so signed requests can take
+    their timestamp locally instead of asking the server first.
+    """
+
+    def __init__(self, testnet=False, sync_interval=CLOCK_SYNC_INTERVAL):
+        self.testnet = testnet
+        self.sync_interval = sync_interval
+        self.offset_ms = 0.0
+        self.round_trip_ms = None
+        self._synced_at = None
+        self._lock = threading.Lock()
+        self._sync_task = None
+
+    def needs_sync(self):
+        return self._synced_at is None or time.monotonic() - self._synced_at > self.sync_interval
+
+    def now_ms(self):
+        return int(time.time() * 1000 + self.offset_ms)
+
+    def _update(self, server_ms, sent_ms, received_ms):
+        self.round_trip_ms = received_ms - sent_ms
+        self.offset_ms = server_ms - (sent_ms + received_ms) / 2
+        self._synced_at = time.monotonic()
+        logger.info(f"Bybit clock offset {self.offset_ms:.0f} ms (round trip {self.round_trip_ms:.0f} ms)")
+
+    def _sync(self):
+        try:
+            sent = time.time() * 1000
+            response = requests.get(_server_time_url(self.testnet), timeout=10)
+            received = time.time() * 1000
+            response.raise_for_status()
+            self._update(_server_time_ms(response.json()), sent, received)
+        except Exception as e:
+            logger.error(f"Failed to sync Bybit server time: {e}")
+
+    def sync(self):
+        with self._lock:
+            self._sync()
+
+    async def sync_async(self):
+        try:
+            sent = time.time() * 1000
+            data = await fetch_json(_server_time_url(self.testnet), timeout=10, source="bybit_time")
+            received = time.time() * 1000
+            self._update(_server_time_ms(data), sent, received)
+        except Exception as e:
+            logger.error(f"Failed to sync Bybit server time: {e}")
+
+    def timestamp_ms(self):
+        # Checked under the lock so concurrent signed calls share one sync
+        with self._lock:
+            if self.needs_sync():
+                self._sync()
+        return self.now_ms()
+
+    async def timestamp_ms_async(self):
+        if self.needs_sync():
+            # Coroutines that find the clock due while a sync is in flight wait for that one
+            if self._sync_task is None or self._sync_task.done():
+                self._sync_task = asyncio.ensure_future(self.sync_async())
+            await asyncio.shield(self._sync_task)
+        return self.now_ms()
+
+
+_server_clocks = {False: ServerClock(testnet=False), True: ServerClock(testnet=True)}
+
+
+def get_server_clock(testnet=False):
+    return _server_clocks[bool(testnet)]
 
 
 def get_signature(params, api_secret):
@@ -25,11 +107,17 @@ def get_signature(params, api_secret):
     return hmac.new(api_secret.encode('utf-8'), query_string.encode('utf-8'), hashlib.sha256).hexdigest()
 
 
-def make_request(url, params, api_key, api_secret):
+def _sign_params(params, api_key, api_secret, timestamp_ms):
     params['api_key'] = api_key
-    params['timestamp'] = get_server_time(testnet=url.startswith('https://api-testnet')) * 1000
+    params['timestamp'] = timestamp_ms
     params['recv_window'] = 10000
     params['sign'] = get_signature(params, api_secret)
+    return params
+
+
+def make_request(url, params, api_key, api_secret):
+    clock = get_server_clock(testnet=url.startswith('https://api-testnet'))
+    _sign_params(params, api_key, api_secret, clock.timestamp_ms())
 
     try:
         response = requests.get(url, params=params)
@@ -40,46 +128,125 @@ def make_request(url, params, api_key, api_secret):
         return None
 
 
-def get_btcusdt_ticker(api_key, api_secret, testnet=False):
+async def make_request_async(url, params, api_key, api_secret):
+    clock = get_server_clock(testnet=url.startswith('https://api-testnet'))
+    _sign_params(params, api_key, api_secret, await clock.timestamp_ms_async())
+
+    try:
+        return await fetch_json(url, params=params, source="bybit")
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logger.error(f"Request failed: {e}")
+        return None
+
+
+async def get_btcusdt_ticker_async(api_key, api_secret, testnet=False):
     url = 'https://api-testnet.bybit.com/v5/market/tickers' if testnet else 'https://api.bybit.com/v5/market/tickers'
     params = {
         'category': 'linear',
         'symbol': 'BTCUSDT'
     }
-    return make_request(url, params, api_key, api_secret)
+    return await make_request_async(url, params, api_key, api_secret)
 
 
-def get_btcusdt_position(api_key, api_secret, testnet=False):
+async def get_btcusdt_position_async(api_key, api_secret, testnet=False):
     url = 'https://api-testnet.bybit.com/v5/position/list' if testnet else 'https://api.bybit.com/v5/position/list'
     params = {
         'category': 'linear',
         'symbol': 'BTCUSDT'
     }
+    return await make_request_async(url, params, api_key, api_secret)
+
+
+# Columnar layout shared by everything that works on OHLCV history
+CANDLE_DTYPE = np.dtype([
+    ('timestamp', 'i8'),  # bar open time in milliseconds
+    ('open', 'f8'),
+    ('high', 'f8'),
+    ('low', 'f8'),
+    ('close', 'f8'),
+    ('volume', 'f8'),
+    ('turnover', 'f8'),
+])
+
+
+def get_btcusdt_klines(api_key, api_secret, interval, start=None, end=None, limit=1000, testnet=False):
+    url = 'https://api-testnet.bybit.com/v5/market/kline' if testnet else 'https://api.bybit.com/v5/market/kline'
+    params = {
+        'category': 'linear',
+        'symbol': 'BTCUSDT',
+        'interval': interval,
+        'limit': limit
+    }
+    if start is not None:
+        params['start'] = start
+    if end is not None:
+        params['end'] = end
     return make_request(url, params, api_key, api_secret)
 
 
-def fetch_bybit_current_status(api_key, api_secret, testnet=False):
-    logger.info(f"Fetching Bybit current status ({'testnet' if testnet else 'mainnet'})")
+def klines_to_array(kline_data):
+    """Convert a kline response (newest first, string fields) into an ascending CANDLE_DTYPE array."""
+    if not kline_data or kline_data.get('retCode') != 0:
+        return np.empty(0, dtype=CANDLE_DTYPE)
+    rows = kline_data['result']['list']
+    candles = np.empty(len(rows), dtype=CANDLE_DTYPE)
+    if rows:
+        values = np.array(rows, dtype=np.float64)[::-1]
+        candles['timestamp'] = values[:, 0].astype(np.int64)
+        for column, name in enumerate(CANDLE_DTYPE.names[1:], start=1):
+            candles[name] = values[:, column]
+    return candles
 
-    current_timestamp = get_server_time(testnet)
-    ticker_data = get_btcusdt_ticker(api_key, api_secret, testnet)
-    current_price = float(ticker_data['result']['list'][0]['lastPrice']) if ticker_data and ticker_data['retCode'] == 0 else None
 
-    position_data = get_btcusdt_position(api_key, api_secret, testnet)
+def format_current_status(timestamp, ticker_data, position_data):
+    current_price = float(ticker_data['result']['list'][0]['lastPrice']) if ticker_data and ticker_data['retCode'] == 0 else None
     position = position_data['result']['list'][0] if position_data and position_data['retCode'] == 0 and position_data['result']['list'] else None
 
-    output = {
-        "timestamp": current_timestamp,
+    return {
+        "timestamp": timestamp,
         "current_market_price": round(current_price, 2) if current_price else None,
         "position": {
             "status": "Open" if position and float(position.get('size', '0')) != 0 else "Closed",
             "type": "Long" if position and position.get('side', '').lower() == 'buy' else "Short" if position and position.get('side', '').lower() == 'sell' else None,
         }
     }
+
+
+async def fetch_bybit_current_status_async(api_key, api_secret, testnet=False, live_state=None):
+    logger.info(f"Fetching Bybit current status ({'testnet' if testnet else 'mainnet'})")
+
+    clock = get_server_clock(testnet)
+    if live_state is not None and live_state.is_fresh():
+        # Same response shapes as REST, read from the WebSocket-fed cache
+        ticker_data = {"retCode": 0, "result": {"list": [live_state.ticker]}}
+        position_data = {"retCode": 0, "result": {"list": [live_state.position]}}
+        logger.info("Read Bybit current status from live state")
+        return format_current_status(clock.now_ms() // 1000, ticker_data, position_data)
+    if live_state is not None:
+        logger.warning(f"Live state is stale, fetching Bybit current status over REST: {live_state.status()}")
+    if clock.needs_sync():
+        await clock.sync_async()
+    ticker_data, position_data = await asyncio.gather(
+        get_btcusdt_ticker_async(api_key, api_secret, testnet),
+        get_btcusdt_position_async(api_key, api_secret, testnet),
+    )
+
+    output = format_current_status(clock.now_ms() // 1000, ticker_data, position_data)
     logger.info(f"Successfully fetched Bybit current status ({'testnet' if testnet else 'mainnet'})")
     return output
 
 
+def fetch_bybit_current_status(api_key, api_secret, testnet=False):
+    """Blocking wrapper around fetch_bybit_current_status_async for callers outside an event loop."""
+    async def run():
+        try:
+            return await fetch_bybit_current_status_async(api_key, api_secret, testnet)
+        finally:
+            await close_session()
+
+    return asyncio.run(run())
+
+
 def main():
     load_dotenv()
     api_key = os.getenv('BYBIT_TESTNET_API_KEY')
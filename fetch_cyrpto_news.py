@@ -1,60 +1,37 @@
 
 import os
 from datetime import datetime
-import re
 
-import aiohttp
 from dotenv import load_dotenv
 
+from http_client import fetch_json
+from response_cache import CachePolicy
 from logger_setup import setup_logger
+from news_index import content_hash
+from text_normalizer import clean_news_text
 
 logger = setup_logger(__name__)
 
+# Reruns within a few minutes reuse the same articles instead of downloading them again
+CRYPTO_NEWS_CACHE = CachePolicy(max_age=10 * 60)
 
-def clean_text(text):
-    # Replace Unicode characters with ASCII equivalents
-    text = text.replace('\u2019', "'").replace('\u201c', '"').replace('\u201d', '"')
-    text = text.replace('\u2018', "'").replace('\u2013', '-').replace('\u2014', '--')
 
-    # Remove placeholder content
-    text = text.replace('TKTK', '')
-
-    # Standardize whitespace
-    text = ' '.join(text.split())
-
-    # Standardize ellipsis
-    text = text.replace('...', '…').replace('. . .', '…')
-
-    # Remove extra spaces before punctuation
-    text = re.sub(r'\s+([.,!?;:])', r'\1', text)
-
-    # Ensure single space after punctuation
-    text = re.sub(r'([.,!?;:])(?=[^\s])', r'\1 ', text)
-
-    # Standardize quotation marks
-    text = re.sub(r'(?<=\s)"(?=\S)', '"', text)
-    text = re.sub(r'(?<=\S)"(?=[\s.,!?;:]|$)', '"', text)
-
-    return text.strip()
-
-
-async def fetch_and_nomalized_crypto_news_data(rapidapi_key, rapidapi_host):
+async def fetch_and_nomalized_crypto_news_data(rapidapi_key, rapidapi_host, article_index=None):
     logger.info("Fetching crypto news data")
 
-    async with aiohttp.ClientSession() as session:
-        headers = {
-            'x-rapidapi-key': rapidapi_key,
-            'x-rapidapi-host': rapidapi_host
-        }
-        url = f"https://{rapidapi_host}/api/v1/crypto/articles?page=1&limit=50&time_frame=24h&format=json&source=coindesk"
-
-        async with session.get(url, headers=headers) as response:
-            parsed_data = await response.json()
+    headers = {
+        'x-rapidapi-key': rapidapi_key,
+        'x-rapidapi-host': rapidapi_host
+    }
+    url = f"https://{rapidapi_host}/api/v1/crypto/articles?page=1&limit=50&time_frame=24h&format=json&source=coindesk"
+    parsed_data = await fetch_json(url, headers=headers, source="coindesk_news",
+                                   cache_policy=CRYPTO_NEWS_CACHE)
 
     result = []
+    keys = []
     for article in parsed_data:
-        title = clean_text(article.get('title', '')) if article.get('title') else ''
-        summary = clean_text(article.get('summary', '')) if article.get('summary') else ''
+        title = clean_news_text(article['title']) if article.get('title') else ''
+        summary = clean_news_text(article['summary']) if article.get('summary') else ''
         published = article.get('published', '')
         try:
             timestamp = int(datetime.fromisoformat(published.replace('Z', '+00:00')).timestamp())
@@ -63,9 +40,16 @@ async def fetch_and_nomalized_crypto_news_data(rapidapi_key, rapidapi_host):
 
         if title and timestamp:
             result.append([timestamp, title, summary])
+            source_id = article.get('id') or article.get('url') or article.get('link')
+            keys.append((str(source_id) if source_id else None, content_hash(title, summary)))
 
     logger.info(f"Processed {len(result)} valid crypto news articles")
 
+    # With an index each row gets a trailing is_new flag
+    if article_index is not None and result:
+        for row, is_new in zip(result, await article_index.tag("coindesk", keys)):
+            row.append(is_new)
+
     return result if result else "No coindesk newspaper articles in the last 24 hours."
 
 if __name__ == "__main__":
@@ -1,94 +1,329 @@
+import asyncio
+import json
+import os
 import sqlite3
+import tempfile
+import time
+
 import aiosqlite
 from logger_setup import setup_logger
 
 logger = setup_logger(__name__)
 
+DECISIONS_DB_PATH = 'trading_decisions.sqlite'
+SCHEMA_VERSION = 1
+PRAGMAS = [
+    'PRAGMA journal_mode=WAL',
+    # WAL with NORMAL sync is durable across application crashes; only a power loss can drop the last commit
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA cache_size=-16000',  # 16 MB
+    'PRAGMA mmap_size=268435456',  # 256 MB
+    'PRAGMA busy_timeout=5000',
+]
+
+LEGACY_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS decisions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp DATETIME,
+        action TEXT,
+        rationale_technical_analysis TEXT,
+        rationale_news_impact TEXT,
+        rationale_market_sentiment TEXT,
+        rationale_conclusion TEXT,
+        confidence_score REAL
+    )
+'''
+
+# Migration n brings a file from user_version n - 1 to n
+MIGRATIONS = {
+    1: [
+        LEGACY_SCHEMA,
+        'ALTER TABLE decisions ADD COLUMN decision_json TEXT',
+        # Rows written before the JSON column get their stored fields back as JSON
+        '''
+        UPDATE decisions SET decision_json = json_object(
+            'action', action,
+            'rationale', json_object(
+                'technical_analysis', rationale_technical_analysis,
+                'news_impact', rationale_news_impact,
+                'market_sentiment', rationale_market_sentiment,
+                'conclusion', rationale_conclusion
+            ),
+            'confidence_score', confidence_score,
+            'timestamp', timestamp
+        ) WHERE decision_json IS NULL
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_decisions_timestamp ON decisions (timestamp)',
+        'CREATE INDEX IF NOT EXISTS idx_decisions_action_timestamp ON decisions (action, timestamp)',
+    ],
+}
+
+# Fields of past decisions shown to the model
+PROMPT_FIELDS = ("timestamp", "action", "rationale", "confidence_score")
+
+
+def migrate_database(db_path=DECISIONS_DB_PATH):
+    """Bring a decisions file of any earlier schema version up to SCHEMA_VERSION, one transaction per step."""
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        for target in range(version + 1, SCHEMA_VERSION + 1):
+            logger.info(f"Migrating {db_path} to schema version {target}")
+            columns = {row[1] for row in conn.execute('PRAGMA table_info(decisions)')}
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                for statement in MIGRATIONS[target]:
+                    # A table that already has the column (e.g. a half-migrated copy) is left as it is
+                    if statement.startswith('ALTER TABLE') and statement.split()[-2] in columns:
+                        continue
+                    conn.execute(statement)
+                conn.execute(f'PRAGMA user_version={target}')
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+    finally:
+        conn.close()
+
+
+def decision_row(decision):
+    rationale = decision.get('rationale') or {}
+    return (
+        decision['timestamp'],
+        decision['action'],
+        rationale.get('technical_analysis'),
+        rationale.get('news_impact'),
+        rationale.get('market_sentiment'),
+        rationale.get('conclusion'),
+        decision.get('confidence_score'),
+        json.dumps(decision, ensure_ascii=False),
+    )
+
+
+class DecisionRepository:
+    """Trading decisions in SQLite over one long-lived connection.
+
+    The full decision is stored as JSON next to the flat columns, so nothing the model returns is lost; the
+    flat columns stay for the timestamp and action indexes and for older readers such as backtest.py.
+    Files created by earlier versions are migrated in place through PRAGMA user_version.
+    """
+
+    def __init__(self, db_path=DECISIONS_DB_PATH):
+        self.db_path = db_path
+        self._conn = None
+        self._lock = asyncio.Lock()
+
+    async def connect(self):
+        async with self._lock:
+            if self._conn is None:
+                await asyncio.to_thread(migrate_database, self.db_path)
+                conn = await aiosqlite.connect(self.db_path)
+                for pragma in PRAGMAS:
+                    await conn.execute(pragma)
+                self._conn = conn
+        return self._conn
+
+    async def close(self):
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
+
+    async def save(self, decision):
+        await self.save_many([decision])
+
+    async def save_many(self, decisions):
+        """Insert decisions in a single transaction."""
+        conn = await self.connect()
+        await conn.executemany('''
+            INSERT INTO decisions (
+                timestamp, action,
+                rationale_technical_analysis, rationale_news_impact, rationale_market_sentiment,
+                rationale_conclusion, confidence_score, decision_json
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [decision_row(decision) for decision in decisions])
+        await conn.commit()
+
+    async def query(self, start=None, end=None, actions=None, limit=None, newest_first=False):
+        """Full decisions with start <= timestamp < end, optionally limited to the given actions."""
+        conditions, params = [], []
+        if start is not None:
+            conditions.append('timestamp >= ?')
+            params.append(start)
+        if end is not None:
+            conditions.append('timestamp < ?')
+            params.append(end)
+        if actions:
+            conditions.append(f'action IN ({",".join("?" * len(actions))})')
+            params.extend(actions)
+        sql = 'SELECT decision_json FROM decisions'
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += f' ORDER BY timestamp {"DESC" if newest_first else "ASC"}'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+
+        conn = await self.connect()
+        async with conn.execute(sql, params) as cursor:
+            rows = await cursor.fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    async def recent(self, limit=5):
+        return await self.query(limit=limit, newest_first=True)
+
+    async def count(self):
+        conn = await self.connect()
+        async with conn.execute('SELECT COUNT(*) FROM decisions') as cursor:
+            return (await cursor.fetchone())[0]
+
+
+_repositories = {}
+
 
-def initialize_db(db_path='trading_decisions.sqlite'):
+def get_decision_repository(db_path=DECISIONS_DB_PATH):
+    if db_path not in _repositories:
+        _repositories[db_path] = DecisionRepository(db_path)
+    return _repositories[db_path]
+
+
+async def close_decision_repositories():
+    for repository in list(_repositories.values()):
+        await repository.close()
+
+
+def initialize_db(db_path=DECISIONS_DB_PATH):
+    """Create or migrate the decisions table; safe to call on every start."""
     logger.info(f"Initializing database at path: {db_path}")
-    with sqlite3.connect(db_path) as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS decisions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp DATETIME,
-                action TEXT,
-                rationale_technical_analysis TEXT,
-                rationale_news_impact TEXT,
-                rationale_market_sentiment TEXT,
-                rationale_conclusion TEXT,
-                confidence_score REAL
-            );
-        ''')
-        logger.info("Database initialized successfully")
-        conn.commit()
-
-
-async def save_decision_to_db(decision, db_path='trading_decisions.sqlite'):
+    migrate_database(db_path)
+    logger.info("Database initialized successfully")
+
+
+async def save_decision_to_db(decision, db_path=DECISIONS_DB_PATH):
     logger.info(f"Saving decision to database at path: {db_path}")
     try:
-        async with aiosqlite.connect(db_path) as conn:
-            async with conn.cursor() as cursor:
-                # Extracting data to match the updated table structure
-                data_to_insert = (
-                    decision['timestamp'],
-                    decision['action'],
-                    decision['rationale']['technical_analysis'],
-                    decision['rationale']['news_impact'],
-                    decision['rationale']['market_sentiment'],
-                    decision['rationale']['conclusion'],
-                    decision['confidence_score']
-                )
-
-                await cursor.execute('''
-                    INSERT INTO decisions (
-                        timestamp, action,
-                        rationale_technical_analysis, rationale_news_impact, rationale_market_sentiment,
-                        rationale_conclusion, confidence_score
-                    )
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                ''', data_to_insert)
-                await conn.commit()
-            logger.info("Decision saved successfully")
+        await get_decision_repository(db_path).save(decision)
+        logger.info("Decision saved successfully")
     except aiosqlite.Error as e:
         logger.error(f"Error saving decision to database: {e}")
         raise
 
 
-async def fetch_recent_decisions(db_path='trading_decisions.sqlite', num_decisions=5):
+async def fetch_recent_decisions(db_path=DECISIONS_DB_PATH, num_decisions=5):
     logger.info(f"Fetching last {num_decisions} decisions from database at path: {db_path}")
     try:
-        async with aiosqlite.connect(db_path) as conn:
-            async with conn.execute('''
-                SELECT timestamp, action, rationale_technical_analysis, rationale_news_impact, 
-                       rationale_market_sentiment, rationale_conclusion, confidence_score 
-                FROM decisions 
-                ORDER BY timestamp DESC 
-                LIMIT ?
-            ''', (num_decisions,)) as cursor:
-                decisions = await cursor.fetchall()
-
-            if decisions:
-                logger.info(f"Fetched {len(decisions)} decisions from the database")
-                formatted_decisions = []
-                for decision in decisions:
-                    formatted_decision = {
-                        "timestamp": decision[0],
-                        "action": decision[1],
-                        "rationale": {
-                            "technical_analysis": decision[2],
-                            "news_impact": decision[3],
-                            "market_sentiment": decision[4],
-                            "conclusion": decision[5]
-                        },
-                        "confidence_score": decision[6]
-                    }
-                    formatted_decisions.append(formatted_decision)
-                return formatted_decisions
-            else:
-                logger.info("No decisions found in the database")
-                return "No Recent Trading Decisions found."
+        decisions = await get_decision_repository(db_path).recent(num_decisions)
+        if decisions:
+            logger.info(f"Fetched {len(decisions)} decisions from the database")
+            return [{field: decision.get(field) for field in PROMPT_FIELDS} for decision in decisions]
+        else:
+            logger.info("No decisions found in the database")
+            return "No Recent Trading Decisions found."
     except aiosqlite.Error as e:
         logger.error(f"Error fetching decisions from database: {e}")
         raise
+
+
+def _synthetic_decisions(count, start=1585195200, step=14400):
+    actions = ["Open Long", "Open Short", "Close Long", "Close Short", "Switch to Long", "Switch to Short",
+               "Maintain Long", "Maintain Short", "Stay Out of the Market"]
+    return [{
+        "action": actions[i % len(actions)],
+        "rationale": {
+            "technical_analysis": f"RSI(4H) at {30 + i % 40}.0 with the MACD histogram turning {i % 3}.",
+            "news_impact": "ETF flows steady; no major catalysts.",
+            "market_sentiment": f"Fear and Greed at {20 + i % 60}.",
+            "conclusion": "Follow the 4H trend with a tight stop.",
+        },
+        "trade_details": {"stop_loss": 55000 + i % 1000, "take_profit": 60000 + i % 1000},
+        "confidence_score": round(0.5 + (i % 50) / 100, 2),
+        "timestamp": start + i * step,
+    } for i in range(count)]
+
+
+async def _legacy_recent(db_path, num_decisions=5):
+    """The previous read path: a new connection per call."""
+    async with aiosqlite.connect(db_path) as conn:
+        async with conn.execute('''
+            SELECT timestamp, action, rationale_technical_analysis, rationale_news_impact,
+                   rationale_market_sentiment, rationale_conclusion, confidence_score
+            FROM decisions
+            ORDER BY timestamp DESC
+            LIMIT ?
+        ''', (num_decisions,)) as cursor:
+            return await cursor.fetchall()
+
+
+async def _benchmark(directory, rows):
+    def timed_ms(seconds, repeats):
+        return seconds / repeats * 1000
+
+    # A file in the original schema is migrated in place and keeps its rows
+    legacy_path = os.path.join(directory, 'legacy.sqlite')
+    with sqlite3.connect(legacy_path) as conn:
+        conn.execute(LEGACY_SCHEMA)
+        conn.executemany('INSERT INTO decisions (timestamp, action, rationale_technical_analysis, '
+                         'rationale_news_impact, rationale_market_sentiment, rationale_conclusion, '
+                         'confidence_score) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                         [decision_row(decision)[:7] for decision in _synthetic_decisions(3)])
+    legacy = DecisionRepository(legacy_path)
+    migrated = await legacy.recent(3)
+    assert len(migrated) == 3 and migrated[0]['rationale']['conclusion'], migrated
+    await legacy.close()
+
+    path = os.path.join(directory, 'decisions.sqlite')
+    repository = DecisionRepository(path)
+    decisions = _synthetic_decisions(rows)
+    start = time.perf_counter()
+    await repository.save_many(decisions)
+    insert = time.perf_counter() - start
+    assert await repository.count() == rows
+    logger.info(f"Bulk insert: {rows} decisions in {insert:.2f}s ({rows / insert:,.0f} rows/s)")
+
+    # Lossless round trip, including fields the flat columns never had
+    assert (await repository.recent(1))[0] == decisions[-1]
+
+    repeats = 200
+    start = time.perf_counter()
+    for _ in range(repeats):
+        await repository.recent(5)
+    persistent = timed_ms(time.perf_counter() - start, repeats)
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        await _legacy_recent(path)
+    per_call = timed_ms(time.perf_counter() - start, repeats)
+
+    conn = await repository.connect()
+    await conn.execute('DROP INDEX idx_decisions_timestamp')
+    await conn.execute('DROP INDEX idx_decisions_action_timestamp')
+    start = time.perf_counter()
+    for _ in range(20):
+        await repository.recent(5)
+    unindexed = timed_ms(time.perf_counter() - start, 20)
+    await conn.execute('CREATE INDEX idx_decisions_timestamp ON decisions (timestamp)')
+    await conn.execute('CREATE INDEX idx_decisions_action_timestamp ON decisions (action, timestamp)')
+    logger.info(f"Last 5 decisions: {persistent:.3f} ms with the persistent connection and index, "
+                f"{per_call:.3f} ms with a connection per call, {unindexed:.2f} ms without the index")
+
+    month_start = decisions[rows // 2]['timestamp']
+    start = time.perf_counter()
+    month = await repository.query(month_start, month_start + 30 * 86400)
+    switches = await repository.query(month_start, month_start + 365 * 86400,
+                                      actions=["Switch to Long", "Switch to Short"])
+    ranges = (time.perf_counter() - start) * 1000
+    assert len(month) == 180 and all(d['action'].startswith("Switch") for d in switches)
+    logger.info(f"Range queries: {len(month)} decisions in a 30-day window and {len(switches)} switches "
+                f"in a year in {ranges:.1f} ms")
+    await repository.close()
+
+
+def main(rows=100_000):
+    """Check the legacy migration and benchmark a repository of synthetic decisions."""
+    with tempfile.TemporaryDirectory() as directory:
+        asyncio.run(_benchmark(directory, rows))
+
+
+if __name__ == '__main__':
+    main()
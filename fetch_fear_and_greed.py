@@ -1,10 +1,15 @@
-import aiohttp
 from collections import OrderedDict
 
+from http_client import fetch_json
+from response_cache import CachePolicy
 from logger_setup import setup_logger
 
 logger = setup_logger(__name__)
 
+# The index updates once a day; the response says how long until the next update
+FEAR_AND_GREED_CACHE = CachePolicy(max_age=24 * 60 * 60,
+                                   ttl_from=lambda body: body['data'][0]['time_until_update'])
+
 
 async def fetch_fear_and_greed_index(limit=1, date_format=''):
     logger.info("Fetching Fear and Greed Index data...")
@@ -15,9 +20,8 @@ async def fetch_fear_and_greed_index(limit=1, date_format=''):
         'date_format': date_format
     }
 
-    async with aiohttp.ClientSession() as session:
-        async with session.get(base_url, params=params) as response:
-            data = await response.json()
+    data = await fetch_json(base_url, params=params, source="fear_and_greed",
+                            cache_policy=FEAR_AND_GREED_CACHE)
 
     data = data['data'][0]
 
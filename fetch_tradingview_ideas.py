@@ -1,11 +1,12 @@
-import re
-
-import aiohttp
-
+from http_client import fetch_json
+from response_cache import CachePolicy
 from logger_setup import setup_logger
+from text_normalizer import normalize_columns, normalize_idea_text
 
 logger = setup_logger(__name__)
 
+TRADINGVIEW_IDEAS_CACHE = CachePolicy(max_age=10 * 60)
+
 
 async def fetch_tradingview_ideas(rapidapi_key, rapidapi_host):
     logger.info("Fetching TradingView ideas")
@@ -17,11 +18,8 @@ async def fetch_tradingview_ideas(rapidapi_key, rapidapi_host):
     url = f"https://{rapidapi_host}/ideas/list?page=1&per_page=20&sort=recent&market=bitcoin&stock_country=us&symbol=BTCUSDT&locale=en"
 
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=headers) as response:
-                data = await response.json()
-
-        json_data = data
+        json_data = await fetch_json(url, headers=headers, source="tradingview_ideas",
+                                     cache_policy=TRADINGVIEW_IDEAS_CACHE)
         logger.info(f"Fetched {len(json_data['results'])} TradingView ideas")
         unique_entries = {}
         for result in json_data["results"]:
@@ -44,60 +42,9 @@ async def fetch_tradingview_ideas(rapidapi_key, rapidapi_host):
         return [[None, None, None, error_message]]
 
 
-def normalize_text(text, max_length=1500):
-    # Remove emojis and special characters
-    text = re.sub(r'[^\w\s$.,!?%-]', '', text)
-
-    # Remove excessive whitespace
-    text = ' '.join(text.split())
-
-    # Fix common typos and abbreviations, and standardize capitalization
-    replacements = {
-        'btc': 'Bitcoin',
-        'bct': 'Bitcoin',
-        'btcusdt': 'Bitcoin',
-        'btc/usdt': 'Bitcoin',
-        'bitcoin': 'Bitcoin',
-        'BITCOIN': 'Bitcoin',
-        'hodl': 'hold',
-        'bullish': 'bullish',
-        'bearish': 'bearish',
-        'dump': 'decrease',
-        'pump': 'increase',
-        'moon': 'significant increase',
-        'fud': 'fear uncertainty doubt',
-        'ath': 'all-time high',
-        'dca': 'dollar cost average',
-        'ta': 'technical analysis',
-        'fa': 'fundamental analysis',
-        'rsi': 'relative strength index',
-        'ma': 'moving average',
-        'usdt': 'USDT',
-        'fed': 'FED',
-    }
-
-    for old, new in replacements.items():
-        text = re.sub(r'\b' + re.escape(old) + r'\b', new, text, flags=re.IGNORECASE)
-
-    # Standardize price formatting
-    text = re.sub(r'\$(\d+)k', r'$\1,000', text)
-    text = re.sub(r'\$(\d+(?:\.\d+)?)(?=\s|$)', lambda m: f"${float(m.group(1)):,.2f}", text)
-
-    # Truncate to max_length
-    return text[:max_length]
-
-
 def normalize_data(data):
-    normalized_data = []
-    for item in data:
-        normalized_item = [
-            item[0],  # Keep timestamp as is
-            item[1],  # Keep likes count as is
-            normalize_text(item[2]),  # Normalize title
-            normalize_text(item[3])  # Normalize description
-        ]
-        normalized_data.append(normalized_item)
-    return normalized_data
+    # Timestamp and likes count are kept as is; title and description are normalized
+    return normalize_columns(data, (2, 3), normalize_idea_text)
 
 
 async def get_normalized_tradingview_ideas(rapidapi_key, rapidapi_host):
@@ -1,23 +1,15 @@
-import re
-
-import aiohttp
-import unicodedata
-
+from http_client import fetch_json
+from response_cache import CachePolicy
 from logger_setup import setup_logger
+from news_index import content_hash
+from text_normalizer import clean_ascii_text
 
 logger = setup_logger(__name__)
 
-
-def clean_text(text):
-    if not text:
-        return ''
-    text = re.sub(r'<[^>]+>', '', text)
-    text = unicodedata.normalize('NFKD', text)
-    text = re.sub(r'[^\x00-\x7F]+', '', text)
-    return ' '.join(text.split())
+TRADINGVIEW_NEWS_CACHE = CachePolicy(max_age=10 * 60)
 
 
-async def fetch_and_normalized_tradingview_news(rapidapi_key, rapidapi_host):
+async def fetch_and_normalized_tradingview_news(rapidapi_key, rapidapi_host, article_index=None):
     logger.info("Fetching TradingView news")
     headers = {
         'x-rapidapi-key': rapidapi_key,
@@ -27,19 +19,24 @@ async def fetch_and_normalized_tradingview_news(rapidapi_key, rapidapi_host):
     url = f"https://{rapidapi_host}/news/list?page=1&per_page=20&category=base&country=us&locale=en"
 
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=headers) as response:
-                data = await response.json()
+        data = await fetch_json(url, headers=headers, source="tradingview_news",
+                                cache_policy=TRADINGVIEW_NEWS_CACHE)
 
         logger.info(f"Fetched {len(data)} news items")
         normalized_data = [
             [
                 item['published'],
-                clean_text(item.get('source', '')),
-                clean_text(item.get('title', ''))
+                clean_ascii_text(item.get('source', '')),
+                clean_ascii_text(item.get('title', ''))
             ]
             for item in data
         ]
+        # With an index each row gets a trailing is_new flag
+        if article_index is not None and normalized_data:
+            keys = [(str(item['id']) if item.get('id') else None, content_hash(row[1], row[2]))
+                    for item, row in zip(data, normalized_data)]
+            for row, is_new in zip(normalized_data, await article_index.tag("tradingview_news", keys)):
+                row.append(is_new)
         logger.info("TradingView news data is sent successfully")
         return normalized_data
     except Exception as e:
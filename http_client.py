@@ -0,0 +1,206 @@
+import asyncio
+import time
+from collections import deque
+from urllib.parse import urlparse
+
+import aiohttp
+
+from logger_setup import setup_logger
+from response_cache import CACHE_OFFLINE, OfflineCacheMiss, ResponseCache, get_response_cache
+from tracing import count, span
+
+logger = setup_logger(__name__)
+
+DEFAULT_TIMEOUT = 30  # seconds per request
+POOL_LIMIT = 100
+PER_HOST_LIMIT = 10
+DNS_CACHE_TTL = 300
+KEEPALIVE_TIMEOUT = 75
+
+# Most recent request timings, newest last
+request_timings = deque(maxlen=500)
+
+_session = None
+_session_loop = None
+_revalidations = set()
+
+
+async def _on_request_start(session, context, params):
+    context.start = asyncio.get_running_loop().time()
+    context.dns = None
+    context.connect = None
+    context.reused = False
+
+
+async def _on_dns_resolvehost_start(session, context, params):
+    context.dns_start = asyncio.get_running_loop().time()
+
+
+async def _on_dns_resolvehost_end(session, context, params):
+    context.dns = asyncio.get_running_loop().time() - context.dns_start
+
+
+async def _on_connection_create_start(session, context, params):
+    context.connect_start = asyncio.get_running_loop().time()
+
+
+async def _on_connection_create_end(session, context, params):
+    context.connect = asyncio.get_running_loop().time() - context.connect_start
+
+
+async def _on_connection_reuseconn(session, context, params):
+    context.reused = True
+
+
+async def _on_request_end(session, context, params):
+    _record(context, params.url, params.response.status)
+
+
+async def _on_request_exception(session, context, params):
+    _record(context, params.url, None, error=type(params.exception).__name__)
+
+
+def _record(context, url, status, error=None):
+    request_ctx = context.trace_request_ctx or {}
+    timing = {
+        "source": request_ctx.get("source"),
+        "host": url.host,
+        "path": url.path,
+        "status": status,
+        "elapsed": asyncio.get_running_loop().time() - context.start,
+        "dns": context.dns,
+        "connect": context.connect,
+        "reused": context.reused,
+    }
+    if error:
+        timing["error"] = error
+    request_timings.append(timing)
+    logger.info(f"HTTP {timing['source'] or timing['host']} {status}: {timing['elapsed'] * 1000:.0f} ms "
+                f"({'reused connection' if timing['reused'] else 'new connection'})")
+
+
+def _trace_config():
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(_on_request_start)
+    trace_config.on_dns_resolvehost_start.append(_on_dns_resolvehost_start)
+    trace_config.on_dns_resolvehost_end.append(_on_dns_resolvehost_end)
+    trace_config.on_connection_create_start.append(_on_connection_create_start)
+    trace_config.on_connection_create_end.append(_on_connection_create_end)
+    trace_config.on_connection_reuseconn.append(_on_connection_reuseconn)
+    trace_config.on_request_end.append(_on_request_end)
+    trace_config.on_request_exception.append(_on_request_exception)
+    return trace_config
+
+
+def get_session():
+    """Process-wide pooled session, recreated if the event loop changed or it was closed."""
+    global _session, _session_loop
+    loop = asyncio.get_running_loop()
+    if _session is None or _session.closed or _session_loop is not loop:
+        connector = aiohttp.TCPConnector(
+            limit=POOL_LIMIT,
+            limit_per_host=PER_HOST_LIMIT,
+            ttl_dns_cache=DNS_CACHE_TTL,
+            keepalive_timeout=KEEPALIVE_TIMEOUT,
+        )
+        _session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=DEFAULT_TIMEOUT),
+            headers={'Accept-Encoding': 'gzip, deflate'},
+            trace_configs=[_trace_config()],
+        )
+        _session_loop = loop
+    return _session
+
+
+async def close_session():
+    global _session, _session_loop
+    if _session is not None and not _session.closed and _session_loop is asyncio.get_running_loop():
+        await _session.close()
+    _session = None
+    _session_loop = None
+
+
+async def fetch_json(url, headers=None, params=None, timeout=None, source=None, cache_policy=None):
+    """GET a JSON document through the shared session, optionally served from the response cache."""
+    if cache_policy is None:
+        body, _ = await _get_json(url, headers, params, timeout, source)
+        return body
+
+    cache = get_response_cache()
+    key = ResponseCache.key(url, params)
+    entry = cache.load(key)
+    if entry is not None and (CACHE_OFFLINE or time.time() < entry["expires_at"]):
+        cache.hits += 1
+        logger.info(f"Cache hit for {source or url}")
+        return entry["body"]
+    if CACHE_OFFLINE:
+        raise OfflineCacheMiss(f"No cached response for {url}")
+
+    cache.misses += 1
+    if entry is not None and cache_policy.stale_while_revalidate:
+        if key not in _revalidations:
+            _revalidations.add(key)
+            task = asyncio.create_task(_revalidate(cache, key, entry, url, headers, params, timeout, source,
+                                                   cache_policy))
+            task.add_done_callback(lambda _: _revalidations.discard(key))
+        logger.info(f"Serving stale cache entry for {source or url} while revalidating")
+        return entry["body"]
+    return await _revalidate(cache, key, entry, url, headers, params, timeout, source, cache_policy)
+
+
+async def _revalidate(cache, key, entry, url, headers, params, timeout, source, cache_policy):
+    request_headers = dict(headers or {})
+    if entry is not None:
+        if entry.get("etag"):
+            request_headers['If-None-Match'] = entry["etag"]
+        if entry.get("last_modified"):
+            request_headers['If-Modified-Since'] = entry["last_modified"]
+
+    try:
+        body, response = await _get_json(url, request_headers, params, timeout, source)
+    except Exception as e:
+        if entry is not None and cache_policy.stale_while_revalidate:
+            logger.warning(f"Revalidation failed for {source or url}, keeping stale entry: {e}")
+            return entry["body"]
+        raise
+
+    if response.status == 304 and entry is not None:
+        cache.revalidated += 1
+        cache.refresh(key, entry, cache_policy.lifetime(entry["body"], response.headers))
+        return entry["body"]
+    if response.status == 200 and 'no-store' not in response.headers.get('Cache-Control', ''):
+        cache.store(key, url, body, cache_policy.lifetime(body, response.headers),
+                    response.headers.get('ETag'), response.headers.get('Last-Modified'))
+    return body
+
+
+async def _get_json(url, headers, params, timeout, source):
+    session = get_session()
+    request_timeout = aiohttp.ClientTimeout(total=timeout) if timeout else None
+    source = source or urlparse(url).hostname
+    with span(f"http.{source}", path=urlparse(url).path) as current:
+        async with session.get(url, headers=headers, params=params, timeout=request_timeout,
+                               trace_request_ctx={"source": source}) as response:
+            current.set(status=response.status)
+            count('http_requests_total', source=source, status=response.status)
+            if response.status == 304:
+                return None, response
+            # 429, 5xx and quota errors must not reach the fetchers as data; revalidation keeps the stale entry
+            response.raise_for_status()
+            body = await response.read()
+            count('http_response_bytes_total', len(body), source=source)
+            return await response.json(), response
+
+
+def summarize_timings(timings=None):
+    """Average latency of requests on new versus reused connections."""
+    timings = list(request_timings if timings is None else timings)
+    summary = {}
+    for label, reused in (("new", False), ("reused", True)):
+        elapsed = [t["elapsed"] for t in timings if t["reused"] is reused and "error" not in t]
+        summary[label] = {
+            "count": len(elapsed),
+            "avg_ms": round(sum(elapsed) / len(elapsed) * 1000, 1) if elapsed else None,
+        }
+    return summary
@@ -0,0 +1,204 @@
+import glob
+import io
+import math
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image, ImageChops
+
+from logger_setup import setup_logger
+
+logger = setup_logger(__name__)
+
+# 'auto' trims uniform background borders, 'none' keeps the full screenshot, or 'left,top,right,bottom' margins in px
+IMAGE_CROP = os.getenv('CHART_IMAGE_CROP', 'auto')
+# Largest size sent to the model; 1024x768 keeps a 16:9 chart at 2x2 high-detail tiles
+IMAGE_MAX_WIDTH = int(os.getenv('CHART_IMAGE_MAX_WIDTH', '1024'))
+IMAGE_MAX_HEIGHT = int(os.getenv('CHART_IMAGE_MAX_HEIGHT', '768'))
+# Vision detail level: 'high', 'low' or 'auto' (low only when the image fits one 512px tile)
+IMAGE_DETAIL = os.getenv('CHART_IMAGE_DETAIL', 'high')
+IMAGE_FORMATS = [name.strip() for name in os.getenv('CHART_IMAGE_FORMATS', 'png,webp,jpeg').split(',')]
+# Lossy encodings must stay at or above this PSNR (dB) against the resized image
+IMAGE_PSNR_FLOOR = float(os.getenv('CHART_IMAGE_PSNR_FLOOR', '38'))
+LOSSY_QUALITIES = (90, 80)
+PALETTE_SIZES = (256, 128)
+BORDER_TOLERANCE = 16
+
+MIME_TYPES = {'png': 'image/png', 'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+
+
+class OptimizedImage:
+    def __init__(self, data, format, width, height, detail, psnr, report):
+        self.data = data
+        self.format = format
+        self.mime_type = MIME_TYPES[format]
+        self.width = width
+        self.height = height
+        self.detail = detail
+        self.psnr = psnr
+        self.report = report
+
+
+def estimate_image_tokens(width, height, detail='high'):
+    """Vision input tokens for gpt-4o class models: 85 base plus 170 per 512px tile after scaling."""
+    if detail == 'low':
+        return 85
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    return 85 + 170 * math.ceil(width / 512) * math.ceil(height / 512)
+
+
+def psnr(reference, candidate):
+    """Peak signal-to-noise ratio in dB between two same-sized RGB images; inf when identical."""
+    a = np.asarray(reference.convert('RGB'), dtype=np.float32)
+    b = np.asarray(candidate.convert('RGB'), dtype=np.float32)
+    mse = float(np.mean((a - b) ** 2))
+    return math.inf if mse == 0 else 10 * math.log10(255 ** 2 / mse)
+
+
+def crop_chart(image, crop=IMAGE_CROP):
+    if crop == 'none':
+        return image
+    if crop == 'auto':
+        background = Image.new(image.mode, image.size, image.getpixel((0, 0)))
+        difference = ImageChops.difference(image, background).convert('L')
+        mask = difference.point(lambda p: 255 if p > BORDER_TOLERANCE else 0)
+        bbox = mask.getbbox()
+        return image.crop(bbox) if bbox else image
+    left, top, right, bottom = (int(value) for value in crop.split(','))
+    return image.crop((left, top, image.width - right, image.height - bottom))
+
+
+def downscale(image, max_width=IMAGE_MAX_WIDTH, max_height=IMAGE_MAX_HEIGHT):
+    scale = min(1.0, max_width / image.width, max_height / image.height)
+    if scale == 1.0:
+        return image
+    size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    return image.resize(size, Image.LANCZOS)
+
+
+def choose_detail(width, height, detail=IMAGE_DETAIL):
+    if detail == 'auto':
+        return 'low' if width <= 512 and height <= 512 else 'high'
+    return detail
+
+
+def _encodings(image, formats):
+    """Yield (format, bytes, lossless) candidates."""
+    for name in formats:
+        buffer = io.BytesIO()
+        if name == 'png':
+            image.save(buffer, format='PNG', compress_level=6)
+            yield name, buffer.getvalue(), True
+            for colors in PALETTE_SIZES:
+                buffer = io.BytesIO()
+                image.quantize(colors=colors, method=Image.Quantize.FASTOCTREE).save(buffer, format='PNG',
+                                                                                     optimize=True)
+                yield name, buffer.getvalue(), False
+        elif name == 'webp':
+            # Fastest lossless effort: anti-aliased charts rarely compress well losslessly anyway
+            image.save(buffer, format='WEBP', lossless=True, method=0, quality=50)
+            yield name, buffer.getvalue(), True
+            for quality in LOSSY_QUALITIES:
+                buffer = io.BytesIO()
+                image.save(buffer, format='WEBP', quality=quality, method=4)
+                yield name, buffer.getvalue(), False
+        elif name == 'jpeg':
+            for quality in LOSSY_QUALITIES:
+                buffer = io.BytesIO()
+                image.save(buffer, format='JPEG', quality=quality, subsampling=0, optimize=True)
+                yield name, buffer.getvalue(), False
+
+
+def optimize_image(png_bytes, crop=IMAGE_CROP, max_width=IMAGE_MAX_WIDTH, max_height=IMAGE_MAX_HEIGHT,
+                   detail=IMAGE_DETAIL, formats=IMAGE_FORMATS, psnr_floor=IMAGE_PSNR_FLOOR):
+    """Crop, downscale and re-encode a chart screenshot to the smallest encoding above the quality floor."""
+    start = time.perf_counter()
+    original = Image.open(io.BytesIO(png_bytes)).convert('RGB')
+    resized = downscale(crop_chart(original, crop), max_width, max_height)
+
+    # The input itself is a candidate, so the upload never grows: downscaling anti-aliases the chart's hard
+    # edges, and a resized encoding can come out larger than the original PNG
+    best = (png_bytes, 'png', math.inf, original)
+    for name, data, lossless in _encodings(resized, formats):
+        if len(data) >= len(best[0]):
+            continue
+        quality = math.inf if lossless else psnr(resized, Image.open(io.BytesIO(data)))
+        if quality >= psnr_floor:
+            best = (data, name, quality, resized)
+
+    data, name, quality, chosen = best
+    if chosen is not resized:
+        logger.info(f"Every {resized.width}x{resized.height} encoding was larger than the "
+                    f"{len(png_bytes)} byte input, keeping the original {original.width}x{original.height} PNG")
+    chosen_detail = choose_detail(chosen.width, chosen.height, detail)
+    original_tokens = estimate_image_tokens(original.width, original.height, 'high')
+    tokens = estimate_image_tokens(chosen.width, chosen.height, chosen_detail)
+    report = {
+        "original_size": f"{original.width}x{original.height}",
+        "size": f"{chosen.width}x{chosen.height}",
+        "format": name,
+        "detail": chosen_detail,
+        "psnr": None if math.isinf(quality) else round(quality, 1),
+        "original_bytes": len(png_bytes),
+        "bytes": len(data),
+        "bytes_saved": len(png_bytes) - len(data),
+        "original_tokens": original_tokens,
+        "tokens": tokens,
+        "tokens_saved": original_tokens - tokens,
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+    }
+    return OptimizedImage(data, name, chosen.width, chosen.height, chosen_detail, quality, report)
+
+
+def _sample_charts():
+    """Locally rendered charts from synthetic candles, for checking the stage without a browser or network."""
+    from fetch_bybit_status import CANDLE_DTYPE
+    from render_charts import render_chart_set
+
+    def candles(count, interval_ms, seed):
+        rng = np.random.default_rng(seed)
+        close = 30000 + np.cumsum(rng.normal(0, 300, count))
+        array = np.empty(count, dtype=CANDLE_DTYPE)
+        array['timestamp'] = np.arange(count, dtype=np.int64) * interval_ms
+        array['open'] = np.concatenate(([close[0]], close[:-1]))
+        array['close'] = close
+        array['high'] = np.maximum(array['open'], close) + rng.uniform(0, 200, count)
+        array['low'] = np.minimum(array['open'], close) - rng.uniform(0, 200, count)
+        array['volume'] = rng.uniform(100, 5000, count)
+        array['turnover'] = array['volume'] * close
+        return array
+
+    return render_chart_set(candles(600, 86400000, 1), candles(600, 14400000, 2))
+
+
+def main(paths=None):
+    """Offline quality check: optimize saved or rendered charts and fail if any is below the PSNR floor."""
+    paths = paths if paths is not None else sys.argv[1:] or sorted(glob.glob(os.path.join("captured_images", "*.png")))
+    if paths:
+        charts = []
+        for path in paths:
+            with open(path, 'rb') as file:
+                charts.append((os.path.basename(path), file.read()))
+    else:
+        charts = _sample_charts()
+
+    failed = 0
+    for name, png_bytes in charts:
+        image = optimize_image(png_bytes)
+        report = image.report
+        logger.info(f"{name}: {report['original_size']} {report['original_bytes']} B -> {report['size']} "
+                    f"{report['format']} {report['bytes']} B, ~{report['original_tokens']} -> {report['tokens']} "
+                    f"tokens ({report['detail']}), PSNR {report['psnr'] or 'lossless'}, {report['elapsed_ms']} ms")
+        if image.psnr < IMAGE_PSNR_FLOOR:
+            failed += 1
+    if failed:
+        raise SystemExit(f"{failed} charts below the {IMAGE_PSNR_FLOOR} dB quality floor")
+
+
+if __name__ == '__main__':
+    main()
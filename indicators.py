@@ -0,0 +1,239 @@
+import json
+import time
+
+import numpy as np
+
+from logger_setup import setup_logger
+
+logger = setup_logger(__name__)
+
+# Largest power range a single EWMA chunk may span before the rescaled terms risk overflowing float64
+_EWMA_CHUNK_EXPONENT = 200
+
+
+def _ewma(values, alpha, initial):
+    """y[t] = (1 - alpha) * y[t-1] + alpha * x[t] with y[-1] = initial, evaluated in vectorized chunks."""
+    x = np.asarray(values, dtype=np.float64)
+    out = np.empty_like(x)
+    if x.size == 0:
+        return out
+    decay = 1.0 - alpha
+    if decay <= 0.0:
+        out[:] = x
+        return out
+
+    # Within a chunk y[t] = decay^t * (y0 + alpha * sum(x[k] / decay^k)); the chunk length keeps decay^-t finite
+    chunk = max(1, int(_EWMA_CHUNK_EXPONENT / -np.log10(decay)))
+    powers = decay ** np.arange(1, min(chunk, x.size) + 1)
+    previous = initial
+    for start in range(0, x.size, chunk):
+        block = x[start:start + chunk]
+        scale = powers[:block.size]
+        out[start:start + block.size] = scale * (previous + alpha * np.cumsum(block / scale))
+        previous = out[start + block.size - 1]
+    return out
+
+
+def _seeded_ewma(values, length, alpha):
+    """TradingView-style moving average: NaN warm-up, SMA seed at the first full window, then EWMA."""
+    x = np.asarray(values, dtype=np.float64)
+    out = np.full(x.shape, np.nan)
+    valid = np.flatnonzero(~np.isnan(x))
+    if valid.size == 0:
+        return out
+    first = valid[0]
+    seed_index = first + length - 1
+    if seed_index >= x.size:
+        return out
+    seed = x[first:seed_index + 1].mean()
+    out[seed_index] = seed
+    out[seed_index + 1:] = _ewma(x[seed_index + 1:], alpha, seed)
+    return out
+
+
+def sma(values, length):
+    x = np.asarray(values, dtype=np.float64)
+    out = np.full(x.shape, np.nan)
+    if x.size >= length:
+        cumulative = np.cumsum(np.insert(x, 0, 0.0))
+        out[length - 1:] = (cumulative[length:] - cumulative[:-length]) / length
+    return out
+
+
+def ema(values, length):
+    return _seeded_ewma(values, length, 2.0 / (length + 1))
+
+
+def rma(values, length):
+    """Wilder's moving average used by RSI and ATR."""
+    return _seeded_ewma(values, length, 1.0 / length)
+
+
+def rsi(close, length=14):
+    close = np.asarray(close, dtype=np.float64)
+    change = np.diff(close, prepend=np.nan)
+    gain = rma(np.where(np.isnan(change), np.nan, np.maximum(change, 0.0)), length)
+    loss = rma(np.where(np.isnan(change), np.nan, np.maximum(-change, 0.0)), length)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result = 100.0 - 100.0 / (1.0 + gain / loss)
+    # Wilder: no losses means 100, which also covers a flat series where gain and loss are both zero
+    result = np.where(gain == 0.0, 0.0, result)
+    result = np.where(loss == 0.0, 100.0, result)
+    return np.where(np.isnan(gain) | np.isnan(loss), np.nan, result)
+
+
+def macd(close, fast=12, slow=26, signal=9):
+    """Return (macd line, signal line, histogram)."""
+    macd_line = ema(close, fast) - ema(close, slow)
+    signal_line = ema(macd_line, signal)
+    return macd_line, signal_line, macd_line - signal_line
+
+
+def volume_profile(high, low, volume, bins=24, price_range=None):
+    """Spread each bar's volume evenly over its high-low range. Returns (bin edges, volume per bin)."""
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    volume = np.asarray(volume, dtype=np.float64)
+    lower, upper = price_range if price_range else (low.min(), high.max())
+    edges = np.linspace(lower, upper, bins + 1)
+
+    overlap = np.minimum(high[:, None], edges[None, 1:]) - np.maximum(low[:, None], edges[None, :-1])
+    overlap = np.clip(overlap, 0.0, None)
+    span = (high - low)[:, None]
+    # Bars without a range put all their volume in the bin containing the price
+    flat = span[:, 0] == 0
+    weights = np.divide(overlap, span, out=np.zeros_like(overlap), where=span > 0)
+    if flat.any():
+        index = np.clip(np.searchsorted(edges, low[flat], side='right') - 1, 0, bins - 1)
+        weights[np.flatnonzero(flat), index] = 1.0
+    return edges, weights.T @ volume
+
+
+def atr(high, low, close, length=14):
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    previous_close = np.concatenate(([np.nan], np.asarray(close, dtype=np.float64)[:-1]))
+    true_range = np.fmax(high - low, np.fmax(np.abs(high - previous_close), np.abs(low - previous_close)))
+    return rma(true_range, length)
+
+
+def bollinger_bands(close, length=20, multiplier=2.0):
+    """Return (upper, basis, lower) using the population standard deviation like TradingView."""
+    close = np.asarray(close, dtype=np.float64)
+    basis = sma(close, length)
+    deviation = np.full(close.shape, np.nan)
+    if close.size >= length:
+        deviation[length - 1:] = np.lib.stride_tricks.sliding_window_view(close, length).std(axis=1)
+    return basis + multiplier * deviation, basis, basis - multiplier * deviation
+
+
+def pivot_points(values, span, highs=True):
+    """Indices of bars that are the extreme of the surrounding +/- span window."""
+    values = np.asarray(values, dtype=np.float64)
+    if values.size < 2 * span + 1:
+        return np.empty(0, dtype=np.int64)
+    windows = np.lib.stride_tricks.sliding_window_view(values, 2 * span + 1)
+    extreme = windows.max(axis=1) if highs else windows.min(axis=1)
+    return np.flatnonzero(values[span:-span] == extreme) + span
+
+
+def swing_levels(high, low, close, span=5, lookback=300, count=3):
+    """Nearest swing-high resistances above and swing-low supports below the last close."""
+    high = np.asarray(high, dtype=np.float64)[-lookback:]
+    low = np.asarray(low, dtype=np.float64)[-lookback:]
+    last = float(np.asarray(close)[-1])
+    resistances = np.unique(high[pivot_points(high, span, highs=True)])
+    supports = np.unique(low[pivot_points(low, span, highs=False)])
+    return supports[supports < last][::-1][:count], resistances[resistances > last][:count]
+
+
+def value_area(high, low, volume, bins=48, share=0.7):
+    """Point of control and the value area holding `share` of the traded volume."""
+    edges, profile = volume_profile(high, low, volume, bins=bins)
+    centers = (edges[:-1] + edges[1:]) / 2
+    poc = int(profile.argmax())
+    # Take bins by descending volume until the share is reached; the area spans the chosen bins
+    order = np.argsort(profile)[::-1]
+    needed = np.searchsorted(np.cumsum(profile[order]), share * profile.sum()) + 1
+    chosen = order[:needed]
+    return centers[poc], edges[chosen.min()], edges[chosen.max() + 1]
+
+
+def _last(values):
+    value = float(values[-1])
+    return None if np.isnan(value) else round(value, 2)
+
+
+def timeframe_features(candles, profile_bars=120):
+    """Latest indicator readings for one timeframe of CANDLE_DTYPE candles."""
+    high, low, close, volume = candles['high'], candles['low'], candles['close'], candles['volume']
+    macd_line, signal_line, histogram = macd(close)
+    upper, basis, lower = bollinger_bands(close)
+    supports, resistances = swing_levels(high, low, close)
+    poc, value_low, value_high = value_area(high[-profile_bars:], low[-profile_bars:], volume[-profile_bars:])
+    return {
+        "time": int(candles['timestamp'][-1] // 1000),
+        "close": _last(close),
+        "ema50": _last(ema(close, 50)),
+        "ema200": _last(ema(close, 200)),
+        "rsi14": _last(rsi(close)),
+        "macd": [_last(macd_line), _last(signal_line), _last(histogram)],
+        "atr14": _last(atr(high, low, close)),
+        "bb20": [_last(upper), _last(basis), _last(lower)],
+        "vp": {"poc": round(float(poc), 2), "va": [round(float(value_low), 2), round(float(value_high), 2)]},
+        "support": [round(float(level), 2) for level in supports],
+        "resistance": [round(float(level), 2) for level in resistances],
+    }
+
+
+def build_indicator_features(candles_by_timeframe):
+    """Numeric feature block for the prompt, e.g. {"1D": candles_1d, "4H": candles_4h} -> dict.
+
+    Returns None when no timeframe has enough candles, so the prompt gets no block rather than a bare legend.
+    """
+    features = {}
+    for timeframe, candles in candles_by_timeframe.items():
+        if candles is not None and candles.size >= 200:
+            features[timeframe] = timeframe_features(candles)
+        else:
+            logger.warning(f"Not enough {timeframe} candles for indicator features")
+    if not features:
+        return None
+    return {"legend": "macd=[line,signal,hist] bb20=[upper,basis,lower] vp=volume profile poc and value area",
+            **features}
+
+
+def format_indicator_features(features):
+    return json.dumps({"indicator_features": features}, separators=(',', ':'))
+
+
+def main(years=6, repeat=20):
+    """Benchmark the feature block over years of synthetic 4H candles."""
+    from fetch_bybit_status import CANDLE_DTYPE
+
+    count = years * 365 * 6
+    rng = np.random.default_rng(0)
+    close = 30000 + np.cumsum(rng.normal(0, 150, count))
+    candles = np.empty(count, dtype=CANDLE_DTYPE)
+    candles['timestamp'] = np.arange(count, dtype=np.int64) * 4 * 3600 * 1000
+    candles['open'] = np.concatenate(([close[0]], close[:-1]))
+    candles['close'] = close
+    candles['high'] = np.maximum(candles['open'], close) + rng.uniform(0, 100, count)
+    candles['low'] = np.minimum(candles['open'], close) - rng.uniform(0, 100, count)
+    candles['volume'] = rng.uniform(100, 5000, count)
+    candles['turnover'] = candles['volume'] * close
+
+    build_indicator_features({"4H": candles})
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        block = format_indicator_features(build_indicator_features({"4H": candles}))
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    logger.info(f"{count} 4H candles ({years} years): median {timings[len(timings) // 2] * 1000:.2f} ms, "
+                f"best {timings[0] * 1000:.2f} ms, block size {len(block)} chars")
+    logger.debug(f"Feature block:\n{block}")
+
+
+if __name__ == '__main__':
+    main()
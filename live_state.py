@@ -0,0 +1,298 @@
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import websockets
+from pybit.unified_trading import HTTP
+
+from logger_setup import setup_logger
+
+logger = setup_logger(__name__)
+
+SYMBOL = "BTCUSDT"
+PUBLIC_STREAM_URL = 'wss://stream.bybit.com/v5/public/linear'
+PUBLIC_STREAM_URL_TESTNET = 'wss://stream-testnet.bybit.com/v5/public/linear'
+PRIVATE_STREAM_URL = 'wss://stream.bybit.com/v5/private'
+PRIVATE_STREAM_URL_TESTNET = 'wss://stream-testnet.bybit.com/v5/private'
+# Bybit recommends a ping every 20 seconds to keep the connection open
+PING_INTERVAL = 20
+# Cached state older than this is not trusted and callers fall back to REST
+LIVE_STATE_MAX_AGE = float(os.getenv('LIVE_STATE_MAX_AGE', '30'))
+RECONNECT_DELAYS = (0.5, 1, 2, 5, 10, 30)
+AUTH_EXPIRY_MS = 10000
+ORDER_HISTORY = 200
+
+
+class StreamGap(Exception):
+    """The stream can no longer be merged incrementally and has to be resubscribed from a snapshot."""
+
+
+class LiveState:
+    """In-memory account and market state kept current from Bybit's WebSocket streams.
+
+    The public stream merges ticker snapshots and deltas; the private stream follows position, wallet and
+    order updates. Every private (re)connect is followed by a REST resync, since updates sent while the
+    connection was down are not replayed. Readers get the latest values as plain attribute reads and should
+    check is_fresh() first. Merged values are replaced rather than mutated, so other threads can read safely.
+    """
+
+    def __init__(self, api_key, api_secret, testnet=False, session=None, public_url=None, private_url=None,
+                 symbol=SYMBOL, ping_interval=PING_INTERVAL):
+        self.api_key = api_key
+        self.api_secret = api_secret
+        # session is used for the REST resync and can be any object with the pybit HTTP interface
+        self.session = session or HTTP(testnet=testnet, api_key=api_key, api_secret=api_secret)
+        self.public_url = public_url or (PUBLIC_STREAM_URL_TESTNET if testnet else PUBLIC_STREAM_URL)
+        self.private_url = private_url or (PRIVATE_STREAM_URL_TESTNET if testnet else PRIVATE_STREAM_URL)
+        self.symbol = symbol
+        self.ping_interval = ping_interval
+        # A connection with no message (not even a pong) for this long is treated as dead
+        self.stall_timeout = ping_interval * 3
+        self.ticker = {}
+        self.position = None
+        self.wallet = None
+        self.orders = OrderedDict()
+        self._ticker_seq = None
+        self._last_message = {"public": 0.0, "private": 0.0}
+        self._synced = {"public": False, "private": False}
+        self.metrics = {"messages": 0, "reconnects": 0, "resyncs": 0, "gaps": 0}
+        self._loop = None
+        self._task = None
+        self._thread = None
+
+    def is_fresh(self, max_age=LIVE_STATE_MAX_AGE, private=True):
+        """True when the market (and account, if private) state is synced and heard from within max_age."""
+        now = time.monotonic()
+        names = ("public", "private") if private else ("public",)
+        if not all(self._synced[name] and now - self._last_message[name] <= max_age for name in names):
+            return False
+        if 'lastPrice' not in self.ticker:
+            return False
+        return not private or (self.position is not None and self.wallet is not None)
+
+    def last_price(self):
+        return float(self.ticker['lastPrice'])
+
+    def equity(self):
+        return float(self.wallet['totalEquity'])
+
+    def order(self, order_link_id):
+        return self.orders.get(order_link_id)
+
+    def status(self):
+        now = time.monotonic()
+        return {
+            "fresh": self.is_fresh(),
+            "synced": dict(self._synced),
+            "age": {name: round(now - at, 1) if at else None for name, at in self._last_message.items()},
+            **self.metrics,
+        }
+
+    def _apply_ticker(self, message):
+        seq = message.get('cs')
+        if message.get('type') == 'snapshot':
+            self.ticker = dict(message['data'])
+            self._synced["public"] = True
+        else:
+            if not self._synced["public"]:
+                raise StreamGap("ticker delta received before the snapshot")
+            if seq is not None and self._ticker_seq is not None and seq < self._ticker_seq:
+                raise StreamGap(f"ticker sequence went back from {self._ticker_seq} to {seq}")
+            ticker = dict(self.ticker)
+            ticker.update(message['data'])
+            self.ticker = ticker
+        self._ticker_seq = seq
+
+    def _apply_position(self, position, resync=False):
+        # Queued stream updates can be older than a REST snapshot taken after the subscription
+        current = self.position
+        if not resync and current is not None and \
+                int(position.get('updatedTime') or 0) < int(current.get('updatedTime') or 0):
+            return
+        self.position = position
+
+    def _record_order(self, order):
+        key = order.get('orderLinkId') or order['orderId']
+        self.orders[key] = order
+        self.orders.move_to_end(key)
+        while len(self.orders) > ORDER_HISTORY:
+            self.orders.popitem(last=False)
+
+    async def _on_public(self, message):
+        if message.get('topic') == f"tickers.{self.symbol}":
+            self._apply_ticker(message)
+        elif message.get('op') == 'subscribe' and not message.get('success'):
+            raise ConnectionError(f"Ticker subscription rejected: {message.get('ret_msg')}")
+
+    async def _on_private(self, message):
+        topic = message.get('topic')
+        if topic is None:
+            if message.get('op') == 'subscribe':
+                if not message.get('success'):
+                    raise ConnectionError(f"Private subscription rejected: {message.get('ret_msg')}")
+                await self._resync_private()
+            return
+        for entry in message.get('data', []):
+            if topic == 'position' and entry.get('symbol') == self.symbol:
+                self._apply_position(entry)
+            elif topic == 'wallet' and entry.get('accountType', 'UNIFIED') == 'UNIFIED':
+                self.wallet = entry
+            elif topic == 'order' and entry.get('symbol') == self.symbol:
+                self._record_order(entry)
+
+    async def _resync_private(self):
+        """Replace position and wallet with REST snapshots once the private subscription is live."""
+        position, wallet = await asyncio.gather(
+            asyncio.to_thread(self.session.get_positions, category="linear", symbol=self.symbol),
+            asyncio.to_thread(self.session.get_wallet_balance, accountType="UNIFIED"),
+        )
+        self._apply_position(position['result']['list'][0], resync=True)
+        self.wallet = wallet['result']['list'][0]
+        self._synced["private"] = True
+        self.metrics["resyncs"] += 1
+        logger.info(f"Live state resynced: position {self.position.get('side') or 'flat'} "
+                    f"{self.position.get('size')}, equity {self.wallet.get('totalEquity')}")
+
+    def _auth_message(self):
+        expires = int(time.time() * 1000) + AUTH_EXPIRY_MS
+        signature = hmac.new(self.api_secret.encode('utf-8'), f"GET/realtime{expires}".encode('utf-8'),
+                             hashlib.sha256).hexdigest()
+        return {"op": "auth", "args": [self.api_key, expires, signature]}
+
+    async def _consume(self, name, websocket, handler):
+        self._last_message[name] = time.monotonic()
+        next_ping = time.monotonic() + self.ping_interval
+        while True:
+            try:
+                raw = await asyncio.wait_for(websocket.recv(), max(0.0, next_ping - time.monotonic()))
+            except asyncio.TimeoutError:
+                if time.monotonic() - self._last_message[name] > self.stall_timeout:
+                    raise ConnectionError(f"no message for {self.stall_timeout}s")
+                await websocket.send(json.dumps({"op": "ping"}))
+                next_ping = time.monotonic() + self.ping_interval
+                continue
+            self._last_message[name] = time.monotonic()
+            self.metrics["messages"] += 1
+            await handler(json.loads(raw))
+
+    async def _public_stream(self):
+        async with websockets.connect(self.public_url, ping_interval=None, close_timeout=1) as websocket:
+            self._ticker_seq = None
+            await websocket.send(json.dumps({"op": "subscribe", "args": [f"tickers.{self.symbol}"]}))
+            await self._consume("public", websocket, self._on_public)
+
+    async def _private_stream(self):
+        async with websockets.connect(self.private_url, ping_interval=None, close_timeout=1) as websocket:
+            await websocket.send(json.dumps(self._auth_message()))
+            reply = json.loads(await asyncio.wait_for(websocket.recv(), self.stall_timeout))
+            if not reply.get('success'):
+                raise ConnectionError(f"Authentication failed: {reply.get('ret_msg')}")
+            await websocket.send(json.dumps({"op": "subscribe", "args": ["position", "wallet", "order"]}))
+            await self._consume("private", websocket, self._on_private)
+
+    async def _maintain(self, name, stream):
+        """Keep one stream connected, reconnecting with backoff; the state is unsynced while it is down."""
+        attempt = 0
+        while True:
+            connected_at = time.monotonic()
+            try:
+                await stream()
+                logger.warning(f"Live {name} stream closed")
+            except asyncio.CancelledError:
+                raise
+            except StreamGap as e:
+                self.metrics["gaps"] += 1
+                logger.warning(f"Live {name} stream gap, resubscribing: {e}")
+            except Exception as e:
+                logger.warning(f"Live {name} stream disconnected: {e}")
+            self._synced[name] = False
+            if time.monotonic() - connected_at > self.stall_timeout:
+                attempt = 0
+            delay = RECONNECT_DELAYS[min(attempt, len(RECONNECT_DELAYS) - 1)]
+            attempt += 1
+            self.metrics["reconnects"] += 1
+            await asyncio.sleep(delay)
+
+    async def run(self):
+        await asyncio.gather(
+            self._maintain("public", self._public_stream),
+            self._maintain("private", self._private_stream),
+        )
+
+    def _run_thread(self):
+        try:
+            self._loop.run_until_complete(self._task)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._loop.close()
+
+    def start(self):
+        """Run the streams on a background thread with its own event loop, independent of the caller's loop."""
+        if self._thread is None:
+            self._loop = asyncio.new_event_loop()
+            self._task = self._loop.create_task(self.run())
+            self._thread = threading.Thread(target=self._run_thread, name="bybit-live-state", daemon=True)
+            self._thread.start()
+        return self
+
+    def wait_until_fresh(self, timeout=10.0):
+        deadline = time.monotonic() + timeout
+        while not self.is_fresh():
+            if time.monotonic() > deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def stop(self, timeout=5.0):
+        if self._thread is not None:
+            self._loop.call_soon_threadsafe(self._task.cancel)
+            self._thread.join(timeout)
+            self._thread = None
+
+
+_live_states = {}
+
+
+def get_live_state(api_key, api_secret, testnet=False):
+    key = (api_key, testnet)
+    if key not in _live_states:
+        _live_states[key] = LiveState(api_key, api_secret, testnet)
+    return _live_states[key]
+
+
+def main(repeat=20):
+    """Compare pre-trade snapshot reads from live state and over REST with 50 ms per request."""
+    from excute_trading import ExecutionClient
+    from mock_exchange import MockExchange, MockStreamServer
+
+    exchange = MockExchange(latency=0.05)
+    server = MockStreamServer(exchange).start()
+    state = LiveState("key", "secret", session=exchange, public_url=server.public_url,
+                      private_url=server.private_url).start()
+    client = ExecutionClient(None, None, session=exchange)
+    client.warm_up()
+    try:
+        if not state.wait_until_fresh():
+            raise SystemExit(f"Live state did not become fresh: {state.status()}")
+        timings = {}
+        for source, live_state in (("live state", state), ("REST", None)):
+            client.live_state = live_state
+            start = time.perf_counter()
+            for _ in range(repeat):
+                client.pretrade_snapshot()
+            timings[source] = (time.perf_counter() - start) * 1000 / repeat
+        logger.info(f"Pre-trade snapshot: {timings['live state']:.2f} ms from live state vs "
+                    f"{timings['REST']:.1f} ms over REST")
+    finally:
+        state.stop()
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,288 @@
+import asyncio
+import json
+import threading
+import time
+import uuid
+from decimal import Decimal
+
+import websockets
+from pybit.exceptions import InvalidRequestError
+
+from logger_setup import setup_logger
+
+logger = setup_logger(__name__)
+
+SYMBOL = "BTCUSDT"
+REDUCE_ONLY_REJECTED = 110017
+
+
+class MockExchange:
+    """In-memory stand-in for the pybit HTTP session used by ExecutionClient.
+
+    Market orders fill immediately at the last price and net into a one-way position. It enforces lot size,
+    reduce-only and orderLinkId uniqueness like Bybit, counts round trips per endpoint, and can simulate
+    latency, failed requests (fail_next) and fills whose response is lost (drop_next_acks). Fills are also
+    passed to listeners as private stream updates, which MockStreamServer publishes.
+    """
+
+    def __init__(self, equity=10000.0, price=60000.0, leverage="3", qty_step="0.001", min_qty="0.001",
+                 max_qty="100", tick_size="0.10", latency=0.0):
+        self.equity = equity
+        self.price = price
+        self.leverage = leverage
+        self.filters = {"qtyStep": qty_step, "minOrderQty": min_qty, "maxOrderQty": max_qty, "tickSize": tick_size}
+        self.latency = latency
+        self.side = ""
+        self.size = Decimal("0")
+        self.updated_time = int(time.time() * 1000)
+        self.orders = []
+        self.round_trips = {}
+        self.fail_next = 0
+        self.drop_next_acks = 0
+        self.listeners = []
+
+    def _call(self, name):
+        self.round_trips[name] = self.round_trips.get(name, 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _reject(self, name, message, code):
+        raise InvalidRequestError(request=name, message=message, status_code=code, time=time.time(),
+                                  resp_headers=None)
+
+    @staticmethod
+    def _ok(result):
+        return {"retCode": 0, "retMsg": "OK", "result": result}
+
+    def _publish(self, topic, data):
+        for listener in self.listeners:
+            listener(topic, data)
+
+    def position_entry(self):
+        return {"symbol": SYMBOL, "side": self.side, "size": format(self.size, 'f'), "leverage": self.leverage,
+                "updatedTime": str(self.updated_time)}
+
+    def wallet_entry(self):
+        return {"accountType": "UNIFIED", "totalEquity": str(self.equity)}
+
+    def get_instruments_info(self, **kwargs):
+        self._call("get_instruments_info")
+        return self._ok({"list": [{
+            "lotSizeFilter": {key: self.filters[key] for key in ("qtyStep", "minOrderQty", "maxOrderQty")},
+            "priceFilter": {"tickSize": self.filters["tickSize"]},
+        }]})
+
+    def get_positions(self, **kwargs):
+        self._call("get_positions")
+        return self._ok({"list": [self.position_entry()]})
+
+    def get_wallet_balance(self, **kwargs):
+        self._call("get_wallet_balance")
+        return self._ok({"list": [self.wallet_entry()]})
+
+    def get_tickers(self, **kwargs):
+        self._call("get_tickers")
+        return self._ok({"list": [{"lastPrice": str(self.price)}]})
+
+    def set_leverage(self, buyLeverage, sellLeverage, **kwargs):
+        self._call("set_leverage")
+        if str(float(buyLeverage)) == str(float(self.leverage)):
+            self._reject("set_leverage", "leverage not modified", 110043)
+        self.leverage = buyLeverage
+        return self._ok({})
+
+    def place_order(self, side, qty, orderLinkId=None, reduceOnly=False, **kwargs):
+        self._call("place_order")
+        if self.fail_next:
+            self.fail_next -= 1
+            raise ConnectionError("simulated connection reset before the order reached the exchange")
+        if orderLinkId and any(order["orderLinkId"] == orderLinkId for order in self.orders):
+            self._reject("place_order", "OrderLinkedID is duplicate", 110072)
+        qty = Decimal(qty)
+        step = Decimal(self.filters["qtyStep"])
+        if qty < Decimal(self.filters["minOrderQty"]) or qty > Decimal(self.filters["maxOrderQty"]) or qty % step:
+            self._reject("place_order", f"invalid qty {qty}", 10001)
+        signed = self.size if self.side == "Buy" else -self.size
+        change = qty if side == "Buy" else -qty
+        if reduceOnly and (signed == 0 or (signed > 0) == (change > 0) or abs(change) > abs(signed)):
+            self._reject("place_order", "reduce-only order would increase the position", REDUCE_ONLY_REJECTED)
+
+        signed += change
+        self.side = "" if signed == 0 else ("Buy" if signed > 0 else "Sell")
+        self.size = abs(signed)
+        self.updated_time = int(time.time() * 1000)
+        order = {"symbol": SYMBOL, "orderId": uuid.uuid4().hex, "orderLinkId": orderLinkId, "side": side,
+                 "qty": format(qty, 'f'), "reduceOnly": reduceOnly, "orderStatus": "Filled"}
+        self.orders.append(order)
+        self._publish("order", [order])
+        self._publish("position", [self.position_entry()])
+        self._publish("wallet", [self.wallet_entry()])
+        if self.drop_next_acks:
+            self.drop_next_acks -= 1
+            raise ConnectionError("simulated timeout after the order was filled")
+        return self._ok({"orderId": order["orderId"], "orderLinkId": orderLinkId})
+
+    def get_order_history(self, orderLinkId=None, **kwargs):
+        self._call("get_order_history")
+        return self._ok({"list": [order for order in reversed(self.orders) if order["orderLinkId"] == orderLinkId]})
+
+
+class MockStreamServer:
+    """Local stand-in for Bybit's public ticker and private account WebSocket streams.
+
+    Runs on its own thread and event loop. Ticker prices come from set_price, private updates from the
+    exchange's fills. drop_connections, send_stale_delta and mute simulate outages, sequence gaps and a
+    connection that silently stops responding.
+    """
+
+    def __init__(self, exchange, host='127.0.0.1'):
+        self.exchange = exchange
+        self.host = host
+        self.public_url = None
+        self.private_url = None
+        self._subscribers = {"public": set(), "private": set()}
+        self._muted = set()
+        self._seq = 0
+        self._paused_until = 0.0
+        self._loop = None
+        self._thread = None
+        self._servers = []
+        exchange.listeners.append(self._on_exchange_update)
+
+    def start(self):
+        started = threading.Event()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, args=(started,), name="mock-stream-server", daemon=True)
+        self._thread.start()
+        started.wait(5)
+        return self
+
+    def _run(self, started):
+        asyncio.set_event_loop(self._loop)
+
+        async def serve():
+            self._servers = [await websockets.serve(self._public, self.host, 0),
+                             await websockets.serve(self._private, self.host, 0)]
+
+        self._loop.run_until_complete(serve())
+        ports = [list(server.sockets)[0].getsockname()[1] for server in self._servers]
+        self.public_url = f"ws://{self.host}:{ports[0]}"
+        self.private_url = f"ws://{self.host}:{ports[1]}"
+        started.set()
+        self._loop.run_forever()
+        for server in self._servers:
+            server.close()
+            self._loop.run_until_complete(server.wait_closed())
+        self._loop.close()
+
+    def stop(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(5)
+
+    def _call(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result(5)
+
+    def _ticker_message(self, type, data):
+        self._seq += 1
+        return {"topic": f"tickers.{SYMBOL}", "type": type, "cs": self._seq, "ts": int(time.time() * 1000),
+                "data": data}
+
+    async def _broadcast(self, name, message):
+        raw = json.dumps(message)
+        for websocket in list(self._subscribers[name]):
+            if websocket not in self._muted:
+                try:
+                    await websocket.send(raw)
+                except websockets.ConnectionClosed:
+                    self._subscribers[name].discard(websocket)
+
+    async def _serve(self, name, websocket, reply):
+        if time.monotonic() < self._paused_until:
+            await websocket.close(1013, "try again later")
+            return
+        try:
+            async for raw in websocket:
+                if websocket in self._muted:
+                    continue
+                for message in reply(json.loads(raw)):
+                    await websocket.send(json.dumps(message))
+                    if message.get('op') == 'subscribe':
+                        self._subscribers[name].add(websocket)
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            self._subscribers[name].discard(websocket)
+            self._muted.discard(websocket)
+
+    async def _public(self, websocket, path=None):
+        def reply(message):
+            if message.get('op') == 'ping':
+                return [{"success": True, "ret_msg": "pong", "op": "ping"}]
+            if message.get('op') == 'subscribe':
+                snapshot = {"symbol": SYMBOL, "lastPrice": str(self.exchange.price),
+                            "markPrice": str(self.exchange.price)}
+                return [{"success": True, "ret_msg": "", "op": "subscribe"},
+                        self._ticker_message("snapshot", snapshot)]
+            return []
+
+        await self._serve("public", websocket, reply)
+
+    async def _private(self, websocket, path=None):
+        def reply(message):
+            if message.get('op') == 'auth':
+                return [{"success": True, "ret_msg": "", "op": "auth"}]
+            if message.get('op') == 'subscribe':
+                return [{"success": True, "ret_msg": "", "op": "subscribe"}]
+            if message.get('op') == 'ping':
+                return [{"op": "pong", "args": [str(int(time.time() * 1000))]}]
+            return []
+
+        await self._serve("private", websocket, reply)
+
+    def _on_exchange_update(self, topic, data):
+        message = {"topic": topic, "creationTime": int(time.time() * 1000), "data": data}
+        self._call(self._broadcast("private", message))
+
+    def set_price(self, price):
+        self.exchange.price = price
+        message = self._ticker_message("delta", {"symbol": SYMBOL, "lastPrice": str(price)})
+        self._call(self._broadcast("public", message))
+
+    def send_stale_delta(self):
+        message = self._ticker_message("delta", {"symbol": SYMBOL, "lastPrice": str(self.exchange.price)})
+        message["cs"] = self._seq - 10
+        self._call(self._broadcast("public", message))
+
+    def drop_connections(self, pause=0.0):
+        """Close every connection and refuse new ones for pause seconds."""
+        self._paused_until = time.monotonic() + pause
+
+        async def close_all():
+            for websocket in set().union(*self._subscribers.values()):
+                await websocket.close(1001, "going away")
+
+        self._call(close_all())
+
+    def mute(self):
+        """Stop answering the current connections, including pings, without closing them."""
+        self._loop.call_soon_threadsafe(lambda: self._muted.update(set().union(*self._subscribers.values())))
+
+
+def main():
+    """Measure decision-to-submission latency and round trips per decision with 50 ms per request."""
+    from excute_trading import ExecutionClient
+
+    exchange = MockExchange(latency=0.05)
+    client = ExecutionClient(None, None, session=exchange)
+    client.warm_up()
+    timestamp = 1724726400
+    for action in ("Open Long", "Switch to Short", "Maintain Short", "Switch to Long", "Close Long"):
+        timestamp += 14400
+        client.execute({"action": action, "timestamp": timestamp})
+
+    latencies = [entry["decision_to_submit_ms"] for entry in client.latencies]
+    logger.info(f"Round trips: {exchange.round_trips}. Decision to submission: {latencies} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,208 @@
+import json
+import re
+import time
+import zlib
+
+import numpy as np
+
+from logger_setup import setup_logger
+
+logger = setup_logger(__name__)
+
+NUM_PERMUTATIONS = 64
+BANDS = 16  # 4 rows per band puts the LSH threshold near a Jaccard similarity of 0.5
+SIMILARITY_THRESHOLD = 0.5
+SHINGLE_WORDS = 2
+# Rows are compared in two views so that only text of the same kind meets: headline against headline as word
+# sets, and headline plus lead against headline plus lead, cut to the same number of words for every source
+TITLE_SHINGLE_WORDS = 1
+TITLE_MIN_WORDS = 4  # shorter headlines ("BTC update") are too generic to merge on
+LEAD_WORDS = 40
+MINHASH_SEED = 42
+
+_PRIME = np.uint64(4294967311)  # First prime above 2**32, so a * x + b stays inside uint64
+_rng = np.random.RandomState(MINHASH_SEED)
+_PERM_A = _rng.randint(1, 2 ** 32, NUM_PERMUTATIONS, dtype=np.uint64)
+_PERM_B = _rng.randint(0, 2 ** 32, NUM_PERMUTATIONS, dtype=np.uint64)
+_WORD = re.compile(r'\w+')
+
+
+class TextSource:
+    """Rows of one feed taking part in deduplication.
+
+    title_column holds the headline and text_columns, headline first, are joined to form the lead compared
+    across sources. When flagged is true the last column is the is_new flag from the article index and the
+    mention count goes in front of it.
+    """
+
+    def __init__(self, name, rows, text_columns, title_column=None, flagged=False):
+        self.name = name
+        self.rows = rows
+        self.text_columns = text_columns
+        self.title_column = title_column
+        self.flagged = flagged
+
+    def title(self, row):
+        if self.title_column is None:
+            return ''
+        words = _WORD.findall(str(row[self.title_column] or ''))
+        return ' '.join(words) if len(words) >= TITLE_MIN_WORDS else ''
+
+    def lead(self, row, max_words=LEAD_WORDS):
+        text = ' '.join(str(row[column] or '') for column in self.text_columns)
+        return ' '.join(_WORD.findall(text)[:max_words])
+
+
+def shingles(text, shingle_words=SHINGLE_WORDS):
+    words = _WORD.findall(text.lower())
+    if len(words) < shingle_words:
+        return set(words)
+    return {' '.join(words[i:i + shingle_words]) for i in range(len(words) - shingle_words + 1)}
+
+
+def minhash(text, shingle_words=SHINGLE_WORDS):
+    """MinHash signature of the word shingles, or None for text without words."""
+    tokens = shingles(text, shingle_words)
+    if not tokens:
+        return None
+    hashes = np.fromiter((zlib.crc32(token.encode('utf-8')) for token in tokens), dtype=np.uint64,
+                         count=len(tokens))
+    return ((hashes[:, None] * _PERM_A + _PERM_B) % _PRIME).min(axis=0)
+
+
+def estimated_similarity(signature_a, signature_b):
+    return float(np.count_nonzero(signature_a == signature_b)) / NUM_PERMUTATIONS
+
+
+def _find(parent, index):
+    while parent[index] != index:
+        parent[index] = parent[parent[index]]
+        index = parent[index]
+    return index
+
+
+def _union(parent, a, b):
+    """Merge the clusters of a and b under the lower root."""
+    root_a, root_b = _find(parent, a), _find(parent, b)
+    if root_a != root_b:
+        parent[max(root_a, root_b)] = min(root_a, root_b)
+
+
+def cluster_texts(texts, threshold=SIMILARITY_THRESHOLD, shingle_words=SHINGLE_WORDS):
+    """Assign a cluster id to every text; near-duplicates share the id of their earliest member.
+
+    Each text is hashed once and compared only against the first member of every LSH bucket it lands in,
+    so the cost grows linearly with the number of texts.
+    """
+    parent = list(range(len(texts)))
+
+    rows_per_band = NUM_PERMUTATIONS // BANDS
+    buckets = {}
+    signatures = [minhash(text, shingle_words) for text in texts]
+    for index, signature in enumerate(signatures):
+        if signature is None:
+            continue
+        for band in range(BANDS):
+            key = (band, signature[band * rows_per_band:(band + 1) * rows_per_band].tobytes())
+            first = buckets.setdefault(key, index)
+            if first == index:
+                continue
+            if _find(parent, first) != _find(parent, index) and \
+                    estimated_similarity(signatures[first], signature) >= threshold:
+                _union(parent, first, index)
+    return [_find(parent, index) for index in range(len(texts))]
+
+
+def estimate_tokens(value):
+    return len(json.dumps(value, ensure_ascii=False, separators=(',', ':'))) // 4
+
+
+def deduplicate_sources(sources, threshold=SIMILARITY_THRESHOLD):
+    """Keep one representative row per near-duplicate cluster across all sources.
+
+    Sources are given in priority order; the first row of a cluster is kept and gets a mention count
+    (the cluster size) appended. Sources whose rows are not a list pass through unchanged.
+    Returns ({name: rows}, report).
+    """
+    start = time.perf_counter()
+    entries = []
+    for source in sources:
+        if isinstance(source.rows, list):
+            entries.extend((source, row) for row in source.rows)
+
+    # A row joins a cluster when either view matches; clusters keep the id of their earliest member
+    parent = list(range(len(entries)))
+    views = (
+        cluster_texts([source.title(row) for source, row in entries], threshold, TITLE_SHINGLE_WORDS),
+        cluster_texts([source.lead(row) for source, row in entries], threshold),
+    )
+    for view in views:
+        for index, root in enumerate(view):
+            _union(parent, index, root)
+    clusters = [_find(parent, index) for index in range(len(entries))]
+    mentions = {}
+    for root in clusters:
+        mentions[root] = mentions.get(root, 0) + 1
+
+    result = {source.name: source.rows if not isinstance(source.rows, list) else [] for source in sources}
+    removed = {source.name: 0 for source in sources}
+    tokens_saved = 0
+    for index, ((source, row), root) in enumerate(zip(entries, clusters)):
+        if root != index:
+            removed[source.name] += 1
+            tokens_saved += estimate_tokens(row)
+            continue
+        if source.flagged:
+            result[source.name].append(row[:-1] + [mentions[root], row[-1]])
+        else:
+            result[source.name].append(row + [mentions[root]])
+
+    report = {
+        "items": len(entries),
+        "clusters": len(mentions),
+        "removed": removed,
+        "tokens_saved": tokens_saved,
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+    }
+    logger.info(f"Near-duplicate stage: {report['items']} items -> {report['clusters']} clusters, "
+                f"~{tokens_saved} tokens saved in {report['elapsed_ms']} ms")
+    return result, report
+
+
+def main():
+    import random
+    rng = random.Random(0)
+    vocabulary = [f"word{i}" for i in range(5000)]
+    for count in (1000, 2000, 4000, 8000):
+        stories = [' '.join(rng.choice(vocabulary) for _ in range(25)) for _ in range(count // 4)]
+        rows = []
+        for i in range(count):
+            words = stories[i % len(stories)].split()
+            words[rng.randrange(len(words))] = rng.choice(vocabulary)  # one edited word per copy
+            rows.append([i, ' '.join(words)])
+        _, report = deduplicate_sources([TextSource('synthetic', rows, [1])])
+        logger.info(f"{count} items: {report['clusters']} clusters (expected {len(stories)}), "
+                    f"{report['elapsed_ms']} ms")
+
+    # One story in all three feeds: a CoinDesk headline with its summary, a bare TradingView headline and an
+    # idea whose long body has little in common with either
+    body = ' '.join(rng.choice(vocabulary) for _ in range(250))
+    crypto_news = [[1724700000, "Bitcoin ETF inflows hit a record as BTC tops 70000 dollars",
+                    "Spot bitcoin funds took in more than a billion dollars on Monday, their best day since launch."],
+                   [1724700100, "Ether staking yields fall to a two year low", "Validators earn less as fees drop."]]
+    tradingview_news = [[1724700200, "Reuters", "Bitcoin ETF inflows hit record as BTC tops 70000 dollars"]]
+    tradingview_ideas = [[1724700300, 12, "Bitcoin ETF inflows hit a record: BTC tops 70000 dollars, what next",
+                          body],
+                         [1724700400, 3, "Bitcoin long setup on the 4H chart", body[::-1]]]
+    deduplicated, report = deduplicate_sources([
+        TextSource('crypto_news', crypto_news, [1, 2], title_column=1),
+        TextSource('tradingview_news', tradingview_news, [2], title_column=2),
+        TextSource('tradingview_ideas', tradingview_ideas, [2, 3], title_column=2),
+    ])
+    logger.info(f"Cross-source: {report['items']} items -> {report['clusters']} clusters, removed {report['removed']}")
+    assert report['removed'] == {'crypto_news': 0, 'tradingview_news': 1, 'tradingview_ideas': 1}, report
+    assert deduplicated['crypto_news'][0][-1] == 3, deduplicated['crypto_news']
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+import hashlib
+import os
+import time
+
+import aiosqlite
+
+from logger_setup import setup_logger
+
+logger = setup_logger(__name__)
+
+NEWS_INDEX_PATH = os.getenv('NEWS_INDEX_PATH', 'news_index.sqlite')
+SEEN_DIGEST_LIMIT = 10
+
+
+def content_hash(*parts):
+    """Stable hash of the article text, insensitive to case and whitespace."""
+    text = ' '.join(' '.join(str(part or '') for part in parts).lower().split())
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+
+class ArticleIndex:
+    """Persistent record of articles already sent to the model, keyed by (source, content hash).
+
+    Both lookups go through the primary key or the (source, source_id) index, so they stay logarithmic in
+    the table size and effectively constant for hundreds of thousands of rows.
+    """
+
+    def __init__(self, db_path=NEWS_INDEX_PATH):
+        self.db_path = db_path
+        self._conn = None
+        self._pending = []
+
+    async def connect(self):
+        if self._conn is None:
+            self._conn = await aiosqlite.connect(self.db_path)
+            await self._conn.execute('PRAGMA journal_mode=WAL')
+            await self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS seen_articles (
+                    source TEXT NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    source_id TEXT,
+                    first_seen INTEGER NOT NULL,
+                    PRIMARY KEY (source, content_hash)
+                ) WITHOUT ROWID
+            ''')
+            await self._conn.execute(
+                'CREATE INDEX IF NOT EXISTS idx_seen_articles_source_id ON seen_articles (source, source_id)')
+            await self._conn.commit()
+        return self._conn
+
+    async def close(self):
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
+
+    async def tag(self, source, keys):
+        """Return an is_new flag per (source_id, content_hash) key and queue the new ones to be marked seen."""
+        if not keys:
+            return []
+        conn = await self.connect()
+        hashes = [key[1] for key in keys]
+        source_ids = [key[0] for key in keys if key[0]]
+        seen_hashes = set()
+        seen_ids = set()
+        # Stay below SQLite's bound-parameter limit
+        for start in range(0, len(hashes), 500):
+            chunk = hashes[start:start + 500]
+            async with conn.execute(
+                    f'SELECT content_hash FROM seen_articles WHERE source = ? AND content_hash IN '
+                    f'({",".join("?" * len(chunk))})', (source, *chunk)) as cursor:
+                seen_hashes.update(row[0] for row in await cursor.fetchall())
+        for start in range(0, len(source_ids), 500):
+            chunk = source_ids[start:start + 500]
+            async with conn.execute(
+                    f'SELECT source_id FROM seen_articles WHERE source = ? AND source_id IN '
+                    f'({",".join("?" * len(chunk))})', (source, *chunk)) as cursor:
+                seen_ids.update(row[0] for row in await cursor.fetchall())
+
+        flags = []
+        now = int(time.time())
+        for source_id, digest in keys:
+            is_new = digest not in seen_hashes and not (source_id and source_id in seen_ids)
+            flags.append(is_new)
+            if is_new:
+                self._pending.append((source, digest, source_id, now))
+        logger.info(f"{source}: {sum(flags)} new of {len(flags)} articles")
+        return flags
+
+    async def mark_pending_seen(self):
+        """Record the articles tagged new since the last call; call once they reached the model."""
+        if not self._pending:
+            return 0
+        conn = await self.connect()
+        await conn.executemany(
+            'INSERT OR IGNORE INTO seen_articles (source, content_hash, source_id, first_seen) VALUES (?, ?, ?, ?)',
+            self._pending)
+        await conn.commit()
+        count = len(self._pending)
+        self._pending = []
+        return count
+
+    def discard_pending(self):
+        self._pending = []
+
+
+def split_new_and_seen(rows, digest_columns, digest_limit=SEEN_DIGEST_LIMIT):
+    """Turn rows whose last column is an is_new flag into new rows plus a short digest of the seen ones."""
+    if not isinstance(rows, list):
+        return rows
+    new = [row[:-1] for row in rows if row[-1]]
+    seen = [[row[column] for column in digest_columns] for row in rows if not row[-1]]
+    return {"new": new, "seen_digest": seen[:digest_limit], "seen_count": len(seen)}
+
+
+_article_index = None
+
+
+def get_article_index():
+    global _article_index
+    if _article_index is None:
+        _article_index = ArticleIndex()
+    return _article_index
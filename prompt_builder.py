@@ -0,0 +1,177 @@
+import json
+import os
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+from logger_setup import setup_logger
+
+logger = setup_logger(__name__)
+
+# Tokenizer of the gpt-4o model family
+PROMPT_ENCODING = 'o200k_base'
+# Tokens allowed for the text data sections of one prompt (instructions and images are not included)
+PROMPT_TOKEN_BUDGET = int(os.getenv('PROMPT_TOKEN_BUDGET', '12000'))
+
+_encoding = None
+_encoding_loaded = False
+
+
+def _get_encoding():
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        if tiktoken is None:
+            logger.error("tiktoken is not installed (see requirements.txt); token budgets fall back to characters / 4")
+        else:
+            try:
+                _encoding = tiktoken.get_encoding(PROMPT_ENCODING)
+            except Exception as e:
+                logger.error(f"Could not load the {PROMPT_ENCODING} tokenizer, token budgets fall back to "
+                             f"characters / 4: {e}")
+    return _encoding
+
+
+def count_tokens(text):
+    encoding = _get_encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def tokenizer_name():
+    return PROMPT_ENCODING if _get_encoding() is not None else "estimate"
+
+
+def minify(value):
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+def to_tabular(value):
+    """Turn a list of objects sharing the same keys into {"columns": [...], "rows": [[...], ...]}."""
+    if not isinstance(value, list) or not value or not all(isinstance(item, dict) for item in value):
+        return value
+    columns = list(value[0])
+    if any(list(item) != columns for item in value):
+        return value
+    return {"columns": columns, "rows": [[item[column] for column in columns] for item in value]}
+
+
+def _rows(value):
+    """The truncatable row list of a section value, or None."""
+    if isinstance(value, list):
+        return value
+    if isinstance(value, dict):
+        for key in ("rows", "new"):
+            if isinstance(value.get(key), list):
+                return value[key]
+    return None
+
+
+def _keep_rows(value, count):
+    if isinstance(value, list):
+        return value[:count]
+    key = "rows" if isinstance(value.get("rows"), list) else "new"
+    return {**value, key: value[key][:count]}
+
+
+class Section:
+    """One data block of the prompt.
+
+    Lower priority numbers are more important and are truncated last. Row lists are ordered newest first,
+    so truncation drops rows from the end. preformatted sections are sent as given and never truncated.
+    """
+
+    def __init__(self, name, data, priority, budget=None, tabular=False, preformatted=False):
+        self.name = name
+        self.data = data
+        self.priority = priority
+        self.budget = budget
+        self.preformatted = preformatted
+        self.value = data if preformatted else (to_tabular(data) if tabular else data)
+        self.text = data if preformatted else minify(self.value)
+        self.tokens = count_tokens(self.text)
+        self.original_tokens = self.tokens
+        rows = None if preformatted else _rows(self.value)
+        self.original_rows = len(rows) if rows is not None else None
+        self.rows = self.original_rows
+
+    def fit(self, limit):
+        """Drop trailing rows until the section fits in limit tokens (or has no rows left)."""
+        if self.tokens <= limit or self.rows is None:
+            return
+        low, high = 0, self.rows - 1
+        best = (0, _keep_rows(self.value, 0))
+        while low <= high:
+            middle = (low + high) // 2
+            candidate = _keep_rows(self.value, middle)
+            if count_tokens(minify(candidate)) <= limit:
+                best = (middle, candidate)
+                low = middle + 1
+            else:
+                high = middle - 1
+        self.rows, self.value = best
+        self.text = minify(self.value)
+        self.tokens = count_tokens(self.text)
+
+
+class PromptBuilder:
+    """Serializes data sections compactly and keeps their total under a token budget."""
+
+    def __init__(self, total_budget=PROMPT_TOKEN_BUDGET):
+        self.total_budget = total_budget
+        self.sections = []
+
+    def add(self, name, data, priority, budget=None, tabular=False, preformatted=False):
+        self.sections.append(Section(name, data, priority, budget, tabular, preformatted))
+        return self
+
+    def build(self):
+        """Return the section texts in insertion order and a per-section token report."""
+        for section in self.sections:
+            if section.budget is not None:
+                section.fit(section.budget)
+
+        total = sum(section.tokens for section in self.sections)
+        for section in sorted(self.sections, key=lambda s: s.priority, reverse=True):
+            if total <= self.total_budget:
+                break
+            before = section.tokens
+            section.fit(max(before - (total - self.total_budget), 0))
+            total -= before - section.tokens
+
+        report = {
+            "tokenizer": tokenizer_name(),
+            "total": total,
+            "budget": self.total_budget,
+            "sections": {section.name: {"tokens": section.tokens, "original_tokens": section.original_tokens,
+                                        "rows": section.rows, "original_rows": section.original_rows}
+                         for section in self.sections},
+        }
+        logger.info(f"Prompt tokens ({report['tokenizer']}): {total}/{self.total_budget} - " + ", ".join(
+            f"{section.name}={section.tokens}" +
+            (f" (truncated {section.original_rows}->{section.rows} rows)" if section.rows != section.original_rows
+             else "")
+            for section in self.sections))
+        return [section.text for section in self.sections], report
+
+
+def main():
+    news = [[1724442837 - i * 600, f"Bitcoin headline number {i} about ETF flows and rates",
+             "A summary sentence that repeats a few times to look like an article. " * 3] for i in range(50)]
+    decisions = [{"timestamp": 1724726507 - i * 14400, "action": "Maintain Short",
+                  "rationale": {"technical_analysis": "Bearish channel.", "news_impact": "ETF outflows.",
+                                "market_sentiment": "Fear.", "conclusion": "Hold the short."},
+                  "confidence_score": 0.8} for i in range(5)]
+    pretty = sum(count_tokens(json.dumps(data, ensure_ascii=False, indent=2)) for data in (decisions, news))
+    builder = PromptBuilder(total_budget=2500)
+    builder.add("last_decisions", decisions, priority=2, tabular=True)
+    builder.add("crypto_news", news, priority=3, budget=4000)
+    _, report = builder.build()
+    logger.info(f"indent=2 would have used {pretty} tokens for the same data; sent {report['total']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,232 @@
+import asyncio
+import io
+import os
+import time
+
+import numpy as np
+from dotenv import load_dotenv
+from PIL import Image, ImageDraw, ImageFont
+
+from capture_chart_images import chart_result, process_image, tradingview_url
+from candle_store import sync_candle_history
+from indicators import ema, macd, pivot_points, rsi, volume_profile
+from logger_setup import setup_logger
+
+logger = setup_logger(__name__)
+
+CHART_WIDTH = 1420
+CHART_HEIGHT = 800
+VISIBLE_BARS = 160
+AXIS_WIDTH = 80
+PADDING = 8
+PIVOT_SPAN = 5
+
+BACKGROUND = (255, 255, 255)
+GRID = (236, 238, 242)
+TEXT = (19, 23, 34)
+UP = (38, 166, 154)
+DOWN = (239, 83, 80)
+EMA50_COLOR = (41, 98, 255)
+EMA200_COLOR = (255, 152, 0)
+RSI_COLOR = (126, 87, 194)
+MACD_COLOR = (41, 98, 255)
+SIGNAL_COLOR = (255, 109, 0)
+PROFILE_COLOR = (41, 98, 255, 70)
+TRENDLINE_COLOR = (33, 150, 243)
+
+FONT = ImageFont.load_default()
+
+
+class Pane:
+    """A horizontal band of the chart with its own value scale."""
+
+    def __init__(self, top, bottom, lower, upper, count):
+        self.top = top
+        self.bottom = bottom
+        self.left = PADDING
+        self.right = CHART_WIDTH - AXIS_WIDTH
+        margin = (upper - lower) * 0.05 or 1.0
+        self.lower = lower - margin
+        self.upper = upper + margin
+        self.step = (self.right - self.left) / count
+        self.xs = self.left + self.step * (np.arange(count) + 0.5)
+
+    def y(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        return self.bottom - (values - self.lower) / (self.upper - self.lower) * (self.bottom - self.top)
+
+    def draw_frame(self, draw, title, label_format="{:,.2f}"):
+        draw.rectangle([self.left, self.top, self.right, self.bottom], outline=GRID)
+        for value in np.linspace(self.lower, self.upper, 6)[1:-1]:
+            y = float(self.y(value))
+            draw.line([(self.left, y), (self.right, y)], fill=GRID)
+            draw.text((self.right + 6, y - 6), label_format.format(value), fill=TEXT, font=FONT)
+        draw.text((self.left + 6, self.top + 4), title, fill=TEXT, font=FONT)
+
+    def draw_line(self, draw, values, color, width=2):
+        ys = self.y(values)
+        valid = ~np.isnan(ys)
+        # Split into runs of valid points so warm-up NaNs leave a gap
+        breaks = np.flatnonzero(np.diff(valid.astype(np.int8))) + 1
+        for run in np.split(np.arange(ys.size), breaks):
+            if run.size > 1 and valid[run[0]]:
+                draw.line(list(zip(self.xs[run].tolist(), ys[run].tolist())), fill=color, width=width)
+
+    def draw_level(self, draw, value, color):
+        y = float(self.y(value))
+        draw.line([(self.left, y), (self.right, y)], fill=color, width=1)
+
+
+def _new_canvas():
+    image = Image.new("RGB", (CHART_WIDTH, CHART_HEIGHT), BACKGROUND)
+    return image, ImageDraw.Draw(image, "RGBA")
+
+
+def _to_png(image):
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _draw_candles(draw, pane, candles):
+    body = max(pane.step * 0.7, 1.0)
+    up = candles['close'] >= candles['open']
+    high_y, low_y = pane.y(candles['high']), pane.y(candles['low'])
+    open_y, close_y = pane.y(candles['open']), pane.y(candles['close'])
+    for x, hy, ly, oy, cy, rising in zip(pane.xs.tolist(), high_y.tolist(), low_y.tolist(),
+                                         open_y.tolist(), close_y.tolist(), up.tolist()):
+        color = UP if rising else DOWN
+        draw.line([(x, hy), (x, ly)], fill=color)
+        draw.rectangle([x - body / 2, min(oy, cy), x + body / 2, max(oy, cy) + 1], fill=color)
+
+
+def _draw_trendlines(draw, pane, candles):
+    """Connect the last two swing highs and the last two swing lows and extend them to the right edge."""
+    count = candles.size
+    for values, highs in ((candles['high'], True), (candles['low'], False)):
+        pivots = pivot_points(values, PIVOT_SPAN, highs)
+        if pivots.size < 2:
+            continue
+        first, second = pivots[-2], pivots[-1]
+        slope = (values[second] - values[first]) / (second - first)
+        end_value = values[first] + slope * (count - 1 - first)
+        draw.line([(float(pane.xs[first]), float(pane.y(values[first]))),
+                   (float(pane.xs[-1]), float(pane.y(end_value)))], fill=TRENDLINE_COLOR, width=2)
+
+
+def _price_pane(candles, top, bottom, extra_series=()):
+    series = [candles['high'], candles['low']] + [s[~np.isnan(s)] for s in extra_series]
+    lower = min(s.min() for s in series if s.size)
+    upper = max(s.max() for s in series if s.size)
+    return Pane(top, bottom, lower, upper, candles.size)
+
+
+def render_trend_momentum_chart(candles, title):
+    """Candles with trendlines, RSI(14) and MACD(12, 26, 9) panes."""
+    close = candles['close']
+    rsi_values = rsi(close)[-VISIBLE_BARS:]
+    macd_line, signal_line, histogram = (series[-VISIBLE_BARS:] for series in macd(close))
+    visible = candles[-VISIBLE_BARS:]
+
+    image, draw = _new_canvas()
+    price = _price_pane(visible, PADDING, 440)
+    price.draw_frame(draw, f"{title}  C {visible['close'][-1]:,.2f}")
+    _draw_candles(draw, price, visible)
+    _draw_trendlines(draw, price, visible)
+
+    rsi_pane = Pane(450, 590, 0, 100, visible.size)
+    rsi_pane.draw_frame(draw, f"RSI 14: {rsi_values[-1]:.2f}", "{:.0f}")
+    rsi_pane.draw_level(draw, 70, GRID)
+    rsi_pane.draw_level(draw, 30, GRID)
+    rsi_pane.draw_line(draw, rsi_values, RSI_COLOR)
+
+    finite = np.concatenate([s[~np.isnan(s)] for s in (macd_line, signal_line, histogram)])
+    macd_pane = Pane(600, CHART_HEIGHT - PADDING, finite.min(), finite.max(), visible.size)
+    macd_pane.draw_frame(draw, f"MACD 12 26 9: {macd_line[-1]:.2f} {signal_line[-1]:.2f} {histogram[-1]:.2f}")
+    zero = float(macd_pane.y(0.0))
+    bar = max(macd_pane.step * 0.6, 1.0)
+    for x, y, value in zip(macd_pane.xs.tolist(), macd_pane.y(histogram).tolist(), histogram.tolist()):
+        if not np.isnan(value):
+            draw.rectangle([x - bar / 2, min(y, zero), x + bar / 2, max(y, zero)], fill=UP if value >= 0 else DOWN)
+    macd_pane.draw_line(draw, macd_line, MACD_COLOR)
+    macd_pane.draw_line(draw, signal_line, SIGNAL_COLOR)
+    return _to_png(image)
+
+
+def render_moving_average_volume_chart(candles, title, profile_bins=24):
+    """Candles with EMA 50/200, a visible-range volume profile and a volume pane."""
+    close = candles['close']
+    ema50 = ema(close, 50)[-VISIBLE_BARS:]
+    ema200 = ema(close, 200)[-VISIBLE_BARS:]
+    visible = candles[-VISIBLE_BARS:]
+
+    image, draw = _new_canvas()
+    price = _price_pane(visible, PADDING, 620, (ema50, ema200))
+    price.draw_frame(draw, f"{title}  C {visible['close'][-1]:,.2f}  "
+                           f"EMA 50: {ema50[-1]:,.2f}  EMA 200: {ema200[-1]:,.2f}")
+
+    edges, profile = volume_profile(visible['high'], visible['low'], visible['volume'], bins=profile_bins,
+                                    price_range=(price.lower, price.upper))
+    max_width = (price.right - price.left) * 0.25
+    widths = profile / profile.max() * max_width if profile.max() > 0 else profile
+    for lower, upper, width in zip(edges[:-1].tolist(), edges[1:].tolist(), widths.tolist()):
+        draw.rectangle([price.right - width, float(price.y(upper)) + 1, price.right, float(price.y(lower)) - 1],
+                       fill=PROFILE_COLOR)
+
+    _draw_candles(draw, price, visible)
+    price.draw_line(draw, ema50, EMA50_COLOR)
+    price.draw_line(draw, ema200, EMA200_COLOR)
+
+    volume = visible['volume']
+    volume_pane = Pane(630, CHART_HEIGHT - PADDING, 0, volume.max(), visible.size)
+    volume_pane.draw_frame(draw, f"Volume: {volume[-1]:,.0f}", "{:,.0f}")
+    base = float(volume_pane.y(0.0))
+    bar = max(volume_pane.step * 0.7, 1.0)
+    rising = (visible['close'] >= visible['open']).tolist()
+    for x, y, up in zip(volume_pane.xs.tolist(), volume_pane.y(volume).tolist(), rising):
+        draw.rectangle([x - bar / 2, y, x + bar / 2, base], fill=UP if up else DOWN)
+    return _to_png(image)
+
+
+def render_chart_set(candles_1d, candles_4h):
+    """Render the three TradingView layouts locally. Returns a list of (file_name, png_bytes)."""
+    for candles, interval in ((candles_1d, "1D"), (candles_4h, "4H")):
+        if candles is None or len(candles) == 0:
+            raise ValueError(f"No {interval} candles to render the local charts from")
+    (_, daily_trend), (_, daily_averages), (_, four_hour_trend) = tradingview_url
+    return [
+        (daily_trend, render_trend_momentum_chart(candles_1d, "BTCUSDT.P 1D")),
+        (daily_averages, render_moving_average_volume_chart(candles_1d, "BTCUSDT.P 1D")),
+        (four_hour_trend, render_trend_momentum_chart(candles_4h, "BTCUSDT.P 4H")),
+    ]
+
+
+async def render_chart_images(candles_1d, candles_4h):
+    """Drop-in replacement for capture_tradingview_charts that renders from candle arrays."""
+    os.makedirs("captured_images", exist_ok=True)
+    start = time.perf_counter()
+    # About a quarter second of PIL and numpy work, kept off the event loop like the image optimization
+    charts = await asyncio.to_thread(render_chart_set, candles_1d, candles_4h)
+    logger.info(f"Rendered {len(charts)} charts locally in {time.perf_counter() - start:.3f}s")
+    return [
+        chart_result(file_name, await process_image(png_bytes, file_name), 0.0)
+        for file_name, png_bytes in charts
+    ]
+
+
+async def render_local_charts(api_key, api_secret, testnet=False):
+    candles_1d, candles_4h = await sync_candle_history(api_key, api_secret, testnet)
+    return await render_chart_images(candles_1d, candles_4h)
+
+
+def main():
+    load_dotenv()
+    api_key = os.getenv('BYBIT_API_KEY_1')
+    api_secret = os.getenv('BYBIT_API_SECRET_1')
+    results = asyncio.run(render_local_charts(api_key, api_secret))
+    for result in results:
+        logger.info(f"Result: {result.file_name} - Image Size: {result.size} bytes")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+import hashlib
+import json
+import os
+import re
+import time
+
+from logger_setup import setup_logger
+
+logger = setup_logger(__name__)
+
+CACHE_DIRECTORY = os.getenv("HTTP_CACHE_DIR", os.path.join("cache", "http"))
+CACHE_MAX_BYTES = int(os.getenv("HTTP_CACHE_MAX_BYTES", str(50 * 1024 * 1024)))
+# Serve every cached response regardless of age and never touch the network (for development reruns)
+CACHE_OFFLINE = os.getenv("HTTP_CACHE_OFFLINE", "0") == "1"
+
+
+class OfflineCacheMiss(Exception):
+    """Offline mode is on and the request has never been cached."""
+
+
+class CachePolicy:
+    """How long a source's responses may be served from the cache.
+
+    max_age caps the freshness lifetime in seconds. ttl_from extracts a server-provided lifetime from the
+    decoded body (e.g. fear & greed's time_until_update); a Cache-Control max-age header is honored too.
+    With stale_while_revalidate an expired entry is returned at once and refreshed in the background.
+    """
+
+    def __init__(self, max_age, ttl_from=None, stale_while_revalidate=False):
+        self.max_age = max_age
+        self.ttl_from = ttl_from
+        self.stale_while_revalidate = stale_while_revalidate
+
+    def lifetime(self, body, headers):
+        server_ttl = None
+        if self.ttl_from is not None:
+            try:
+                server_ttl = float(self.ttl_from(body))
+            except Exception as e:
+                logger.warning(f"Could not read TTL from response body: {e}")
+        if server_ttl is None:
+            match = re.search(r'max-age=(\d+)', headers.get('Cache-Control', ''))
+            if match:
+                server_ttl = float(match.group(1))
+        return self.max_age if server_ttl is None else max(min(server_ttl, self.max_age), 0)
+
+
+class ResponseCache:
+    """JSON responses on disk, one file per URL and parameter set, evicted least recently used first."""
+
+    def __init__(self, directory=CACHE_DIRECTORY, max_bytes=CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(url, params=None):
+        material = json.dumps([url, sorted((params or {}).items())], separators=(',', ':'), default=str)
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def load(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Discarding unreadable cache entry {path}: {e}")
+            self.delete(key)
+            return None
+        # The file's mtime doubles as the LRU clock
+        os.utime(path, None)
+        return entry
+
+    def store(self, key, url, body, lifetime, etag=None, last_modified=None):
+        now = time.time()
+        entry = {
+            "url": url,
+            "stored_at": now,
+            "expires_at": now + lifetime,
+            "etag": etag,
+            "last_modified": last_modified,
+            "body": body,
+        }
+        path = self._path(key)
+        temporary = f"{path}.tmp"
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(temporary, path)
+        self.evict()
+        return entry
+
+    def refresh(self, key, entry, lifetime):
+        return self.store(key, entry["url"], entry["body"], lifetime, entry.get("etag"), entry.get("last_modified"))
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def evict(self):
+        files = []
+        total = 0
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith('.json'):
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+        if total <= self.max_bytes:
+            return
+        for _, size, path in sorted(files):
+            os.remove(path)
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "revalidated": self.revalidated}
+
+
+_response_cache = None
+
+
+def get_response_cache():
+    global _response_cache
+    if _response_cache is None:
+        _response_cache = ResponseCache()
+    return _response_cache
@@ -1,48 +1,170 @@
+import asyncio
 import os
+import sys
+import time
 
-import requests
+import aiohttp
 import logging
 import json
 from datetime import datetime, timezone
 import pytz
 from dotenv import load_dotenv
 
+from http_client import get_session
+from tracing import count
+
 logger = logging.getLogger(__name__)
 
+DISCORD_MAX_RETRIES = 5
+DEFAULT_RETRY_AFTER = 1.0  # seconds, when a 429 carries no retry_after
+
 
 class DiscordNotifier:
+    """Webhook notifier that delivers messages in order from a background queue on the shared aiohttp session.
+
+    send_message and send_decision only enqueue, so callers never wait on Discord. The worker follows the
+    webhook bucket headers (X-RateLimit-Remaining / X-RateLimit-Reset-After) and retries after 429 responses
+    once retry_after has passed. Call flush() to wait until everything queued has been delivered.
+    """
+
     def __init__(self, webhook_url):
         self.webhook_url = webhook_url
         self.MAX_MESSAGE_LENGTH = 2000
+        self.metrics = {"sent": 0, "failed": 0, "rate_limited": 0}
+        self._queue = None
+        self._worker = None
+        self._loop = None
+        self._available_at = 0.0  # loop time when the webhook bucket accepts the next request
+
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done() or self._loop is not loop:
+            self._queue = asyncio.Queue()
+            self._loop = loop
+            self._available_at = 0.0
+            self._worker = loop.create_task(self._run())
+
+    def _worker_alive(self):
+        return (self._loop is not None and self._loop.is_running() and self._worker is not None
+                and not self._worker.done())
+
+    def _parts(self, message, image_files):
+        """(content, image_files) requests for one message, split to Discord's length limit."""
+        if len(message) <= self.MAX_MESSAGE_LENGTH:
+            return [(message, image_files)]
+        parts = [(chunk, None) for chunk in self.split_message(message)]
+        if image_files:
+            parts.append(("", image_files))
+        return parts
+
+    def _enqueue(self, message, image_files):
+        self._ensure_worker()
+        for part in self._parts(message, image_files):
+            self._queue.put_nowait(part)
 
     def send_message(self, message, image_files=None):
-        if len(message) > self.MAX_MESSAGE_LENGTH:
-            chunks = self.split_message(message)
-            for chunk in chunks:
-                self._send_single_message(chunk)
-            if image_files:
-                self._send_single_message("", image_files)
-        else:
-            self._send_single_message(message, image_files)
+        """Queue a message; safe to call from any thread.
 
-    def _send_single_message(self, message, image_files=None):
-        payload = {"content": message}
-        files = {}
+        On the notifier's loop the message is queued directly. From another thread it is handed to that loop.
+        Without any running loop (a script, or before the service started) it is delivered right away.
+        """
         try:
-            if image_files:
-                for i, image_file in enumerate(image_files):
-                    file_name, file_data, content_type = image_file
-                    files[f'file{i}'] = (file_name, file_data, content_type)
-                response = requests.post(self.webhook_url, data=payload, files=files)
-            else:
-                response = requests.post(self.webhook_url, json=payload)
-
-            if response.status_code in [200, 204]:
-                logger.info("Message sent to Discord successfully")
-            else:
-                logger.error(f"Failed to send message to Discord. Status code: {response.status_code}")
-        except Exception as e:
-            logger.error(f"Error sending message to Discord: {str(e)}")
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if self._worker_alive() and loop is not self._loop:
+            try:
+                self._loop.call_soon_threadsafe(self._enqueue, message, image_files)
+                return
+            except RuntimeError:
+                pass  # The loop closed meanwhile
+        if loop is not None:
+            self._enqueue(message, image_files)
+            return
+        asyncio.run(self._deliver_now(message, image_files))
+
+    async def _deliver_now(self, message, image_files):
+        # A session of its own: the shared one belongs to the service loop, which may live in another thread
+        async with aiohttp.ClientSession() as session:
+            for content, files in self._parts(message, image_files):
+                await self._send_single_message(content, files, session)
+
+    async def flush(self):
+        if self._queue is not None and self._loop is asyncio.get_running_loop():
+            await self._queue.join()
+
+    async def close(self):
+        await self.flush()
+        if self._worker is not None and self._loop is asyncio.get_running_loop():
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+        self._worker = None
+
+    async def _run(self):
+        while True:
+            message, image_files = await self._queue.get()
+            try:
+                await self._send_single_message(message, image_files)
+            finally:
+                self._queue.task_done()
+
+    def _request_kwargs(self, message, image_files):
+        # Form data can only be sent once, so it is rebuilt for every attempt
+        if not image_files:
+            return {"json": {"content": message}}
+        form = aiohttp.FormData()
+        form.add_field("content", message)
+        for i, (file_name, file_data, content_type) in enumerate(image_files):
+            form.add_field(f"file{i}", file_data, filename=file_name, content_type=content_type)
+        return {"data": form}
+
+    def _update_bucket(self, headers, loop):
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset_after = headers.get("X-RateLimit-Reset-After")
+        if remaining == "0" and reset_after:
+            self._available_at = max(self._available_at, loop.time() + float(reset_after))
+
+    async def _send_single_message(self, message, image_files=None, session=None):
+        session = session or get_session()
+        loop = asyncio.get_running_loop()
+        for attempt in range(DISCORD_MAX_RETRIES):
+            delay = self._available_at - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            try:
+                async with session.post(self.webhook_url, **self._request_kwargs(message, image_files)) as response:
+                    self._update_bucket(response.headers, loop)
+                    if response.status == 429:
+                        try:
+                            body = await response.json(content_type=None)
+                        except Exception:
+                            body = {}
+                        retry_after = float(body.get("retry_after") or response.headers.get("Retry-After")
+                                            or DEFAULT_RETRY_AFTER)
+                        self.metrics["rate_limited"] += 1
+                        count('discord_retries_total')
+                        self._available_at = max(self._available_at, loop.time() + retry_after)
+                        logger.warning(f"Discord rate limited (global={body.get('global', False)}), "
+                                       f"retrying in {retry_after:.2f}s")
+                        continue
+                    if response.status in [200, 204]:
+                        self.metrics["sent"] += 1
+                        count('discord_messages_total', status="sent")
+                        logger.info("Message sent to Discord successfully")
+                        return True
+                    logger.error(f"Failed to send message to Discord. Status code: {response.status}")
+                    break
+            except Exception as e:
+                logger.error(f"Error sending message to Discord: {str(e)}")
+                break
+        else:
+            logger.error(f"Giving up on Discord message after {DISCORD_MAX_RETRIES} rate-limited attempts")
+        self.metrics["failed"] += 1
+        count('discord_messages_total', status="failed")
+        return False
 
     def split_message(self, message):
         chunks = []
@@ -100,10 +222,85 @@ class DiscordNotifier:
             self.send_message(f"Error: Unexpected error occurred - {str(e)}")
 
 
-def main():
-    load_dotenv()
-    DISCORD_WEBHOOK_URL = os.getenv('DISCORD_WEBHOOK_URL')
-    discord_notifier = DiscordNotifier(DISCORD_WEBHOOK_URL)
+_notifiers = {}
+
+
+def get_discord_notifier(webhook_url):
+    """Process-wide notifier per webhook, so every message to it shares one ordered queue."""
+    notifier = _notifiers.get(webhook_url)
+    if notifier is None:
+        notifier = _notifiers[webhook_url] = DiscordNotifier(webhook_url)
+    return notifier
+
+
+async def flush_notifiers():
+    for notifier in list(_notifiers.values()):
+        await notifier.flush()
+
+
+async def close_notifiers():
+    for notifier in list(_notifiers.values()):
+        await notifier.close()
+
+
+async def _start_mock_webhook(bucket_limit=5, bucket_window=0.5):
+    """Local stand-in for a Discord webhook with a fixed-window bucket; returns (runner, url, received)."""
+    from aiohttp import web
+
+    received = []
+    bucket = {"reset_at": 0.0, "remaining": bucket_limit}
+
+    async def webhook(request):
+        now = time.monotonic()
+        if now >= bucket["reset_at"]:
+            bucket["reset_at"] = now + bucket_window
+            bucket["remaining"] = bucket_limit
+        if bucket["remaining"] == 0:
+            return web.json_response({"message": "You are being rate limited.", "global": False,
+                                      "retry_after": round(bucket["reset_at"] - now, 3)}, status=429)
+        bucket["remaining"] -= 1
+        if request.content_type == "application/json":
+            received.append((await request.json())["content"])
+        else:
+            form = await request.post()
+            received.append(form["content"])
+        headers = {"X-RateLimit-Limit": str(bucket_limit), "X-RateLimit-Remaining": str(bucket["remaining"]),
+                   "X-RateLimit-Reset-After": f"{bucket['reset_at'] - now:.3f}"}
+        return web.Response(status=204, headers=headers)
+
+    app = web.Application()
+    app.router.add_post("/webhook", webhook)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}/webhook", received
+
+
+async def mock_webhook_benchmark(count=40):
+    """Measure enqueue time and delivery throughput against the rate-limited local mock webhook."""
+    from http_client import close_session
+
+    runner, url, received = await _start_mock_webhook()
+    notifier = DiscordNotifier(url)
+    start = time.perf_counter()
+    for i in range(count):
+        notifier.send_message(f"message {i}", [(f"chart{i}.png", b"\x89PNG", "image/png")] if i % 10 == 0 else None)
+    enqueue_time = time.perf_counter() - start
+    await notifier.close()
+    elapsed = time.perf_counter() - start
+    await runner.cleanup()
+    await close_session()
+
+    logger.info(f"Enqueued {count} messages in {enqueue_time * 1000:.2f} ms; delivered {len(received)} in "
+                f"{elapsed:.2f}s ({len(received) / elapsed:.1f} msg/s), metrics: {notifier.metrics}")
+
+
+async def _send_example(webhook_url):
+    from http_client import close_session
+
+    discord_notifier = DiscordNotifier(webhook_url)
 
     message = {
         "action": "Maintain Short Position",
@@ -125,8 +322,20 @@ def main():
     image_files = None
 
     discord_notifier.send_decision(message, image_files)
+    await discord_notifier.close()
+    await close_session()
+
+
+def main():
+    if "--mock" in sys.argv[1:]:
+        logging.basicConfig(level=logging.INFO)
+        asyncio.run(mock_webhook_benchmark())
+        return
+    load_dotenv()
+    DISCORD_WEBHOOK_URL = os.getenv('DISCORD_WEBHOOK_URL')
+    asyncio.run(_send_example(DISCORD_WEBHOOK_URL))
     print("Message sent to Discord")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,10 +1,8 @@
 import json
-import base64
-import io
 from datetime import datetime
 from logger_setup import setup_logger
 
-from send_discord import DiscordNotifier
+from send_discord import get_discord_notifier
 
 logger = setup_logger(__name__)
 
@@ -20,9 +18,8 @@ def send_error_notifications(error_message, discord_webhook_url):
 
     # Send Discord notification
     try:
-        discord_notifier = DiscordNotifier(discord_webhook_url)
-        discord_notifier.send_decision(error_json, [])
-        logger.info("Discord error notification sent successfully")
+        get_discord_notifier(discord_webhook_url).send_decision(error_json, [])
+        logger.info("Discord error notification queued")
     except Exception as e:
         logger.error(f"Error sending Discord error notification: {e}")
 
@@ -30,24 +27,17 @@ def send_error_notifications(error_message, discord_webhook_url):
 def send_notifications(decision, chart_images, discord_webhook_url):
     logger.info("Sending notifications about the decision")
 
-    # Prepare chart images for both Discord and Telegram
+    # Chart bytes are attached as they are, without base64 round trips
     discord_image_files = []
-    telegram_image_files = []
-    for image in chart_images:
-        if image['image_data']:
-            # For Discord
-            discord_image_files.append(
-                (f"{image['file_name']}.png", base64.b64decode(image['image_data']), 'image/png'))
-            # For Telegram
-            telegram_image_files.append(
-                (f"{image['file_name']}.png", io.BytesIO(base64.b64decode(image['image_data'])), 'image/png'))
+    for chart in chart_images:
+        if chart:
+            discord_image_files.append(chart.discord_file())
         else:
-            logger.warning(f"No image data for {image['file_name']}. Skipping this image.")
+            logger.warning(f"No image data for {chart.file_name}. Skipping this image.")
 
     # Send Discord notification
     try:
-        discord_notifier = DiscordNotifier(discord_webhook_url)
-        discord_notifier.send_decision(decision, discord_image_files)
-        logger.info("Discord notification sent successfully")
+        get_discord_notifier(discord_webhook_url).send_decision(decision, discord_image_files)
+        logger.info("Discord notification queued")
     except Exception as e:
         logger.error(f"Error sending Discord notification: {e}")
@@ -0,0 +1,87 @@
+import time
+
+import pytest
+
+from excute_trading import ExecutionClient
+from live_state import LiveState
+from mock_exchange import MockExchange, MockStreamServer
+
+
+@pytest.fixture
+def exchange():
+    return MockExchange()
+
+
+@pytest.fixture
+def server(exchange):
+    server = MockStreamServer(exchange).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def state(exchange, server):
+    state = LiveState("key", "secret", session=exchange, public_url=server.public_url,
+                      private_url=server.private_url, ping_interval=0.5).start()
+    assert state.wait_until_fresh(), state.status()
+    yield state
+    state.stop()
+
+
+@pytest.fixture
+def client(exchange, state):
+    client = ExecutionClient(None, None, session=exchange)
+    client.warm_up()
+    client.live_state = state
+    return client
+
+
+def wait_for(condition, what, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, f"timed out waiting for {what}"
+        time.sleep(0.02)
+
+
+def test_ticker_delta_merges_into_snapshot(server, state):
+    server.set_price(61000.0)
+    wait_for(lambda: state.last_price() == 61000.0, "ticker delta")
+
+
+def test_pretrade_snapshot_is_read_from_live_state(exchange, server, state, client):
+    server.set_price(61000.0)
+    wait_for(lambda: state.last_price() == 61000.0, "ticker delta")
+    round_trips = sum(exchange.round_trips.values())
+    snapshot = client.pretrade_snapshot()
+    assert snapshot["price"] == 61000.0 and snapshot["balance"] == exchange.equity
+    assert sum(exchange.round_trips.values()) == round_trips
+
+
+def test_fills_arrive_on_private_stream(state, client):
+    client.execute({"action": "Open Long", "timestamp": 1724726400})
+    wait_for(lambda: state.position['side'] == "Buy", "position update")
+    assert state.order("hana-1724726400-ol")['orderStatus'] == "Filled"
+
+
+def test_fill_while_disconnected_is_recovered_by_resync(server, state, client):
+    client.execute({"action": "Open Long", "timestamp": 1724726400})
+    wait_for(lambda: state.position['side'] == "Buy", "position update")
+    # The stale cache sends the pre-trade reads to REST until the resync after reconnecting
+    resyncs = state.metrics["resyncs"]
+    server.drop_connections(pause=0.3)
+    client.execute({"action": "Close Long", "timestamp": 1724740800})
+    wait_for(lambda: state.metrics["resyncs"] > resyncs and state.is_fresh(), "resync after reconnect")
+    assert state.position['side'] == "" and float(state.position['size']) == 0, state.position
+
+
+def test_sequence_gap_forces_fresh_snapshot(server, state):
+    gaps = state.metrics["gaps"]
+    server.send_stale_delta()
+    wait_for(lambda: state.metrics["gaps"] > gaps and state.is_fresh(), "resubscribe after gap")
+
+
+def test_unresponsive_stream_is_reconnected(server, state):
+    reconnects = state.metrics["reconnects"]
+    server.mute()
+    wait_for(lambda: not state.is_fresh(max_age=1.0), "stale state")
+    wait_for(lambda: state.metrics["reconnects"] > reconnects and state.is_fresh(), "reconnect", 10.0)
@@ -0,0 +1,97 @@
+from decimal import Decimal
+
+import pytest
+
+from excute_trading import ExecutionClient
+from mock_exchange import MockExchange
+
+
+@pytest.fixture
+def exchange():
+    return MockExchange()
+
+
+@pytest.fixture
+def client(exchange):
+    client = ExecutionClient(None, None, session=exchange)
+    client.warm_up()
+    return client
+
+
+class Decisions:
+    """Hands out decisions four hours apart so every one gets its own orderLinkId."""
+
+    def __init__(self):
+        self.timestamp = 1724726400
+
+    def __call__(self, action):
+        self.timestamp += 14400
+        return {"action": action, "timestamp": self.timestamp}
+
+
+@pytest.fixture
+def decisions():
+    return Decisions()
+
+
+def execute(client, exchange, decision):
+    """Execute decision and return (result, number of orders it placed)."""
+    before = len(exchange.orders)
+    result = client.execute(decision)
+    return result, len(exchange.orders) - before
+
+
+def test_open_long(client, exchange, decisions):
+    _, orders = execute(client, exchange, decisions("Open Long"))
+    assert orders == 1
+    assert (exchange.side, exchange.size) == ("Buy", Decimal("0.450"))
+
+
+def test_switch_nets_into_one_order(client, exchange, decisions):
+    execute(client, exchange, decisions("Open Long"))
+    _, orders = execute(client, exchange, decisions("Switch to Short"))
+    assert orders == 1
+    assert Decimal(exchange.orders[-1]["qty"]) == Decimal("0.9")
+    assert (exchange.side, exchange.size) == ("Sell", Decimal("0.450"))
+
+
+def test_switch_to_current_side_places_nothing(client, exchange, decisions):
+    execute(client, exchange, decisions("Open Short"))
+    _, orders = execute(client, exchange, decisions("Switch to Short"))
+    assert orders == 0
+    assert (exchange.side, exchange.size) == ("Sell", Decimal("0.450"))
+
+
+def test_transport_failure_is_retried(client, exchange, decisions):
+    execute(client, exchange, decisions("Open Short"))
+    exchange.fail_next = 1
+    _, orders = execute(client, exchange, decisions("Switch to Long"))
+    assert orders == 1
+    assert (exchange.side, exchange.size) == ("Buy", Decimal("0.450"))
+
+
+def test_lost_ack_is_resolved_through_order_link_id(client, exchange, decisions):
+    execute(client, exchange, decisions("Open Long"))
+    exchange.drop_next_acks = 1
+    result, orders = execute(client, exchange, decisions("Close Long"))
+    assert orders == 1 and "error" not in result
+    assert (exchange.side, exchange.size) == ("", Decimal("0"))
+    assert exchange.orders[-1]["reduceOnly"]
+
+
+def test_resubmitted_decision_is_rejected_as_duplicate(client, exchange, decisions):
+    decision = decisions("Open Short")
+    execute(client, exchange, decision)
+    execute(client, exchange, decision)
+    duplicates = [order for order in exchange.orders if order["orderLinkId"] == f"hana-{decision['timestamp']}-os"]
+    assert len(duplicates) == 1
+    assert exchange.size == Decimal("0.450")
+
+
+def test_switch_that_cannot_be_sized_still_closes_the_position(client, exchange, decisions):
+    execute(client, exchange, decisions("Open Short"))
+    exchange.equity = 1.0
+    result, orders = execute(client, exchange, decisions("Switch to Long"))
+    assert orders == 1 and exchange.orders[-1]["reduceOnly"]
+    assert (exchange.side, exchange.size) == ("", Decimal("0"))
+    assert "error" in result
@@ -0,0 +1,60 @@
+import asyncio
+
+from http_client import close_session, get_session
+from send_discord import DiscordNotifier, _start_mock_webhook
+
+
+def run_against_mock_webhook(scenario):
+    """Run scenario(url, received) on a fresh loop with the mock webhook up; returns its result."""
+    async def run():
+        runner, url, received = await _start_mock_webhook()
+        try:
+            return await scenario(url, received)
+        finally:
+            await runner.cleanup()
+            await close_session()
+
+    return asyncio.run(run())
+
+
+def test_messages_are_delivered_in_order_through_rate_limits():
+    async def scenario(url, received):
+        # A bucket-unaware burst exhausts the bucket so the notifier meets 429s
+        session = get_session()
+        for _ in range(6):
+            async with session.post(url, json={"content": "burst"}):
+                pass
+        received.clear()
+
+        notifier = DiscordNotifier(url)
+        expected = [f"message {i}" for i in range(40)]
+        for i, message in enumerate(expected):
+            notifier.send_message(message, [(f"chart{i}.png", b"\x89PNG", "image/png")] if i % 10 == 0 else None)
+        await notifier.close()
+        return notifier, expected, list(received)
+
+    notifier, expected, received = run_against_mock_webhook(scenario)
+    assert received == expected
+    assert notifier.metrics["sent"] == len(expected) and notifier.metrics["failed"] == 0
+    assert notifier.metrics["rate_limited"] > 0
+
+
+def test_message_from_worker_thread_joins_the_queue():
+    async def scenario(url, received):
+        notifier = DiscordNotifier(url)
+        notifier.send_message("first")
+        await asyncio.to_thread(notifier.send_message, "from a worker thread")
+        notifier.send_message("last")
+        await notifier.close()
+        return list(received)
+
+    assert run_against_mock_webhook(scenario) == ["first", "from a worker thread", "last"]
+
+
+def test_message_without_running_loop_is_delivered_right_away():
+    async def scenario(url, received):
+        # The thread has no event loop of its own, as in a plain script
+        await asyncio.to_thread(DiscordNotifier(url).send_message, "without a running loop")
+        return list(received)
+
+    assert run_against_mock_webhook(scenario) == ["without a running loop"]
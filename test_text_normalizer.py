@@ -0,0 +1,23 @@
+import pytest
+
+from text_normalizer import (_corpus, _reference_clean_ascii_text, _reference_clean_news_text,
+                             _reference_normalize_idea_text, clean_ascii_text, clean_news_text, normalize_idea_text)
+
+NORMALIZERS = [
+    (normalize_idea_text, _reference_normalize_idea_text),
+    (clean_news_text, _reference_clean_news_text),
+    (clean_ascii_text, _reference_clean_ascii_text),
+]
+GOLDEN_TEXTS = _corpus(20000, 30, seed=1) + _corpus(2000, 200)
+
+
+@pytest.mark.parametrize("fast, reference", NORMALIZERS, ids=[fast.__name__ for fast, _ in NORMALIZERS])
+def test_output_matches_reference(fast, reference):
+    mismatches = [text for text in GOLDEN_TEXTS if fast(text) != reference(text)]
+    assert not mismatches, f"{len(mismatches)} mismatches, first: {mismatches[0]!r}"
+
+
+@pytest.mark.parametrize("fast, reference", NORMALIZERS, ids=[fast.__name__ for fast, _ in NORMALIZERS])
+@pytest.mark.parametrize("text", ["", "   ", "$5", "$7k", "Ünïcödé — “quotes” … BTC​", "a\n\n\tb"])
+def test_edge_cases_match_reference(fast, reference, text):
+    assert fast(text) == reference(text)
@@ -0,0 +1,209 @@
+import random
+import re
+import time
+import unicodedata
+from functools import lru_cache
+
+from logger_setup import setup_logger
+
+logger = setup_logger(__name__)
+
+# TradingView ideas: abbreviations and spellings standardized as whole words, case-insensitively
+IDEA_TERMS = {
+    'btc': 'Bitcoin',
+    'bct': 'Bitcoin',
+    'btcusdt': 'Bitcoin',
+    'btc/usdt': 'Bitcoin',
+    'bitcoin': 'Bitcoin',
+    'hodl': 'hold',
+    'bullish': 'bullish',
+    'bearish': 'bearish',
+    'dump': 'decrease',
+    'pump': 'increase',
+    'moon': 'significant increase',
+    'fud': 'fear uncertainty doubt',
+    'ath': 'all-time high',
+    'dca': 'dollar cost average',
+    'ta': 'technical analysis',
+    'fa': 'fundamental analysis',
+    'rsi': 'relative strength index',
+    'ma': 'moving average',
+    'usdt': 'USDT',
+    'fed': 'FED',
+}
+
+_IDEA_STRIP = re.compile(r'[^\w\s$.,!?%-]')
+_IDEA_TERM_PATTERN = re.compile(
+    r'\b(?:' + '|'.join(re.escape(term) for term in sorted(IDEA_TERMS, key=len, reverse=True)) + r')\b',
+    re.IGNORECASE)
+# Fallback for case-insensitive matches whose lower() is not a key (e.g. 'ſ' matching 's')
+_IDEA_TERM_FULLMATCH = [(re.compile(re.escape(term), re.IGNORECASE), replacement)
+                        for term, replacement in IDEA_TERMS.items()]
+_IDEA_PRICE = re.compile(r'\$(\d+)k|\$(\d+(?:\.\d+)?)(?=\s|$)')
+
+# CoinDesk news
+_NEWS_PUNCTUATION = {
+    '’': "'",
+    '“': '"',
+    '”': '"',
+    '‘': "'",
+    '–': '-',
+    '—': '--',
+}
+# A single pass rewrites typographic punctuation and every run of whitespace, punctuation and TKTK placeholders
+# that needs it. Runs that are already normal, a single space or a punctuation mark followed by a single space
+# between words, are not matched at all. str.translate with this table cost more than the rest of the function.
+_NEWS_RUN_TOKEN = r'(?:[\s.,!?;:]|TKTK)'
+_NEWS_RUN_CHANGE = r'(?:[^\S ]|TKTK| (?=[ .,!?;:])|[.,!?;:](?! (?![\s.,!?;:]|TKTK)))'
+_NEWS_PATTERN = re.compile('[' + ''.join(_NEWS_PUNCTUATION) + r']|(?=[\sT.,!?;:])' +
+                           _NEWS_RUN_TOKEN + '*' + _NEWS_RUN_CHANGE + _NEWS_RUN_TOKEN + '*')
+_NEWS_SPACE_BEFORE_PUNCTUATION = re.compile(r' ([.,!?;:])')
+_NEWS_SPACE_AFTER_PUNCTUATION = re.compile(r'([.,!?;:])(?=\S)')
+
+# TradingView news
+_HTML_TAG = re.compile(r'<[^>]+>')
+
+
+def _idea_term(match):
+    word = match.group(0)
+    replacement = IDEA_TERMS.get(word.lower())
+    if replacement is not None:
+        return replacement
+    for pattern, replacement in _IDEA_TERM_FULLMATCH:
+        if pattern.fullmatch(word):
+            return replacement
+    return word
+
+
+def _idea_price(match):
+    if match.group(1) is not None:
+        return f"${match.group(1)},000"
+    return f"${float(match.group(2)):,.2f}"
+
+
+def normalize_idea_text(text, max_length=1500):
+    """Strip emojis and symbols, standardize trading slang and price formats, and truncate."""
+    text = _IDEA_STRIP.sub('', text)
+    text = ' '.join(text.split())
+    text = _IDEA_TERM_PATTERN.sub(_idea_term, text)
+    if '$' in text:
+        text = _IDEA_PRICE.sub(_idea_price, text)
+    return text[:max_length]
+
+
+@lru_cache(maxsize=4096)
+def _news_replacement(match_text):
+    """Replacement for one match of _NEWS_PATTERN, as if words border it on both sides; edges are stripped after."""
+    mapped = _NEWS_PUNCTUATION.get(match_text)
+    if mapped is not None:
+        return mapped
+    run = match_text.replace('TKTK', '')
+    parts = run.split()
+    if not parts:
+        return ' ' if run else ''
+    text = ' '.join(parts)
+    if run[0].isspace():
+        text = ' ' + text
+    if run[-1].isspace():
+        text += ' '
+    text = text.replace('...', '…').replace('. . .', '…')
+    text = _NEWS_SPACE_BEFORE_PUNCTUATION.sub(r'\1', text)
+    text = _NEWS_SPACE_AFTER_PUNCTUATION.sub(r'\1 ', text)
+    if text[-1] in '.,!?;:':
+        text += ' '
+    return text
+
+
+def clean_news_text(text):
+    """Normalize typographic punctuation, whitespace and ellipses in CoinDesk articles."""
+    return _NEWS_PATTERN.sub(lambda match: _news_replacement(match.group()), text).strip()
+
+
+def clean_ascii_text(text):
+    """Remove HTML tags and reduce text to whitespace-normalized ASCII."""
+    if not text:
+        return ''
+    if '<' in text:
+        text = _HTML_TAG.sub('', text)
+    if not text.isascii():
+        text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii')
+    return ' '.join(text.split())
+
+
+def normalize_columns(rows, columns, normalizer):
+    """Batch API: copy rows with the given column indexes passed through normalizer."""
+    columns = set(columns)
+    return [[normalizer(value) if index in columns else value for index, value in enumerate(row)]
+            for row in rows]
+
+
+# Reference implementations the functions above must reproduce exactly; used by main()
+def _reference_normalize_idea_text(text, max_length=1500):
+    text = re.sub(r'[^\w\s$.,!?%-]', '', text)
+    text = ' '.join(text.split())
+    for old, new in IDEA_TERMS.items():
+        text = re.sub(r'\b' + re.escape(old) + r'\b', new, text, flags=re.IGNORECASE)
+    text = re.sub(r'\$(\d+)k', r'$\1,000', text)
+    text = re.sub(r'\$(\d+(?:\.\d+)?)(?=\s|$)', lambda m: f"${float(m.group(1)):,.2f}", text)
+    return text[:max_length]
+
+
+def _reference_clean_news_text(text):
+    text = text.replace('’', "'").replace('“', '"').replace('”', '"')
+    text = text.replace('‘', "'").replace('–', '-').replace('—', '--')
+    text = text.replace('TKTK', '')
+    text = ' '.join(text.split())
+    text = text.replace('...', '…').replace('. . .', '…')
+    text = re.sub(r'\s+([.,!?;:])', r'\1', text)
+    text = re.sub(r'([.,!?;:])(?=[^\s])', r'\1 ', text)
+    text = re.sub(r'(?<=\s)"(?=\S)', '"', text)
+    text = re.sub(r'(?<=\S)"(?=[\s.,!?;:]|$)', '"', text)
+    return text.strip()
+
+
+def _reference_clean_ascii_text(text):
+    if not text:
+        return ''
+    text = re.sub(r'<[^>]+>', '', text)
+    text = unicodedata.normalize('NFKD', text)
+    text = re.sub(r'[^\x00-\x7F]+', '', text)
+    return ' '.join(text.split())
+
+
+_CORPUS_WORDS = [
+    'BTC', 'btc', 'Bitcoin', 'BITCOIN', 'btcusdt', 'BTC/USDT', 'hodl', 'HODL', 'pump', 'dump', 'moon', 'FUD',
+    'ATH', 'dca', 'TA', 'fa', 'RSI', 'MA', 'usdt', 'Fed', 'the', 'price', 'support', 'resistance', 'breakout',
+    'target', '$65k', '$64,500', '$63250', '$62.5', '$61.25k', '50%', 'we', 'expect', 'a', 'retest', 'of',
+    '\U0001F680', '\U0001F4C8', '’s', '“bull”', '–', '—', 'café', 'TKTK', '...',
+    '. . .', ',', '.', '!', '?', ';', ':', ' ,', ' .', '<b>', '</b>', '<a href="x">', ' ', '\t', '\n',
+    'ﬁnance', 'ſupport', 'KK', 'İstanbul', '½', '"', "'", 'ta-fa', 'rsi/ma', '4H',
+]
+
+
+def _corpus(count, words_per_text, seed=0):
+    rng = random.Random(seed)
+    return [' '.join(rng.choice(_CORPUS_WORDS) for _ in range(rng.randint(1, words_per_text))) +
+            rng.choice(['', ' ', '.', ' $5', '$7k'])
+            for _ in range(count)]
+
+
+def main(count=2000, words_per_text=200):
+    """Benchmark each normalizer against its reference implementation."""
+    texts = _corpus(count, words_per_text)
+    for fast, reference in ((normalize_idea_text, _reference_normalize_idea_text),
+                            (clean_news_text, _reference_clean_news_text),
+                            (clean_ascii_text, _reference_clean_ascii_text)):
+        start = time.perf_counter()
+        for text in texts:
+            reference(text)
+        reference_time = time.perf_counter() - start
+        start = time.perf_counter()
+        for text in texts:
+            fast(text)
+        fast_time = time.perf_counter() - start
+        logger.info(f"{fast.__name__}: {reference_time * 1000:.1f} ms -> {fast_time * 1000:.1f} ms "
+                    f"({reference_time / fast_time:.1f}x) over {count} texts")
+
+
+if __name__ == '__main__':
+    main()
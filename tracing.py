@@ -0,0 +1,288 @@
+import argparse
+import asyncio
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+import numpy as np
+from aiohttp import web
+
+from logger_setup import setup_logger
+
+logger = setup_logger(__name__)
+
+TRACE_PATH = os.getenv('TRACE_PATH', os.path.join('logs', 'traces.jsonl'))
+# Port of the Prometheus text endpoint served by autotrade; 0 disables it
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9464'))
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRIC_PREFIX = 'hana_'
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+# Root span of one scheduled decision run
+RUN_SPAN = 'decision_run'
+
+_current_span = contextvars.ContextVar('current_span', default=None)
+
+
+class Span:
+    """One timed stage, used as a sync or async context manager.
+
+    The span open when another starts becomes its parent. contextvars carry it into asyncio tasks and
+    asyncio.to_thread calls, so nested stages line up under the run that started them.
+    """
+
+    def __init__(self, tracer, name, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent = None
+        self.root = self
+        self.trace_id = None
+        self.start = None
+        self.duration = None
+        self.status = "ok"
+        self.error = None
+        self._started = None
+        self._token = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+        return self
+
+    def fail(self, status, error=None):
+        """Mark the span unsuccessful without raising, e.g. for a handled timeout."""
+        self.status = status
+        self.error = error
+
+    def __enter__(self):
+        self.parent = _current_span.get()
+        if self.parent is not None:
+            self.root = self.parent.root
+            self.trace_id = self.parent.trace_id
+        else:
+            self.trace_id = uuid.uuid4().hex
+        self.start = time.time()
+        self._started = time.perf_counter()
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self._started
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self.fail("cancelled" if issubclass(exc_type, asyncio.CancelledError) else "error",
+                      str(exc) or exc_type.__name__)
+        self.tracer.finish(self)
+        return False
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return self.__exit__(exc_type, exc, tb)
+
+    def record(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent.span_id if self.parent is not None else None,
+            "name": self.name,
+            "start": round(self.start, 6),
+            "duration_ms": round(self.duration * 1000, 3),
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+class Metrics:
+    """Counters and histograms kept in memory and rendered in the Prometheus text exposition format."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._counters = defaultdict(float)
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name, labels):
+        return METRIC_PREFIX + name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def count(self, name, value=1, **labels):
+        with self._lock:
+            self._counters[self._key(name, labels)] += value
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram[index] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    @staticmethod
+    def _labels(labels, extra=()):
+        pairs = list(labels) + list(extra)
+        if not pairs:
+            return ''
+        escaped = (key + '="' + value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+                   for key, value in pairs)
+        return '{' + ','.join(escaped) + '}'
+
+    def render(self):
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((key, list(values)) for key, values in self._histograms.items())
+        lines = []
+        typed = set()
+        for (name, labels), value in counters:
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            lines.append(f"{name}{self._labels(labels)} {value:g}")
+        for (name, labels), values in histograms:
+            if name not in typed:
+                lines.append(f"# TYPE {name} histogram")
+                typed.add(name)
+            for bound, cumulative in zip(self.buckets, values):
+                lines.append(f"{name}_bucket{self._labels(labels, [('le', f'{bound:g}')])} {cumulative}")
+            lines.append(f"{name}_bucket{self._labels(labels, [('le', '+Inf')])} {values[-1]}")
+            lines.append(f"{name}_sum{self._labels(labels)} {values[-2]:g}")
+            lines.append(f"{name}_count{self._labels(labels)} {values[-1]}")
+        return '\n'.join(lines) + '\n'
+
+
+class Tracer:
+    """Collects finished spans per trace and appends each trace to a JSONL file once its root span ends.
+
+    Every span also feeds the span_duration_seconds histogram and, when unsuccessful, span_errors_total.
+    """
+
+    def __init__(self, path=TRACE_PATH, metrics=None):
+        self.path = path
+        self.metrics = metrics or Metrics()
+        self._pending = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def span(self, name, **attributes):
+        return Span(self, name, attributes)
+
+    def finish(self, span):
+        self.metrics.observe('span_duration_seconds', span.duration, span=span.name)
+        if span.status != "ok":
+            self.metrics.count('span_errors_total', span=span.name, status=span.status)
+        with self._lock:
+            self._pending[span.trace_id].append(span.record())
+            # Spans that end after their root (background work) are written on their own
+            if span.root is not span and span.root.duration is None:
+                return
+            records = self._pending.pop(span.trace_id)
+        self._write(records)
+
+    def _write(self, records):
+        if not self.path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as file:
+                file.writelines(json.dumps(record, ensure_ascii=False) + '\n' for record in records)
+        except OSError as e:
+            logger.warning(f"Could not persist {len(records)} spans to {self.path}: {e}")
+
+
+_tracer = Tracer()
+
+
+def get_tracer():
+    return _tracer
+
+
+def span(name, **attributes):
+    return _tracer.span(name, **attributes)
+
+
+def current_span():
+    return _current_span.get()
+
+
+def count(name, value=1, **labels):
+    _tracer.metrics.count(name, value, **labels)
+
+
+def observe(name, value, **labels):
+    _tracer.metrics.observe(name, value, **labels)
+
+
+async def start_metrics_server(host=METRICS_HOST, port=METRICS_PORT):
+    """Serve GET /metrics on the running loop; returns the runner, to be stopped with runner.cleanup()."""
+    async def metrics(request):
+        return web.Response(body=_tracer.metrics.render().encode('utf-8'),
+                            headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
+    app = web.Application()
+    app.router.add_get('/metrics', metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Metrics endpoint listening on http://{host}:{port}/metrics")
+    return runner
+
+
+def load_runs(path=TRACE_PATH, runs=20, root=RUN_SPAN):
+    """Spans of the last runs traces (by root start time) whose root span is named root."""
+    traces = defaultdict(list)
+    with open(path, encoding='utf-8') as file:
+        for line in file:
+            if line.strip():
+                record = json.loads(line)
+                traces[record["trace_id"]].append(record)
+    roots = sorted((record for spans in traces.values() for record in spans
+                    if record["parent_id"] is None and record["name"] == root), key=lambda record: record["start"])
+    return [traces[record["trace_id"]] for record in roots[-runs:]]
+
+
+def stage_percentiles(traces):
+    """p50/p95/max duration in ms and error count per span name, slowest p95 first."""
+    durations = defaultdict(list)
+    errors = defaultdict(int)
+    for spans in traces:
+        for record in spans:
+            durations[record["name"]].append(record["duration_ms"])
+            errors[record["name"]] += record["status"] != "ok"
+    stats = []
+    for name, values in durations.items():
+        p50, p95 = np.percentile(values, [50, 95])
+        stats.append({"stage": name, "count": len(values), "p50_ms": float(p50), "p95_ms": float(p95),
+                      "max_ms": max(values), "errors": errors[name]})
+    return sorted(stats, key=lambda entry: entry["p95_ms"], reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Print p50/p95 latency per stage over the last decision runs.")
+    parser.add_argument("--runs", type=int, default=20, help="number of most recent runs (default 20)")
+    parser.add_argument("--path", default=TRACE_PATH)
+    parser.add_argument("--root", default=RUN_SPAN, help="root span name that marks a run")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.path):
+        raise SystemExit(f"No traces at {args.path}")
+    traces = load_runs(args.path, args.runs, args.root)
+    if not traces:
+        raise SystemExit(f"No {args.root} runs in {args.path}")
+    stats = stage_percentiles(traces)
+    width = max(len(entry["stage"]) for entry in stats)
+    print(f"{len(traces)} runs from {args.path}")
+    print(f"{'stage':<{width}}  {'count':>6}  {'p50 ms':>10}  {'p95 ms':>10}  {'max ms':>10}  {'errors':>6}")
+    for entry in stats:
+        print(f"{entry['stage']:<{width}}  {entry['count']:>6}  {entry['p50_ms']:>10.1f}  {entry['p95_ms']:>10.1f}  "
+              f"{entry['max_ms']:>10.1f}  {entry['errors']:>6}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,15 +1,41 @@
+import hashlib
 import json
+import os
 
 from logger_setup import setup_logger
 
 logger = setup_logger(__name__)
 
 
+# file_path -> {"mtime": ..., "content": ..., "sha256": ...}
+_instructions_cache = {}
+
+
+def _load_instructions(file_path):
+    mtime = os.stat(file_path).st_mtime_ns
+    cached = _instructions_cache.get(file_path)
+    if cached is not None and cached["mtime"] == mtime:
+        return cached
+    with open(file_path, "r", encoding="utf-8") as file:
+        content = file.read()
+    digest = hashlib.sha256(content.encode("utf-8")).hexdigest()
+    if cached is not None:
+        logger.info(f"Reloaded {file_path}: sha256 {cached['sha256'][:12]} -> {digest[:12]}")
+    _instructions_cache[file_path] = {"mtime": mtime, "content": content, "sha256": digest}
+    return _instructions_cache[file_path]
+
+
+def preload_instructions(file_paths):
+    """Read and hash the instruction files once at startup."""
+    for file_path in file_paths:
+        entry = _load_instructions(file_path)
+        logger.info(f"Preloaded {file_path} ({len(entry['content'])} chars, sha256 {entry['sha256'][:12]})")
+
+
 def get_instructions(file_path):
-    """Read instructions from a file."""
+    """Read instructions from a file, served from memory until the file's mtime changes."""
     try:
-        with open(file_path, "r", encoding="utf-8") as file:
-            return file.read()
+        return _load_instructions(file_path)["content"]
     except FileNotFoundError:
         print("File not found.")
     except Exception as e: